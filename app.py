@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 import os
+import sys
 import threading
-import time
 
 import webview
 
 import server
 
+# Upper bound for the server to bind its socket (stopping a previous instance included)
+SERVER_START_TIMEOUT = 15.0
+
 
 def run_server():
     # Ensure browser is suppressed when running inside desktop app
@@ -18,11 +21,13 @@ def main():
     server_thread = threading.Thread(target=run_server, daemon=True)
     server_thread.start()
 
-    # Small delay to let the server initialize the port
-    time.sleep(2.0)
+    # Open the window as soon as the server is listening, with the final port
+    port = server.wait_until_ready(timeout=SERVER_START_TIMEOUT)
+    if port is None:
+        print("❌ The server did not start", file=sys.stderr)
+        sys.exit(1)
 
-    # Use the dynamically updated values from the server module
-    url = f"http://localhost:{server.PORT}{server.DOC_FINDER_PATH}"
+    url = f"http://localhost:{port}{server.DOC_FINDER_PATH}"
     window = webview.create_window('DocFinder', url)
     webview.start()
 
@@ -0,0 +1,605 @@
+#!/usr/bin/env python3
+"""Banc de proves de càrrega per a server.py.
+
+Genera un DOCUMENTS_DIRECTORY sintètic (processos, documents i mides
+configurables), arrenca server.py en un subprocés aïllat (DOC_FINDER_RUNTIME_DIR
+propi, sense navegador) i hi llança càrregues concurrents:
+
+- ``database``: GET /processes-database.json
+- ``static``: GET d'assets del projecte i de documents generats (/api/render/<ruta>)
+- ``upload``: POST /api/upload multipart amb fitxers de diverses mides
+- ``mixed``: lectures i escriptures barrejades (inclou PATCH de tags)
+
+El resultat és un JSON amb throughput, latències p50/p95/p99 i el pic de RSS
+del servidor (inclosos els processos fills en mode prefork) per cada càrrega,
+pensat per comparar execucions. Cada càrrega s'executa contra un servidor nou
+i una còpia nova dels documents:
+
+    python3 scripts/benchmark-server.py --output abans.json
+    python3 scripts/benchmark-server.py --mode prefork --env DOC_FINDER_STORAGE=sqlite
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIRECTORY = Path(__file__).resolve().parent.parent
+SERVER_SCRIPT = ROOT_DIRECTORY / 'server.py'
+WORKLOADS = ('database', 'static', 'upload', 'mixed')
+# Assets del projecte que se serveixen des de l'arrel (si existeixen)
+STATIC_ASSETS = ('index.html', 'favicon.png', 'dist/index.html', 'dist/favicon.png', 'dist/vite.svg')
+
+CATEGORIES = ('Business Process', 'Integration', 'Interactive Process', 'Object-Specific')
+MECHANISMS = ('Batchable', 'Database Trigger', 'Manual Process', 'Omniscript')
+OBJECTS = ('Account', 'Contact', 'Opportunity', 'Case', 'Order', 'Quote', 'Asset', 'Contract', 'Lead')
+INTEGRATIONS = ('External System', 'Platform Events', 'REST/SOAP API')
+TAGS = ('Apex', 'Approval', 'Batch Processing', 'Integration', 'Lightning Web Components', 'Omniscript', 'Triggers')
+PRIORITIES = ('critical', 'high', 'medium', 'low')
+WORDS = (
+    'trigger', 'account', 'integration', 'validation', 'process', 'order', 'quote', 'batch',
+    'callout', 'recursion', 'handler', 'platform', 'event', 'contact', 'case', 'approval',
+)
+
+
+def log(message: str) -> None:
+    # El JSON de resultats va a stdout; el progrés, a stderr
+    print(message, file=sys.stderr, flush=True)
+
+
+def parse_size(value: str) -> int:
+    """'64k', '1m', '512' -> bytes"""
+    value = value.strip().lower()
+    multiplier = 1
+    if value[-1:] in ('k', 'm', 'g'):
+        multiplier = 1024 ** ('kmg'.index(value[-1]) + 1)
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def parse_sizes(value: str) -> list[int]:
+    sizes = [parse_size(item) for item in value.split(',') if item.strip()]
+    if not sizes or min(sizes) <= 0:
+        raise argparse.ArgumentTypeError('cal una llista de mides positives (p. ex. 4k,64k,1m)')
+    return sizes
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """'database=60,static=25,tags=10,upload=5' -> pesos de la càrrega mixta"""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in MIXED_OPERATIONS or not weight.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"operació no vàlida: {item} (opcions: {', '.join(MIXED_OPERATIONS)})")
+        mix[name.strip()] = int(weight)
+    if not sum(mix.values()):
+        raise argparse.ArgumentTypeError('la suma dels pesos ha de ser positiva')
+    return mix
+
+
+# ---------------------------------------------------------------------------
+# Dades sintètiques
+
+
+def generate_documents(directory: Path, args, rng: random.Random) -> dict:
+    """Crea processes-database.json i els documents; retorna el que necessiten les càrregues"""
+    directory.mkdir(parents=True, exist_ok=True)
+    processes = []
+    for index in range(args.processes):
+        tags = rng.sample(TAGS, rng.randint(1, 3))
+        processes.append({
+            'id': f'bench-{index}',
+            'name': f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {index}",
+            'description': ' '.join(rng.choice(WORDS) for _ in range(args.description_words)),
+            'tags': sorted(tags),
+            'objects': rng.sample(OBJECTS, rng.randint(1, 3)),
+            'integrations': rng.sample(INTEGRATIONS, rng.randint(0, 2)),
+            'mechanism': rng.choice(MECHANISMS),
+            'category': rng.choice(CATEGORIES),
+            'priority': rng.choice(PRIORITIES),
+            'complexity': rng.choice(PRIORITIES[1:]),
+            'documentation': f'doc-finder/documents/docs/document-{index}.md',
+        })
+    database = {
+        'categories': sorted(CATEGORIES),
+        'integrations': sorted(INTEGRATIONS),
+        'mechanisms': sorted(MECHANISMS),
+        'objects': sorted(OBJECTS),
+        'tags': sorted(TAGS),
+        'tagColors': {},
+        'processes': processes,
+    }
+    (directory / 'processes-database.json').write_text(
+        json.dumps(database, ensure_ascii=False, indent=2), encoding='utf-8',
+    )
+
+    # Documents binaris (no s'indexen ni es renderitzen) repartits entre les mides demanades
+    files_directory = directory / 'files'
+    files_directory.mkdir(exist_ok=True)
+    files = []
+    for index in range(args.files):
+        size = args.file_sizes[index % len(args.file_sizes)]
+        name = f'file-{index}-{size}.bin'
+        (files_directory / name).write_bytes(rng.randbytes(size))
+        files.append(f'files/{name}')
+
+    return {'process_ids': [process['id'] for process in processes], 'files': files}
+
+
+# ---------------------------------------------------------------------------
+# Servidor
+
+
+class ServerProcess:
+    """server.py en un subprocés amb el seu directori d'execució"""
+
+    def __init__(self, documents: Path, runtime: Path, log_path: Path, env: dict[str, str]):
+        self.documents = documents
+        self.runtime = runtime
+        self.log_path = log_path
+        self.env = env
+        self.process: subprocess.Popen | None = None
+        self.port: int | None = None
+
+    def start(self, timeout: float) -> int:
+        env = dict(os.environ)
+        env.update({
+            'DOCUMENTS_DIRECTORY': str(self.documents),
+            'DOC_FINDER_RUNTIME_DIR': str(self.runtime),
+            'SUPPRESS_BROWSER': 'true',
+            'PYTHONUNBUFFERED': '1',
+        })
+        env.update(self.env)
+        self._log = open(self.log_path, 'wb')
+        self.process = subprocess.Popen(
+            [sys.executable, str(SERVER_SCRIPT)],
+            cwd=ROOT_DIRECTORY, env=env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+
+        # El servidor registra el port a instance.json quan ja escolta
+        info_path = self.runtime / 'instance.json'
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'server.py ha acabat en arrencar (codi {self.process.returncode})')
+            try:
+                info = json.loads(info_path.read_text(encoding='utf-8'))
+                if int(info['pid']) == self.process.pid:
+                    self.port = int(info['port'])
+                    connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                    connection.request('HEAD', '/processes-database.json')
+                    connection.getresponse().read()
+                    connection.close()
+                    return self.port
+            except (OSError, ValueError, KeyError, http.client.HTTPException):
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"server.py no ha respost en {timeout:.0f}s")
+
+    def stop(self) -> None:
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._log.close()
+
+    def log_tail(self, lines: int = 20) -> str:
+        try:
+            return '\n'.join(self.log_path.read_text(encoding='utf-8', errors='replace').splitlines()[-lines:])
+        except OSError:
+            return ''
+
+
+def _process_tree_rss(root_pid: int) -> int:
+    """RSS (bytes) d'un procés i tots els seus descendents"""
+    if Path('/proc').is_dir():
+        children: dict[int, list[int]] = {}
+        rss: dict[int, int] = {}
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat', 'rb') as f:
+                    # El nom del procés pot contenir espais: els camps comencen després de ')'
+                    fields = f.read().rsplit(b')', 1)[1].split()
+            except OSError:
+                continue
+            pid = int(entry)
+            children.setdefault(int(fields[1]), []).append(pid)
+            rss[pid] = int(fields[21]) * page_size
+    else:
+        output = subprocess.run(
+            ['ps', '-A', '-o', 'pid=,ppid=,rss='], capture_output=True, text=True, check=False,
+        ).stdout
+        children, rss = {}, {}
+        for line in output.splitlines():
+            pid, ppid, kilobytes = (int(value) for value in line.split())
+            children.setdefault(ppid, []).append(pid)
+            rss[pid] = kilobytes * 1024
+
+    total, pending = 0, [root_pid]
+    while pending:
+        pid = pending.pop()
+        total += rss.get(pid, 0)
+        pending.extend(children.get(pid, ()))
+    return total
+
+
+class RssSampler:
+    """Mostreja el RSS del servidor en segon pla i en guarda el pic"""
+
+    def __init__(self, pid: int, interval: float):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.peak = max(self.peak, _process_tree_rss(self.pid))
+            except (OSError, ValueError):
+                pass
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+# ---------------------------------------------------------------------------
+# Càrregues
+
+
+class Client:
+    """Connexió persistent d'un fil de càrrega (es reobre si el servidor la tanca)"""
+
+    def __init__(self, port: int, compression: bool):
+        self.port = port
+        self.compression = compression
+        self.connection: http.client.HTTPConnection | None = None
+
+    def request(self, method: str, path: str, body: bytes | None = None, headers: dict | None = None) -> tuple[int, int]:
+        headers = dict(headers or {})
+        if self.compression:
+            headers.setdefault('Accept-Encoding', 'gzip')
+        # Si el servidor ha tancat la connexió persistent, es torna a provar un cop amb una de nova
+        reused = self.connection is not None
+        while True:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                payload = response.read()
+            except (OSError, http.client.HTTPException):
+                self.close()
+                if not reused:
+                    raise
+                reused = False
+                continue
+            if response.will_close:
+                self.close()
+            return response.status, len(payload)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def _multipart(filename: str, content: bytes) -> tuple[bytes, str]:
+    boundary = f'----doc-finder-bench-{uuid.uuid4().hex}'
+    body = b''.join((
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="files"; filename="{filename}"\r\n'.encode(),
+        b'Content-Type: text/plain\r\n\r\n',
+        content,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ))
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def op_database(client: Client, context: dict, rng: random.Random):
+    return client.request('GET', '/processes-database.json')
+
+
+def op_static(client: Client, context: dict, rng: random.Random):
+    return client.request('GET', rng.choice(context['static_paths']))
+
+
+def op_upload(client: Client, context: dict, rng: random.Random):
+    size = rng.choice(context['upload_sizes'])
+    # Contingut únic (text) perquè no s'apliqui la deduplicació de pujades
+    content = (uuid.uuid4().hex + '\n').encode() * (size // 33 + 1)
+    body, content_type = _multipart(f'bench-upload-{uuid.uuid4().hex[:12]}.txt', content[:size])
+    return client.request('POST', '/api/upload', body, {'Content-Type': content_type})
+
+
+def op_tags(client: Client, context: dict, rng: random.Random):
+    process_id = rng.choice(context['process_ids'])
+    body = json.dumps({'tags': rng.sample(TAGS, 2)}).encode()
+    return client.request('PATCH', f'/api/processes/{process_id}', body, {'Content-Type': 'application/json'})
+
+
+def op_page(client: Client, context: dict, rng: random.Random):
+    return client.request('GET', f"/api/processes?limit=50&sort=priority&fields=id,name,priority&offset={rng.randrange(0, 500)}")
+
+
+MIXED_OPERATIONS = {
+    'database': op_database,
+    'static': op_static,
+    'page': op_page,
+    'tags': op_tags,
+    'upload': op_upload,
+}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Percentil pel mètode del rang més proper (``values`` ordenat)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def run_workload(name: str, operations: dict, port: int, server_pid: int, context: dict, args) -> dict:
+    """Executa una càrrega amb ``args.concurrency`` fils durant ``args.duration`` segons"""
+    names = list(operations)
+    weights = [operations[operation][1] for operation in names]
+    samples: dict[str, list[float]] = {operation: [] for operation in names}
+    errors: dict[str, int] = {operation: 0 for operation in names}
+    transferred = [0]
+    lock = threading.Lock()
+    recording = threading.Event()
+    stop = threading.Event()
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        client = Client(port, args.compression)
+        local = {operation: [] for operation in names}
+        local_errors = {operation: 0 for operation in names}
+        local_bytes = 0
+        try:
+            while not stop.is_set():
+                operation = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status, size = operations[operation][0](client, context, rng)
+                    failed = status >= 400
+                except (OSError, http.client.HTTPException):
+                    failed, size = True, 0
+                elapsed = time.perf_counter() - started
+                if not recording.is_set():
+                    continue
+                if failed:
+                    local_errors[operation] += 1
+                else:
+                    local[operation].append(elapsed)
+                    local_bytes += size
+        finally:
+            client.close()
+            with lock:
+                for operation in names:
+                    samples[operation].extend(local[operation])
+                    errors[operation] += local_errors[operation]
+                transferred[0] += local_bytes
+
+    threads = [
+        threading.Thread(target=worker, args=(args.seed * 1000 + index,), daemon=True)
+        for index in range(args.concurrency)
+    ]
+    log(f"🏃 {name}: {args.concurrency} connexions, {args.warmup:g}s d'escalfament + {args.duration:g}s")
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    with RssSampler(server_pid, args.rss_interval) as sampler:
+        recording.set()
+        started = time.perf_counter()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    def summary(latencies: list[float], error_count: int) -> dict:
+        latencies = sorted(latencies)
+        return {
+            'requests': len(latencies),
+            'errors': error_count,
+            'throughputRps': round(len(latencies) / elapsed, 2),
+            'latencyMs': {
+                'mean': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+                'p50': round(percentile(latencies, 0.50) * 1000, 3),
+                'p95': round(percentile(latencies, 0.95) * 1000, 3),
+                'p99': round(percentile(latencies, 0.99) * 1000, 3),
+                'max': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+            },
+        }
+
+    result = summary([value for operation in names for value in samples[operation]], sum(errors.values()))
+    result.update({
+        'durationSeconds': round(elapsed, 3),
+        'bytesReceived': transferred[0],
+        'peakRssBytes': sampler.peak,
+    })
+    if len(names) > 1:
+        result['operations'] = {operation: summary(samples[operation], errors[operation]) for operation in names}
+    log(
+        f"   {result['throughputRps']} req/s · p50 {result['latencyMs']['p50']} ms · "
+        f"p99 {result['latencyMs']['p99']} ms · errors {result['errors']} · "
+        f"RSS {sampler.peak / 1024 / 1024:.1f} MiB"
+    )
+    return result
+
+
+def _git_revision() -> str | None:
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIRECTORY, capture_output=True, text=True, check=False,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Banc de proves de càrrega per a server.py (resultats en JSON)',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help=f"càrregues a executar ({', '.join(WORKLOADS)})")
+    parser.add_argument('--processes', type=int, default=500, help='processos de la base de dades sintètica')
+    parser.add_argument('--description-words', type=int, default=60, help='paraules de la descripció de cada procés')
+    parser.add_argument('--files', type=int, default=100, help='documents generats per a la càrrega static')
+    parser.add_argument('--file-sizes', type=parse_sizes, default='4k,64k,1m', help='mides dels documents generats')
+    parser.add_argument('--upload-sizes', type=parse_sizes, default='16k,256k,2m', help='mides dels fitxers pujats')
+    parser.add_argument(
+        '--mix', type=parse_mix, default='database=50,static=25,page=10,tags=10,upload=5',
+        help=f"pesos de la càrrega mixed ({', '.join(MIXED_OPERATIONS)})",
+    )
+    parser.add_argument('--concurrency', type=int, default=16, help='connexions simultànies')
+    parser.add_argument('--duration', type=float, default=10.0, help='segons mesurats per càrrega')
+    parser.add_argument('--warmup', type=float, default=1.0, help="segons d'escalfament (no es mesuren) per càrrega")
+    parser.add_argument('--mode', choices=('threaded', 'single', 'prefork'), help='DOC_FINDER_SERVER_MODE del servidor')
+    parser.add_argument(
+        '--env', action='append', default=[], metavar='CLAU=VALOR',
+        help='variable d\'entorn addicional per al servidor (es pot repetir)',
+    )
+    parser.add_argument(
+        '--no-compression', dest='compression', action='store_false',
+        help='no enviar Accept-Encoding: gzip',
+    )
+    parser.add_argument('--rss-interval', type=float, default=0.1, help='segons entre mostres de RSS')
+    parser.add_argument('--startup-timeout', type=float, default=30.0, help="segons d'espera perquè el servidor arrenqui")
+    parser.add_argument('--seed', type=int, default=1, help='llavor de les dades i de les càrregues')
+    parser.add_argument('--output', help='fitxer JSON de resultats (per defecte, stdout)')
+    parser.add_argument('--keep', action='store_true', help='no esborrar el directori temporal (documents i log)')
+    args = parser.parse_args(argv)
+
+    args.workloads = [name.strip() for name in args.workloads.split(',') if name.strip()]
+    unknown = [name for name in args.workloads if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"càrregues desconegudes: {', '.join(unknown)}")
+    extra_env = {}
+    for item in args.env:
+        key, separator, value = item.partition('=')
+        if not separator or not key:
+            parser.error(f'--env ha de tenir la forma CLAU=VALOR: {item}')
+        extra_env[key] = value
+    if args.mode:
+        extra_env['DOC_FINDER_SERVER_MODE'] = args.mode
+    args.server_env = extra_env
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix='doc-finder-bench-'))
+    template = workdir / 'template'
+
+    log(f"📁 Generant {args.processes} processos i {args.files} documents a {template}")
+    context = generate_documents(template, args, rng)
+    context['upload_sizes'] = args.upload_sizes
+    context['static_paths'] = [
+        f'/{asset}' for asset in STATIC_ASSETS if (ROOT_DIRECTORY / asset).is_file()
+    ] + [f'/api/render/{path}' for path in context['files']]
+    operations = {
+        'database': {'database': (op_database, 1)},
+        'static': {'static': (op_static, 1)},
+        'upload': {'upload': (op_upload, 1)},
+        'mixed': {name: (MIXED_OPERATIONS[name], weight) for name, weight in args.mix.items() if weight},
+    }
+
+    results: dict[str, dict] = {}
+    try:
+        # Cada càrrega té una còpia nova dels documents i el seu servidor: les pujades
+        # (i la feina en segon pla que generen) d'una càrrega no afecten la següent
+        for name in args.workloads:
+            directory = workdir / name
+            shutil.copytree(template, directory / 'documents')
+            server = ServerProcess(
+                directory / 'documents', directory / 'runtime', directory / 'server.log', args.server_env,
+            )
+            try:
+                port = server.start(args.startup_timeout)
+                log(f"🚀 server.py escolta al port {port} (PID {server.process.pid})")
+                idle_rss = _process_tree_rss(server.process.pid)
+                results[name] = run_workload(name, operations[name], port, server.process.pid, context, args)
+                results[name]['idleRssBytes'] = idle_rss
+                if server.process.poll() is not None:
+                    raise RuntimeError(f'server.py ha acabat durant la càrrega {name}')
+            except (RuntimeError, OSError) as error:
+                log(f"❌ {error}")
+                tail = server.log_tail()
+                if tail:
+                    log(tail)
+                return 1
+            finally:
+                server.stop()
+    finally:
+        if args.keep:
+            log(f"📂 Directori conservat: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'gitRevision': _git_revision(),
+        'host': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpuCount': os.cpu_count(),
+        },
+        'config': {
+            'processes': args.processes,
+            'descriptionWords': args.description_words,
+            'files': args.files,
+            'fileSizes': args.file_sizes,
+            'uploadSizes': args.upload_sizes,
+            'mix': args.mix,
+            'concurrency': args.concurrency,
+            'durationSeconds': args.duration,
+            'warmupSeconds': args.warmup,
+            'compression': args.compression,
+            'serverEnv': args.server_env,
+            'seed': args.seed,
+        },
+        'peakRssBytes': max((result['peakRssBytes'] for result in results.values()), default=0),
+        'workloads': results,
+    }
+    encoded = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(encoded + '\n', encoding='utf-8')
+        log(f"💾 Resultats desats a {args.output}")
+    else:
+        print(encoded)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
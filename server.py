@@ -11,16 +11,70 @@ Característiques:
 
 import http.server
 import json
+import socket
 import socketserver
 import os
+import queue
+import signal
 import webbrowser
 import subprocess
+import threading
 import time
+import bisect
+import argparse
+import atexit
+import base64
+import ctypes
+import ctypes.util
 import email.message
-import io
+import email.utils
+import gzip
+import hashlib
+import html
+import heapq
+import math
+import multiprocessing
+import re
+import select
+import sqlite3
+import struct
+import sys
+import tempfile
+import unicodedata
+import uuid
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property
+from html.parser import HTMLParser
 from http import HTTPStatus
 from pathlib import Path
-from urllib.parse import unquote
+from urllib.parse import parse_qs, unquote, urlsplit
+
+try:
+    import brotli  # opcional: compressió 'br' a més de gzip
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image, features as pil_features  # opcional: miniatures de diagrames
+except ImportError:
+    Image = None
+    pil_features = None
+
+try:
+    import markdown  # opcional: renderitzat complet de Markdown (si no, se'n fa servir un de bàsic)
+except ImportError:
+    markdown = None
+
+try:
+    import fcntl  # bloquejos entre processos (no disponible a Windows)
+except ImportError:
+    fcntl = None
 
 # Configuració
 PORT = 8082
@@ -33,143 +87,244 @@ if DOCUMENTS_DIRECTORY_ENV:
 else:
     DOCUMENTS_DIRECTORY = DIRECTORY / 'documents'
 
+# Registre de la instància activa (PID i port); es pot canviar amb DOC_FINDER_RUNTIME_DIR
+RUNTIME_DIRECTORY = Path(
+    os.environ.get('DOC_FINDER_RUNTIME_DIR')
+    or Path(tempfile.gettempdir()) / f"doc-finder-{os.getuid() if hasattr(os, 'getuid') else 'user'}"
+)
+# Temps màxim d'espera perquè una instància anterior s'aturi després de SIGTERM
+INSTANCE_STOP_TIMEOUT = 5.0
+PORT_ATTEMPTS = 20
+
 REACT_DIST_INDEX = DIRECTORY / 'dist' / 'index.html'
 DOC_FINDER_PATH = '/dist/' if REACT_DIST_INDEX.exists() else '/index.html'
 
-def check_server_running():
-    """Verifica si el servidor doc-finder ja està funcionant en qualsevol port"""
-    try:
-        import subprocess
-
-        # Buscar processos doc-finder actius
-        result = subprocess.run([
-            'ps', 'aux'
-        ], capture_output=True, text=True, timeout=2)
+# Mode de servei: 'threaded' (pool de fils limitat), 'single' (una petició alhora) o
+# 'prefork' (diversos processos, cadascun amb el seu pool, sobre el mateix socket)
+SERVER_MODES = ('threaded', 'single', 'prefork')
+SERVER_MODE = os.environ.get('DOC_FINDER_SERVER_MODE', 'threaded').strip().lower()
+MAX_WORKERS = int(os.environ.get('DOC_FINDER_MAX_WORKERS', '32'))
+PREFORK_WORKERS = int(os.environ.get('DOC_FINDER_WORKERS', str(os.cpu_count() or 2)))
+# Un procés que mor abans d'aquest temps compta com a fallada d'arrencada (reinici amb espera)
+PREFORK_MIN_UPTIME = 1.0
 
-        if result.returncode == 0:
-            lines = result.stdout.split('\n')
-            for line in lines:
-                if 'python' in line and 'server.py' in line and 'doc-finder' in line:
-                    return True
-        return False
-    except:
-        return False
+# Connexions persistents (HTTP/1.1 keep-alive)
+KEEPALIVE_TIMEOUT = float(os.environ.get('DOC_FINDER_KEEPALIVE_TIMEOUT', '5'))
+KEEPALIVE_MAX_REQUESTS = int(os.environ.get('DOC_FINDER_KEEPALIVE_MAX_REQUESTS', '100'))
+# Temps màxim d'espera entre lectures un cop començada una petició (pujades lentes)
+REQUEST_TIMEOUT = 60.0
+# Els cossos no llegits fins a aquesta mida es descarten per poder reutilitzar la connexió
+KEEPALIVE_DRAIN_LIMIT = 64 * 1024
 
-def kill_existing_servers():
-    """Mata totes les instàncies prèvies del servidor doc-finder, independentment del port"""
-    try:
-        import subprocess
-        import signal
+# Pujades: mida màxima del cos de la petició i mida dels blocs de lectura
+MAX_UPLOAD_SIZE = int(os.environ.get('DOC_FINDER_MAX_UPLOAD_SIZE', str(512 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Les sessions de pujada per blocs sense activitat s'eliminen passat aquest temps
+UPLOAD_SESSION_TTL = int(os.environ.get('DOC_FINDER_UPLOAD_SESSION_TTL', str(7 * 24 * 3600)))
+MAX_JSON_BODY_SIZE = 8 * 1024 * 1024
+# Fitxers que es registren com a processos a la base de dades quan es pugen
+DOCUMENT_EXTENSIONS = ('.md', '.markdown', '.txt', '.json', '.pdf', '.docx')
+DOCUMENTATION_PREFIX = 'doc-finder/documents'
+# Treballs en segon pla (regeneració de la base de dades després de pujades)
+JOB_WORKERS = int(os.environ.get('DOC_FINDER_JOB_WORKERS', '1'))
+JOB_QUEUE_SIZE = 256
+# Vigilància de DOCUMENTS_DIRECTORY: 'auto' (inotify si està disponible), 'inotify', 'poll' o 'off'
+WATCH_MODE = os.environ.get('DOC_FINDER_WATCH', 'auto').strip().lower()
+WATCH_DEBOUNCE = float(os.environ.get('DOC_FINDER_WATCH_DEBOUNCE', '0.3'))
+WATCH_POLL_INTERVAL = float(os.environ.get('DOC_FINDER_WATCH_POLL_INTERVAL', '2.0'))
+SSE_HEARTBEAT_INTERVAL = 15.0
+# Connexions /api/events simultànies; cadascuna té el seu fil, fora del pool de peticions
+MAX_EVENT_STREAMS = int(os.environ.get('DOC_FINDER_MAX_EVENT_STREAMS', '64'))
+# Nombre de revisions de la base de dades que es recorden per a /api/database?since=
+DELTA_HISTORY_SIZE = int(os.environ.get('DOC_FINDER_DELTA_HISTORY', '32'))
+# Compressió de respostes (gzip i, si hi ha el paquet brotli, br)
+COMPRESSION_ENABLED = os.environ.get('DOC_FINDER_COMPRESSION', 'true').strip().lower() not in ('0', 'false', 'no')
+COMPRESSION_MIN_SIZE = 1024
+# Els fitxers més grans es serveixen sense comprimir al vol (sí amb germans .gz/.br)
+COMPRESSION_MAX_FILE_SIZE = 16 * 1024 * 1024
+COMPRESSION_CACHE_SIZE = int(os.environ.get('DOC_FINDER_COMPRESSION_CACHE_SIZE', str(64 * 1024 * 1024)))
+COMPRESSIBLE_TYPES = (
+    'application/javascript', 'application/json', 'application/manifest+json',
+    'application/wasm', 'application/xml', 'image/svg+xml',
+)
+# Miniatures (/api/thumb): amplades permeses, procés de renderitzat i preescalfament després de pujades
+THUMB_WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+THUMB_DEFAULT_WIDTH = 320
+THUMB_PREFETCH_WIDTHS = (320, 640)
+THUMB_WORKERS = int(os.environ.get('DOC_FINDER_THUMB_WORKERS', str(min(4, os.cpu_count() or 1))))
+THUMB_RENDER_TIMEOUT = 60.0
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp')
+# Renderitzat de Markdown (/api/render): mida de la cache i preescalfament en arrencar
+MARKDOWN_CACHE_SIZE = int(os.environ.get('DOC_FINDER_MARKDOWN_CACHE_SIZE', str(32 * 1024 * 1024)))
+MARKDOWN_PREWARM = os.environ.get('DOC_FINDER_MARKDOWN_PREWARM', 'false').strip().lower() in ('1', 'true', 'yes')
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+# Índex de text complet (/api/fulltext) sobre el contingut de DOCUMENTS_DIRECTORY
+FULLTEXT_EXTENSIONS = ('.md', '.markdown', '.txt', '.html', '.htm', '.json')
+FULLTEXT_MAX_FILE_SIZE = int(os.environ.get('DOC_FINDER_FULLTEXT_MAX_FILE_SIZE', str(8 * 1024 * 1024)))
+# Sense vigilant de documents, cada quant es tornen a comprovar els mtimes
+FULLTEXT_REFRESH_INTERVAL = 30.0
+FULLTEXT_SNIPPET_TOKENS = 32
+# Cada actualització afegeix un segment; passat aquest nombre es fusionen
+FULLTEXT_MAX_SEGMENTS = 16
+# Rangs HTTP: a partir d'aquest nombre de rangs (ja fusionats) es respon el fitxer sencer
+MAX_BYTE_RANGES = 16
+# Els assets de Vite porten el hash del contingut al nom: es poden guardar indefinidament
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Backend de la base de dades de processos: 'json' (processes-database.json) o 'sqlite'
+STORAGE_BACKEND = os.environ.get('DOC_FINDER_STORAGE', 'json').strip().lower()
+SQLITE_DATABASE_PATH = os.environ.get('DOC_FINDER_SQLITE_PATH', '').strip()
+# Registre d'escriptura dels canvis de tags: cada quants segons (o registres) es compacta al JSON
+DATABASE_WAL_COMPACT_INTERVAL = float(os.environ.get('DOC_FINDER_WAL_COMPACT_INTERVAL', '30'))
+DATABASE_WAL_MAX_RECORDS = 256
+# Deduplicació de pujades per contingut (SHA-256); es pot desactivar amb DOC_FINDER_DEDUP=false
+CONTENT_DEDUP = os.environ.get('DOC_FINDER_DEDUP', 'true').strip().lower() not in ('0', 'false', 'no')
 
-        # Buscar tots els processos Python que executin server.py del doc-finder
-        result = subprocess.run([
-            'ps', 'aux'
-        ], capture_output=True, text=True, timeout=3)
+class InstanceRegistry:
+    """Registre de la instància del servidor en execució.
 
-        if result.returncode == 0:
-            lines = result.stdout.split('\n')
-            doc_finder_pids = []
-            current_pid = os.getpid()
-            parent_pid = os.getppid()
-
-            for line in lines:
-                # Buscar processos que executin server.py del doc-finder
-                if 'python' in line and 'doc-finder' in line:
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        try:
-                            pid = int(parts[1])
-                            if pid in (current_pid, parent_pid):
-                                # Evitar matar el procés actual o el pare que el va iniciar
-                                continue
-                            doc_finder_pids.append(pid)
-                        except (ValueError, IndexError):
-                            continue
+    ``instance.json`` guarda el PID i el port; mentre el servidor viu manté un
+    bloqueig exclusiu sobre ``instance.lock``, de manera que saber si l'entrada
+    és vigent no depèn de reutilitzacions de PID ni d'escanejar ``ps``. Sense
+    ``fcntl`` es comprova el PID i que el port accepti connexions.
+    """
 
-            if doc_finder_pids:
-                print(f"🔍 Trobats {len(doc_finder_pids)} processos doc-finder: {doc_finder_pids}")
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._lock_file = None
+        self._registered = False
 
-                # Eliminar processos de forma més robusta
-                for pid in doc_finder_pids:
-                    try:
-                        # Primer intentar SIGTERM (més suau)
-                        os.kill(pid, signal.SIGTERM)
-                        print(f"🔄 Enviat SIGTERM al processe doc-finder {pid}")
+    @property
+    def info_path(self) -> Path:
+        return self.directory / 'instance.json'
 
-                        # Esperar un moment perquè el processe es tanqui
-                        time.sleep(0.5)
+    @property
+    def lock_path(self) -> Path:
+        return self.directory / 'instance.lock'
 
-                        # Verificar si encara existeix
-                        try:
-                            os.kill(pid, 0)  # No mata, només verifica
-                            # Si arriba aquí, el processe encara existeix, usar SIGKILL
-                            os.kill(pid, signal.SIGKILL)
-                            print(f"💀 Processe doc-finder {pid} eliminat amb SIGKILL")
-                        except ProcessLookupError:
-                            print(f"✅ Processe doc-finder {pid} eliminat correctament")
+    def current(self) -> dict | None:
+        """Instància registrada que encara està viva, o None"""
+        try:
+            info = json.loads(self.info_path.read_text(encoding='utf-8'))
+            pid, port = int(info['pid']), int(info['port'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if pid != os.getpid() and not self._is_alive(pid, port):
+            self._remove_info(pid)
+            return None
+        return info
 
-                    except (ProcessLookupError, PermissionError) as e:
-                        print(f"⚠️  No s'ha pogut eliminar el processe doc-finder {pid}: {e}")
+    def register(self, port: int) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if fcntl is not None and self._lock_file is None:
+            lock_file = open(self.lock_path, 'a+')
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._lock_file = lock_file
+            except OSError:
+                lock_file.close()
+                print("⚠️  Una altra instància manté el registre; aquesta no s'hi anotarà com a activa")
 
-                # Esperar un moment més per assegurar que tots els processos s'han tancat
-                time.sleep(2)
-                print("✅ Tots els processos doc-finder eliminats")
-                print("🚀 Continuant amb l'execució del servidor nou...")
+        info = {
+            'pid': os.getpid(),
+            'port': port,
+            'directory': str(DIRECTORY),
+            'documentsDirectory': str(DOCUMENTS_DIRECTORY),
+            'startedAt': datetime.now().isoformat(timespec='seconds'),
+        }
+        _write_bytes_atomic(self.info_path, json.dumps(info, indent=2).encode('utf-8'))
+        if not self._registered:
+            self._registered = True
+            atexit.register(self.unregister)
 
-            else:
-                print("✅ Cap processe doc-finder anterior trobat")
+    def unregister(self) -> None:
+        self._remove_info(os.getpid())
+        if self._lock_file is not None:
+            self._lock_file.close()  # allibera el bloqueig
+            self._lock_file = None
 
+    def stop(self, info: dict, timeout: float = INSTANCE_STOP_TIMEOUT) -> bool:
+        """Atura la instància amb SIGTERM (SIGKILL si no respon) i espera que desaparegui"""
+        pid, port = int(info['pid']), int(info['port'])
+        if pid == os.getpid():
+            return False
+        for sig in (signal.SIGTERM, getattr(signal, 'SIGKILL', signal.SIGTERM)):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                break
+            except PermissionError as e:
+                print(f"⚠️  No s'ha pogut aturar la instància {pid}: {e}")
+                return False
+            if self._wait_for_exit(pid, port, timeout if sig == signal.SIGTERM else 1.0):
+                break
         else:
-            print("⚠️  No s'ha pogut llistar processos")
-
-    except subprocess.TimeoutExpired:
-        print("⚠️  Timeout buscant processos anteriors")
-    except Exception as e:
-        print(f"⚠️  Error eliminant processos anteriors: {e}")
-
-    # Sempre continuar amb l'execució
-    print("🔄 Procedint amb l'inici del servidor...")
+            return False
+        self._remove_info(pid)
+        return True
 
-def find_free_port(start_port=8082, max_attempts=20):
-    """Troba un port lliure començant des del port especificat"""
-    import socket
+    def _wait_for_exit(self, pid: int, port: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self._is_alive(pid, port):
+                return True
+            time.sleep(0.01)
+        return not self._is_alive(pid, port)
 
-    for port in range(start_port, start_port + max_attempts):
+    def _is_alive(self, pid: int, port: int) -> bool:
+        if fcntl is not None and self.lock_path.exists():
+            try:
+                with open(self.lock_path, 'a+') as lock_file:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+                return False  # ningú no té el bloqueig: cap instància viva
+            except BlockingIOError:
+                return True
+            except OSError:
+                pass
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind(('', port))
-                print(f"✅ Port {port} disponible")
-                return port
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return True
         except OSError:
-            print(f"⏳ Port {port} ocupat, provant següent...")
-            continue
+            return False
 
-    print(f"❌ No s'ha trobat cap port lliure entre {start_port} i {start_port + max_attempts - 1}")
-    return None
+    def _remove_info(self, pid: int) -> None:
+        try:
+            info = json.loads(self.info_path.read_text(encoding='utf-8'))
+            if int(info.get('pid', -1)) == pid:
+                self.info_path.unlink()
+        except (OSError, ValueError, TypeError):
+            pass
 
-def find_doc_finder_port():
-    """Troba el port actual del servidor doc-finder actiu"""
-    try:
-        import subprocess
+INSTANCE_REGISTRY = InstanceRegistry(RUNTIME_DIRECTORY)
 
-        # Buscar processos doc-finder actius i extreure el port dels arguments
-        result = subprocess.run([
-            'ps', 'aux'
-        ], capture_output=True, text=True, timeout=2)
+def check_server_running():
+    """Verifica si el servidor doc-finder ja està funcionant en qualsevol port"""
+    return INSTANCE_REGISTRY.current() is not None
 
-        if result.returncode == 0:
-            lines = result.stdout.split('\n')
-            for line in lines:
-                if 'python' in line and 'server.py' in line and 'doc-finder' in line:
-                    # Buscar el port en la línia del processe
-                    # El port pot estar en diferents formats, provem de trobar-lo
-                    import re
-                    port_match = re.search(r':(\d+)', line)
-                    if port_match:
-                        return int(port_match.group(1))
-        return None
-    except:
-        return None
+def kill_existing_servers():
+    """Atura la instància prèvia del servidor doc-finder registrada, independentment del port"""
+    info = INSTANCE_REGISTRY.current()
+    if info is None or int(info['pid']) == os.getpid():
+        print("✅ Cap processe doc-finder anterior trobat")
+        return
+
+    pid = int(info['pid'])
+    print(f"🔍 Trobada instància doc-finder {pid} al port {info['port']}")
+    started = time.monotonic()
+    if INSTANCE_REGISTRY.stop(info):
+        print(f"✅ Processe doc-finder {pid} aturat en {(time.monotonic() - started) * 1000:.0f} ms")
+    else:
+        print(f"⚠️  No s'ha pogut aturar el processe doc-finder {pid}")
+
+def find_doc_finder_port():
+    """Troba el port actual del servidor doc-finder actiu"""
+    info = INSTANCE_REGISTRY.current()
+    return int(info['port']) if info else None
 
 def get_browser_tabs():
     """Obté les pestanyes obertes del navegador (només Chrome/Safari)"""
@@ -265,418 +420,6003 @@ def smart_browser_open():
         print(f"❌ Tipus d'error: {type(e).__name__}")
         return False
 
-class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=DIRECTORY, **kwargs)
+def database_path() -> Path:
+    """Ruta del fitxer processes-database.json actiu"""
+    return DOCUMENTS_DIRECTORY / 'processes-database.json'
 
-    def end_headers(self):
-        # Afegir headers CORS per permetre carregar recursos locals
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        super().end_headers()
+def state_directory() -> Path:
+    """Directori ocult on el servidor desa el seu estat intern (sessions, índexs...)"""
+    return DOCUMENTS_DIRECTORY / '.doc-finder'
 
-    def do_OPTIONS(self):
-        self.send_response(HTTPStatus.NO_CONTENT)
-        self.end_headers()
+def _write_bytes_atomic(path: Path, content: bytes) -> None:
+    """Escriu un fitxer via temporal + rename perquè els lectors no el vegin mai a mitges"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(prefix=f'.{path.name}-', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except FileNotFoundError:
+            pass
+        raise
 
-    def do_GET(self):
-        # Gestió especial per processes-database.json
-        if self.path == '/processes-database.json':
-            self._serve_database_file()
-            return
+class StaleIndexError(Exception):
+    """Un índex o una instantània ja no corresponen a la versió de la base de dades consultada"""
 
-        # Gestió especial per processes-database.json en el directori doc-finder
-        if self.path == '/doc-finder/react-app/dist/processes-database.json':
-            self._serve_database_file()
-            return
+class DatabaseSnapshot:
+    """Versió concreta de processes-database.json carregada en memòria"""
 
-        # Gestió normal per altres fitxers
-        super().do_GET()
+    def __init__(self, path: Path, key: tuple, content: bytes, mtime: float, base_version: str | None = None):
+        self.path = path
+        self.key = key
+        self.content = content
+        self.mtime = mtime
+        digest = hashlib.sha256(content).hexdigest()
+        self.version = digest[:20]
+        # Versió del fitxer JSON en disc (diferent de ``version`` si hi ha canvis al WAL)
+        self.base_version = base_version or self.version
+        self.etag = f'"{self.version}"'
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True)
 
-    def _serve_database_file(self):
-        """Serveix el fitxer processes-database.json des de la ubicació personalitzada"""
-        try:
-            db_path = DOCUMENTS_DIRECTORY / 'processes-database.json'
+    @cached_property
+    def data(self) -> dict:
+        """Contingut JSON parsejat (només es parseja la primera vegada que cal)"""
+        return json.loads(self.content.decode('utf-8'))
 
-            # Si no existeix, crear-lo amb dades inicials
-            if not db_path.exists():
-                print(f"📝 Base de dades no trobada a {db_path}, creant-la...")
-                self._create_initial_database(db_path)
+    def fingerprints(self) -> tuple[list[tuple[str, object, str]], dict]:
+        """Clau, id i empremta de cada procés, i les llistes de nivell superior"""
+        entries = []
+        for position, process in enumerate(self.data.get('processes', [])):
+            if not isinstance(process, dict):
+                continue
+            key = str(process.get('id')) if process.get('id') is not None else f'#{position}'
+            encoded = json.dumps(process, ensure_ascii=False, sort_keys=True).encode('utf-8')
+            entries.append((key, process.get('id'), hashlib.blake2b(encoded, digest_size=12).hexdigest()))
+        return entries, {key: value for key, value in self.data.items() if key != 'processes'}
 
-            with open(db_path, 'rb') as f:
-                content = f.read()
+    def tag_state(self, ids) -> tuple[list[dict], list, dict]:
+        """Processos ``ids`` que existeixen, llista global de tags i colors d'aquesta versió"""
+        processes = _processes_by_id(self.data)
+        return (
+            [processes[process_id] for process_id in ids if process_id in processes],
+            self.data.get('tags', []),
+            self.data.get('tagColors', {}),
+        )
 
-            self.send_response(HTTPStatus.OK)
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.send_header('Content-Length', str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
+class SqliteDatabaseSnapshot(DatabaseSnapshot):
+    """Generació de la base de dades SQLite; el JSON només es materialitza quan es demana.
 
-        except Exception as e:
-            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error llegint base de dades: {e}")
+    ``data`` i ``content`` s'exporten de les taules la primera vegada que algú
+    els necessita (la ruta /processes-database.json, l'exportació...). Si
+    entretant s'ha escrit una generació nova, llancen StaleIndexError.
+    """
 
-    def _init_database(self):
-        """Crea o reinicialitza la base de dades buida a la ruta configurada"""
-        try:
-            db_path = DOCUMENTS_DIRECTORY / 'processes-database.json'
-            self._create_initial_database(db_path)
+    def __init__(self, storage, key: tuple, generation: str, version: str, mtime: float):
+        self.path = storage.path()
+        self.key = key
+        self.mtime = mtime
+        self.version = self.base_version = version
+        self.etag = f'"{version}"'
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True)
+        self._storage = storage
+        self._generation = generation
+        self._lock = threading.Lock()
+        self._data: dict | None = None
 
-            payload = {
-                'status': 'ok',
-                'path': str(db_path),
-            }
-            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
-            self.send_response(HTTPStatus.CREATED)
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.send_header('Content-Length', str(len(body)))
-            self.end_headers()
-            self.wfile.write(body)
-        except Exception as e:
-            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error inicialitzant base de dades: {e}")
+    @property
+    def data(self) -> dict:
+        with self._lock:
+            if self._data is None:
+                self._data = self._storage.export(self._generation)
+            return self._data
 
-    def _update_database_after_upload(self):
-        """Actualitza la base de dades després de pujar documents"""
-        try:
-            import subprocess
-            import os
+    @cached_property
+    def content(self) -> bytes:
+        return _encode_database(self.data)
 
-            # Trobar el directori arrel del projecte (on està sfdx-project.json)
-            current_dir = Path(__file__).parent
-            project_root = current_dir.parent.parent  # docs/doc-finder -> docs -> projecte
+    def fingerprints(self) -> tuple[list[tuple[str, object, str]], dict]:
+        return self._storage.fingerprints(self._generation)
 
-            # Verificar que existeix sfdx-project.json
-            if not (project_root / 'sfdx-project.json').exists():
-                print("⚠️  No s'ha trobat sfdx-project.json, saltant actualització de base de dades")
-                return
+    def tag_state(self, ids) -> tuple[list[dict], list, dict]:
+        return self._storage.tag_state(self._generation, ids)
 
-            # Executar el script de generació de base de dades
-            script_path = project_root / 'scripts' / 'generate-doc-database.py'
-            if script_path.exists():
-                print("🔄 Actualitzant base de dades després de pujar documents...")
-                result = subprocess.run([
-                    'python3', str(script_path)
-                ], cwd=str(project_root), capture_output=True, text=True, timeout=30)
-
-                if result.returncode == 0:
-                    print("✅ Base de dades actualitzada correctament")
-
-                    # Copiar la base de dades al directori de documents
-                    source_db = project_root / 'docs' / 'doc-finder' / 'processes-database.json'
-                    target_db = DOCUMENTS_DIRECTORY / 'processes-database.json'
-
-                    if source_db.exists():
-                        import shutil
-                        shutil.copy2(source_db, target_db)
-                        print(f"✅ Base de dades copiada a {target_db}")
-
-                        # Sincronitzar amb l'aplicació React
-                        react_app_dir = project_root / 'docs' / 'doc-finder' / 'react-app'
-                        if react_app_dir.exists():
-                            sync_result = subprocess.run([
-                                'npm', 'run', 'sync:data'
-                            ], cwd=str(react_app_dir), capture_output=True, text=True, timeout=10)
-
-                            if sync_result.returncode == 0:
-                                print("✅ Sincronització React completada")
-                            else:
-                                print(f"⚠️  Error en sincronització React: {sync_result.stderr}")
-                else:
-                    print(f"⚠️  Error actualitzant base de dades: {result.stderr}")
-            else:
-                print("⚠️  Script de generació de base de dades no trobat")
+class DatabaseCache:
+    """Cache en memòria de la base de dades validada per la clau del backend.
 
-        except subprocess.TimeoutExpired:
-            print("⚠️  Timeout actualitzant base de dades")
-        except Exception as e:
-            print(f"⚠️  Error actualitzant base de dades: {e}")
+    Amb el backend JSON la clau és l'mtime i la mida del fitxer (i del registre
+    de tags): mentre no canvien, cada petició només costa un ``stat()`` i els
+    bytes ja codificats i l'ETag es reutilitzen. Amb SQLite és la generació de
+    la base de dades.
+    """
 
-    def _create_initial_database(self, db_path):
-        """Crea una base de dades inicial buida"""
-        try:
-            # Assegurar que el directori existeix
-            db_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # Base de dades inicial buida
-            initial_db = {
-                "categories": [],
-                "integrations": [],
-                "mechanisms": [],
-                "objects": [],
-                "tags": [],
-                "tagColors": {},
-                "processes": []
-            }
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: DatabaseSnapshot | None = None
 
-            # Escriure el fitxer
-            with open(db_path, 'w', encoding='utf-8') as f:
-                json.dump(initial_db, f, ensure_ascii=False, indent=2)
+    def get(self) -> DatabaseSnapshot:
+        """Retorna la versió actual; llança FileNotFoundError si la base de dades no existeix"""
+        key = DATABASE_STORAGE.stat_key()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.key == key:
+            return snapshot
 
-            print(f"✅ Base de dades inicial creada a {db_path}")
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.key == key:
+                return snapshot
+            snapshot = DATABASE_STORAGE.read()
+            self._snapshot = snapshot
+            return snapshot
 
-        except Exception as e:
-            print(f"❌ Error creant base de dades inicial: {e}")
-            raise
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
 
-    def _should_handle_upload(self) -> bool:
-        path = self.path.rstrip('/')
-        return path.endswith('api/upload')
+DATABASE_CACHE = DatabaseCache()
 
-    def _write_json(self, status: HTTPStatus, payload: dict) -> None:
-        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
-        self.send_header('Content-Length', str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+class DatabaseRevision:
+    """Empremta d'una versió de la base de dades: un hash per procés i les llistes"""
 
-    def _normalise_filename(self, filename: str) -> str:
-        candidate = Path(filename).name.strip()
-        return candidate or 'fitxer-sense-nom'
+    def __init__(self, snapshot: DatabaseSnapshot):
+        self.version = snapshot.version
+        self.ids: dict[str, object] = {}
+        self.fingerprints: dict[str, str] = {}
+        entries, self.lists = snapshot.fingerprints()
+        for key, process_id, fingerprint in entries:
+            self.ids[key] = process_id
+            self.fingerprints[key] = fingerprint
 
-    def _next_available_name(self, filename: str) -> Path:
-        # Utilitzar DOCUMENTS_DIRECTORY si està configurat, sinó utilitzar el directori per defecte
-        if DOCUMENTS_DIRECTORY_ENV:
-            target_dir = DOCUMENTS_DIRECTORY
-        else:
-            target_dir = DOCUMENTS_DIRECTORY
+class DatabaseChangeLog:
+    """Historial de les últimes revisions per respondre amb només els canvis"""
 
-        target_dir.mkdir(parents=True, exist_ok=True)
-        target = target_dir / filename
-        if not target.exists():
-            return target
+    def __init__(self, max_revisions: int = DELTA_HISTORY_SIZE):
+        self.max_revisions = max(1, max_revisions)
+        self._lock = threading.Lock()
+        self._revisions: OrderedDict[str, DatabaseRevision] = OrderedDict()
 
-        stem = target.stem
-        suffix = target.suffix
-        counter = 1
-        while True:
-            candidate = target_dir / f"{stem}-{counter}{suffix}"
-            if not candidate.exists():
-                return candidate
-            counter += 1
+    def record(self, snapshot: DatabaseSnapshot) -> DatabaseRevision:
+        with self._lock:
+            revision = self._revisions.get(snapshot.version)
+            if revision is not None:
+                return revision
+        revision = DatabaseRevision(snapshot)
+        with self._lock:
+            self._revisions[snapshot.version] = revision
+            while len(self._revisions) > self.max_revisions:
+                self._revisions.popitem(last=False)
+        return revision
 
-    def _parse_multipart_form_data(self, content_type: str):
-        """Parse multipart/form-data without using deprecated cgi module"""
-        # Extract boundary from content-type header
-        boundary = None
-        for part in content_type.split(';'):
-            part = part.strip()
-            if part.startswith('boundary='):
-                boundary = part[9:]  # Remove 'boundary='
-                break
+    def delta(self, since: str, snapshot: DatabaseSnapshot) -> dict | None:
+        """Canvis entre ``since`` i ``snapshot``; None si ``since`` ja no és a l'historial"""
+        current = self.record(snapshot)
+        with self._lock:
+            base = self._revisions.get(since)
+        if base is None:
+            return None
 
-        if not boundary:
-            raise ValueError("No boundary found in Content-Type")
+        added, modified = [], []
+        if since != current.version:
+            for position, process in enumerate(snapshot.data.get('processes', [])):
+                if not isinstance(process, dict):
+                    continue
+                key = str(process.get('id')) if process.get('id') is not None else f'#{position}'
+                previous = base.fingerprints.get(key)
+                if previous is None:
+                    added.append(process)
+                elif previous != current.fingerprints.get(key):
+                    modified.append(process)
 
-        # Read the content length
-        content_length = int(self.headers.get('Content-Length', '0'))
-        if content_length == 0:
-            return []
+        removed = [base.ids[key] for key in base.fingerprints if key not in current.fingerprints]
+        lists = {
+            key: value for key, value in current.lists.items()
+            if key not in base.lists or base.lists[key] != value
+        }
+        return {
+            'version': current.version,
+            'since': since,
+            'full': False,
+            'added': added,
+            'modified': modified,
+            'removed': removed,
+            'lists': lists,
+        }
 
-        # Read the raw data
-        raw_data = self.rfile.read(content_length)
+DATABASE_CHANGE_LOG = DatabaseChangeLog()
 
-        # Split by boundary
-        boundary_bytes = f'--{boundary}'.encode('utf-8')
-        parts = raw_data.split(boundary_bytes)
+# Paleta per als tags nous (la mateixa que TAG_COLOR_PRESETS del client)
+TAG_COLOR_PRESETS = (
+    '#ffb3ba', '#ffdfba', '#ffffba', '#baffc9', '#bae1ff', '#d4baff',
+    '#ffb3e6', '#b3ffb3', '#ffb3ff', '#b3e6ff', '#e6b3ff', '#b3ffd4',
+)
 
-        files = []
-        for part in parts:
-            if not part.strip():
-                continue
+# Regles de classificació per paraules clau: (paraula clau, valor); la primera que coincideix guanya
+_MECHANISM_RULES = (('omniscript', 'Omniscript'), ('trigger', 'Database Trigger'), ('batch', 'Batchable'))
+_CATEGORY_RULES = (('omniscript', 'Interactive Process'), ('integration', 'Integration'), ('trigger', 'Object-Specific'))
+# Regles acumulatives: s'afegeixen tots els valors que coincideixen
+_INTEGRATION_RULES = (
+    ('platform event', 'Platform Events'),
+    ('external system', 'External System'),
+    ('rest', 'REST/SOAP API'),
+    ('soap', 'REST/SOAP API'),
+)
+_TAG_RULES = (
+    ('apex', 'Apex'),
+    ('approval', 'Approval'),
+    ('batch', 'Batch Processing'),
+    ('integration', 'Integration'),
+    ('lwc', 'Lightning Web Components'),
+    ('lightning web component', 'Lightning Web Components'),
+    ('omniscript', 'Omniscript'),
+    ('platform event', 'Platform Events'),
+    ('trigger', 'Triggers'),
+)
+KNOWN_OBJECTS = ('Account', 'Contact', 'Opportunity', 'Case', 'Order', 'Quote', 'Asset', 'Contract', 'Lead')
+DEFAULT_OBJECTS = ['Account', 'Contact', 'Opportunity', 'Case']
 
-            # Split headers and body
-            if b'\r\n\r\n' in part:
-                headers_raw, body = part.split(b'\r\n\r\n', 1)
-            elif b'\n\n' in part:
-                headers_raw, body = part.split(b'\n\n', 1)
-            else:
-                continue
+class InterProcessLock:
+    """Bloqueig reentrant entre fils i, si hi ha fcntl, també entre processos.
 
-            # Parse headers
-            headers = {}
-            for line in headers_raw.decode('utf-8', errors='ignore').split('\n'):
-                line = line.strip()
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    headers[key.strip().lower()] = value.strip()
-
-            # Check if this is a file field
-            content_disposition = headers.get('content-disposition', '')
-            if 'filename=' in content_disposition:
-                # Extract filename
-                filename_start = content_disposition.find('filename="') + 10
-                filename_end = content_disposition.find('"', filename_start)
-                if filename_start > 9 and filename_end > filename_start:
-                    filename = content_disposition[filename_start:filename_end]
-
-                    # Create a file-like object
-                    file_obj = io.BytesIO(body)
-                    file_obj.filename = filename
-                    files.append(file_obj)
+    En mode prefork diversos processos escriuen la base de dades i el manifest:
+    a més del RLock del procés es pren un ``flock`` exclusiu sobre
+    ``state_directory()/<name>``.
+    """
 
-        return files
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
 
-    def do_POST(self):
-        # Endpoint per inicialitzar la base de dades
-        if self.path.rstrip('/') == '/api/init-database':
-            self._init_database()
-            return
+    def path(self) -> Path:
+        return state_directory() / self.name
 
-        if not self._should_handle_upload():
-            self.send_error(HTTPStatus.NOT_FOUND, "Endpoint no trobat")
-            return
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                path = self.path()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                lock_file = open(path, 'a+')
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                except BaseException:
+                    lock_file.close()
+                    raise
+                self._file = lock_file
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
 
-        content_type = self.headers.get('Content-Type', '')
-        if 'multipart/form-data' not in content_type:
-            self._write_json(
-                HTTPStatus.BAD_REQUEST,
-                {
-                    'saved': [],
-                    'errors': [
-                        {
-                            'name': 'request',
-                            'reason': 'Content-Type ha de ser multipart/form-data',
-                        }
-                    ],
-                },
-            )
-            return
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            self._file.close()  # tancar el fitxer allibera el flock
+            self._file = None
+        self._lock.release()
 
-        try:
-            files = self._parse_multipart_form_data(content_type)
-        except Exception as error:  # noqa: BLE001 - capturem qualsevol error d'anàlisi
-            self._write_json(
-                HTTPStatus.BAD_REQUEST,
-                {
-                    'saved': [],
-                    'errors': [
-                        {
-                            'name': 'request',
-                            'reason': f'No s\'ha pogut processar la petició: {error}',
-                        }
-                    ],
-                },
-            )
-            return
-        if not files:
-            self._write_json(
-                HTTPStatus.BAD_REQUEST,
-                {
-                    'saved': [],
-                    'errors': [
-                        {
-                            'name': 'request',
-                            'reason': 'No s\'ha rebut cap fitxer',
-                        }
-                    ],
-                },
-            )
-            return
+# Serialitza totes les escriptures de processes-database.json
+_DATABASE_WRITE_LOCK = InterProcessLock('database.lock')
 
-        saved: list[dict[str, object]] = []
-        errors: list[dict[str, str]] = []
+def _empty_database() -> dict:
+    return {
+        "categories": [],
+        "integrations": [],
+        "mechanisms": [],
+        "objects": [],
+        "tags": [],
+        "tagColors": {},
+        "processes": []
+    }
+
+def _encode_database(data: dict) -> bytes:
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+def _write_database(data: dict) -> None:
+    """Desa la base de dades sencera al backend configurat (de forma atòmica)"""
+    DATABASE_STORAGE.write(data)
+
+def _documentation_reference(path: Path) -> str | None:
+    """Referència 'documentation' d'un fitxer del directori de documents"""
+    try:
+        relative = path.resolve().relative_to(DOCUMENTS_DIRECTORY.resolve())
+    except ValueError:
+        return None
+    return f"{DOCUMENTATION_PREFIX}/{relative.as_posix()}"
+
+def _document_id(reference: str, taken: set[str]) -> str:
+    """Id de text estable derivat de la ruta del document ('doc-triggers-index-md'), únic a ``taken``"""
+    relative = reference.removeprefix(f'{DOCUMENTATION_PREFIX}/')
+    base = 'doc-' + ('-'.join(_tokenize(relative)) or 'document')
+    candidate, suffix = base, 2
+    while candidate in taken:
+        candidate = f'{base}-{suffix}'
+        suffix += 1
+    taken.add(candidate)
+    return candidate
+
+def _read_text_sample(path: Path, limit: int = 64 * 1024) -> str:
+    if path.suffix.lower() not in ('.md', '.markdown', '.txt', '.json'):
+        return ''
+    with open(path, 'rb') as f:
+        return f.read(limit).decode('utf-8', errors='ignore')
+
+def _document_title(path: Path, text: str) -> str:
+    """Títol del document: primer encapçalament Markdown o el nom del fitxer"""
+    if path.suffix.lower() in ('.md', '.markdown'):
+        for line in text.splitlines():
+            if line.startswith('# '):
+                return line[2:].strip()
+    words = re.split(r'[-_\s]+', path.stem)
+    return ' '.join(word[:1].upper() + word[1:] for word in words if word) or path.name
 
-        for file_obj in files:
-            if not hasattr(file_obj, 'filename') or not file_obj.filename:
+def _classify_document(path: Path, text: str) -> dict:
+    """Dedueix categoria, mecanisme, objectes, integracions i tags per paraules clau"""
+    haystack = f"{path.stem.replace('-', ' ').replace('_', ' ')} {text}".casefold()
+    filename = path.stem.casefold()
+
+    def contains(source, keyword):
+        # Coincidència a inici de paraula: 'trigger' troba 'triggers' però 'rest' no troba 'interest'
+        return re.search(rf'\b{re.escape(keyword)}', source) is not None
+
+    def first_match(rules, default):
+        # El nom del fitxer té prioritat sobre el contingut
+        for source in (filename, haystack):
+            for keyword, value in rules:
+                if contains(source, keyword):
+                    return value
+        return default
+
+    def all_matches(rules):
+        return list(dict.fromkeys(value for keyword, value in rules if contains(haystack, keyword)))
+
+    objects = [name for name in KNOWN_OBJECTS if re.search(rf'\b{name.casefold()}\b', haystack)]
+    return {
+        'category': first_match(_CATEGORY_RULES, 'Business Process'),
+        'mechanism': first_match(_MECHANISM_RULES, 'Manual Process'),
+        'objects': objects or list(DEFAULT_OBJECTS),
+        'integrations': all_matches(_INTEGRATION_RULES),
+        'tags': all_matches(_TAG_RULES),
+    }
+
+def _file_metadata(path: Path) -> dict:
+    stat_result = path.stat()
+    relative_parent = path.resolve().parent.relative_to(DOCUMENTS_DIRECTORY.resolve()).as_posix()
+    return {
+        'lastModified': datetime.fromtimestamp(stat_result.st_mtime).isoformat(),
+        'fileSize': stat_result.st_size,
+        'subdirectory': relative_parent or '.',
+    }
+
+def _refresh_database_lists(data: dict) -> None:
+    """Recalcula les llistes de nivell superior a partir dels processos"""
+    processes = data.get('processes', [])
+
+    def collect(field):
+        values = set()
+        for process in processes:
+            value = process.get(field)
+            for item in (value if isinstance(value, list) else [value]):
+                if isinstance(item, str) and item:
+                    values.add(item)
+        return sorted(values)
+
+    data['categories'] = collect('category')
+    data['integrations'] = collect('integrations')
+    data['mechanisms'] = collect('mechanism')
+    data['objects'] = collect('objects')
+    data['tags'] = collect('tags')
+
+    previous_colors = data.get('tagColors') or {}
+    tag_colors = {tag: previous_colors[tag] for tag in data['tags'] if tag in previous_colors}
+    index = 0
+    for tag in data['tags']:
+        if tag not in tag_colors:
+            tag_colors[tag] = TAG_COLOR_PRESETS[index % len(TAG_COLOR_PRESETS)]
+            index += 1
+    data['tagColors'] = tag_colors
+    data['generatedAt'] = datetime.now().isoformat()
+    data['totalDocuments'] = len(processes)
+
+def update_database_entries(paths) -> dict[str, int]:
+    """Actualitza a processes-database.json només les entrades dels fitxers indicats.
+
+    Els fitxers nous s'afegeixen classificats per paraules clau, els existents
+    conserven la classificació (i els tags editats) i n'actualitzen metadades,
+    i els que ja no existeixen s'eliminen. La base de dades s'escriu de forma
+    atòmica.
+    """
+    summary = {'added': 0, 'updated': 0, 'removed': 0}
+    with _DATABASE_WRITE_LOCK:
+        db_path = database_path()
+        if DATABASE_STORAGE.exists():
+            data = json.loads(DATABASE_CACHE.get().content.decode('utf-8'))
+        else:
+            data = _empty_database()
+        processes = data.setdefault('processes', [])
+        by_reference = {process.get('documentation'): process for process in processes if isinstance(process, dict)}
+        taken_ids = {str(process.get('id')) for process in processes if isinstance(process, dict)}
+        removed_references = set()
+
+        for path in paths:
+            path = Path(path)
+            reference = _documentation_reference(path)
+            if reference is None or path.name == db_path.name:
+                continue
+            if path.suffix.lower() not in DOCUMENT_EXTENSIONS:
                 continue
 
-            filename = self._normalise_filename(str(file_obj.filename))
+            existing = by_reference.get(reference)
+            if not path.is_file():
+                if existing is not None:
+                    removed_references.add(reference)
+                    del by_reference[reference]
+                    summary['removed'] += 1
+                continue
 
-            try:
-                data = file_obj.read()
-                if not data:
-                    errors.append({'name': filename, 'reason': 'El fitxer és buit'})
-                    continue
+            if existing is not None:
+                existing.update(_file_metadata(path))
+                summary['updated'] += 1
+                continue
 
-                target_path = self._next_available_name(filename)
-                with open(target_path, 'wb') as destination:
-                    destination.write(data)
-
-                saved.append(
-                    {
-                        'originalName': filename,
-                        'storedName': target_path.name,
-                        'size': len(data),
-                        'directory': str(target_path),
-                    }
-                )
-            except Exception as error:  # noqa: BLE001 - evitar perdre informació de l'error
-                errors.append({'name': filename, 'reason': str(error)})
+            text = _read_text_sample(path)
+            entry = {
+                'id': _document_id(reference, taken_ids),
+                'name': _document_title(path, text),
+                'description': '',
+                **_classify_document(path, text),
+                'documentation': reference,
+                **_file_metadata(path),
+                'priority': 'medium',
+                'complexity': 'medium',
+            }
+            processes.append(entry)
+            by_reference[reference] = entry
+            summary['added'] += 1
 
-        # Actualitzar la base de dades si s'han pujat documents correctament
-        if saved and not errors:
-            self._update_database_after_upload()
+        if not any(summary.values()):
+            return summary
 
-        status = HTTPStatus.CREATED if saved and not errors else HTTPStatus.OK
-        self._write_json(
-            status,
-            {
-                'saved': saved,
-                'errors': errors,
-            },
-        )
+        if removed_references:
+            data['processes'] = [
+                process for process in processes
+                if not (isinstance(process, dict) and process.get('documentation') in removed_references)
+            ]
+        _refresh_database_lists(data)
+        _write_database(data)
+        # ``data`` partia de la versió amb el registre de tags aplicat: ja és al JSON
+        DATABASE_WRITE_LOG.clear()
+    return summary
 
-def start_server():
-    """Inicia el servidor web intel·ligent"""
-    global PORT
+def _clean_tags(tags) -> list[str]:
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError('tags ha de ser una llista de textos')
+    return sorted({tag.strip() for tag in tags if tag.strip()})
 
-    print("🧹 Netejant instàncies prèvies...")
-    kill_existing_servers()
-
-    # Trobar un port lliure
-    print("🔍 Buscant port lliure...")
-    free_port = find_free_port(PORT)
-    if free_port is None:
-        print("❌ No s'ha pogut trobar cap port lliure")
-        print("🔄 Esperant 2 segons i tornant a intentar...")
-        time.sleep(2)
-        free_port = find_free_port(PORT)
-        if free_port is None:
-            print("❌ Encara no s'ha pogut trobar cap port lliure")
-            return
-
-    PORT = free_port  # Actualitzar el port global
-    print(f"🚀 Iniciant nou servidor al port {PORT}...")
-    print("📋 Configurant servidor web...")
-    os.chdir(DIRECTORY)
-
-    print("🌐 Creant servidor HTTP...")
-    print("🔄 Iniciant servidor web (això pot trigar uns segons)...")
-    with socketserver.TCPServer(("", PORT), CustomHTTPRequestHandler) as httpd:
-        print(f"🚀 Servidor web iniciat!")
-        print(f"📁 Directori: {DIRECTORY}")
-        print(f"📂 Documents Directory: {DOCUMENTS_DIRECTORY}")
-        if DOCUMENTS_DIRECTORY_ENV:
-            print(f"🔧 Utilitzant DOCUMENTS_DIRECTORY de variable d'entorn: {DOCUMENTS_DIRECTORY_ENV}")
+def _clean_tag_colors(colors) -> dict[str, str]:
+    if not isinstance(colors, dict) or not all(
+        isinstance(tag, str) and isinstance(color, str) and 0 < len(color) <= 64
+        for tag, color in colors.items()
+    ):
+        raise ValueError('tagColors ha de ser un objecte {tag: color}')
+    return {tag.strip(): color.strip() for tag, color in colors.items() if tag.strip()}
+
+def parse_tag_change(payload: dict, process_id=None) -> dict:
+    """Valida un canvi de tags: d'un procés (amb ``process_id``) o de la llista global"""
+    change = {}
+    if process_id is not None:
+        change['id'] = process_id
+    if 'tags' in payload:
+        change['tags'] = _clean_tags(payload['tags'])
+    if 'tagColors' in payload:
+        change['tagColors'] = _clean_tag_colors(payload['tagColors'])
+    if len(change) == (process_id is not None):
+        raise ValueError('Cal indicar tags o tagColors')
+    return change
+
+def _processes_by_id(data: dict) -> dict[str, dict]:
+    return {
+        str(process.get('id')): process
+        for process in data.get('processes', [])
+        if isinstance(process, dict) and process.get('id') is not None
+    }
+
+def _apply_tag_change(data: dict, change: dict, processes: dict[str, dict], collect_tags=None) -> None:
+    """Aplica un canvi de tags a ``data`` amb les mateixes regles que l'editor de tags del client.
+
+    En un procés, la llista global passa a ser la unió dels tags dels processos i
+    els colors es limiten a aquests tags; en la llista global, els tags són els
+    indicats. Els tags sense color en reben un de la paleta. ``collect_tags(id)``
+    calcula la unió un cop modificat el procés quan ``data`` no porta tots els
+    processos (SQLite); per defecte es recorre ``data['processes']``.
+    """
+    colors = {**(data.get('tagColors') or {}), **change.get('tagColors', {})}
+    if 'id' in change:
+        process = processes.get(str(change['id']))
+        if process is None:
+            raise KeyError(change['id'])
+        if 'tags' in change:
+            process['tags'] = list(change['tags'])
+        if collect_tags is not None:
+            data['tags'] = collect_tags(str(change['id']))
         else:
-            print(f"🔧 Utilitzant DOCUMENTS_DIRECTORY per defecte")
-        print(f"🗄️  Base de dades: {DOCUMENTS_DIRECTORY}/processes-database.json")
-        print(f"🌐 URL base: http://localhost:{PORT}")
-        print(f"📋 Document Finder: http://localhost:{PORT}{DOC_FINDER_PATH}")
-        print(f"🖼️  Diagrames: http://localhost:{PORT}/diagrams/")
-        print("\n💡 Prem Ctrl+C per aturar el servidor")
-        print("=" * 60)
+            data['tags'] = sorted({
+                tag
+                for candidate in data.get('processes', []) if isinstance(candidate, dict)
+                for tag in candidate.get('tags') or [] if isinstance(tag, str) and tag
+            })
+        colors = {tag: colors[tag] for tag in data['tags'] if colors.get(tag)}
+    elif 'tags' in change:
+        data['tags'] = list(change['tags'])
 
-        # Opcionalment obrir navegador (es pot suprimir amb SUPPRESS_BROWSER=true)
-        if os.environ.get('SUPPRESS_BROWSER', '').lower() not in ('1', 'true', 'yes'):
-            print("🔍 Gestionant navegador...")
-            import threading
-            def delayed_browser_open():
-                time.sleep(2.0)  # Esperar 2 segons perquè el servidor estigui completament iniciat
-                print("🌐 Intentant obrir navegador...")
-                result = smart_browser_open()
-                if result:
-                    print("✅ Navegador obert correctament")
-                else:
-                    print("❌ Error obrint navegador")
-            threading.Thread(target=delayed_browser_open, daemon=True).start()
+    index = 0
+    for tag in data.get('tags', []):
+        if not colors.get(tag):
+            colors[tag] = TAG_COLOR_PRESETS[index % len(TAG_COLOR_PRESETS)]
+            index += 1
+    data['tagColors'] = colors
 
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\n🛑 Servidor aturat per l'usuari")
-            httpd.shutdown()
+class DatabaseWriteLog:
+    """Registre d'escriptura anticipada (WAL) dels canvis de tags de processes-database.json.
 
-if __name__ == "__main__":
+    Cada escriptura afegeix una línia JSON a ``.doc-finder/database.wal`` en
+    lloc de reescriure tot el fitxer, i ``DatabaseCache`` aplica les línies en
+    carregar la base de dades. Les peticions simultànies s'agrupen: qui obté el
+    bloqueig d'escriptura desa (amb un sol fsync) els canvis de totes les que
+    esperen. Periòdicament el registre es compacta al JSON (temporal + rename)
+    i es buida. Cada línia porta la versió del JSON sobre la qual s'ha escrit:
+    si el fitxer es substitueix per fora del servidor, les línies antigues
+    s'ignoren. Amb el backend SQLite els canvis s'hi desen directament i la
+    compactació els torna a escriure a processes-database.json.
+    """
+
+    def __init__(self):
+        self._pending_lock = threading.Lock()
+        self._pending: list[tuple[list[dict], Future]] = []
+        self._timer: threading.Timer | None = None
+
+    def path(self) -> Path:
+        return state_directory() / 'database.wal'
+
+    def stat_key(self) -> tuple | None:
+        try:
+            stat = self.path().stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size) if stat.st_size else None
+
+    def read(self) -> tuple[tuple | None, float, list[dict]]:
+        """Clau (mtime, mida), mtime i registres del WAL, llegits del mateix descriptor"""
+        try:
+            with open(self.path(), 'rb') as f:
+                stat = os.fstat(f.fileno())
+                content = f.read()
+        except FileNotFoundError:
+            return None, 0.0, []
+        if not content:
+            return None, 0.0, []
+        records = []
+        for line in content.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # línia a mitges d'una escriptura interrompuda
+            if isinstance(record, dict):
+                records.append(record)
+        return (stat.st_mtime_ns, stat.st_size), stat.st_mtime, records
+
+    def submit(self, changes: list[dict]) -> DatabaseSnapshot:
+        """Registra tots els ``changes`` (o cap) i retorna la versió resultant de la base de dades.
+
+        Llança KeyError si algun canvi es refereix a un procés que no existeix.
+        """
+        future: Future = Future()
+        with self._pending_lock:
+            self._pending.append((changes, future))
+        with _DATABASE_WRITE_LOCK:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._write(batch)
+        return future.result()
+
+    def _write(self, batch: list[tuple[list[dict], Future]]) -> None:
+        if not DATABASE_STORAGE.uses_write_log:
+            self._write_storage(batch)
+            return
+        try:
+            snapshot = DATABASE_CACHE.get()
+            data = json.loads(snapshot.content.decode('utf-8'))
+            processes = _processes_by_id(data)
+            accepted: list[Future] = []
+            written: list[dict] = []
+            for changes, future in batch:
+                missing = [change['id'] for change in changes if 'id' in change and str(change['id']) not in processes]
+                if missing:
+                    future.set_exception(KeyError(missing[0]))
+                    continue
+                for change in changes:
+                    _apply_tag_change(data, change, processes)
+                written.extend(changes)
+                accepted.append(future)
+            if not written:
+                return
+
+            self._append(snapshot, written)
+            result = DATABASE_CACHE.get()
+        except BaseException as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            raise
+        for future in accepted:
+            future.set_result(result)
+
+    def _write_storage(self, batch: list[tuple[list[dict], Future]]) -> None:
+        """SQLite: el backend aplica els canvis de tot el grup en una transacció, procés a procés"""
+        try:
+            errors = DATABASE_STORAGE.apply_tag_changes([changes for changes, _ in batch])
+            result = DATABASE_CACHE.get() if any(error is None for error in errors) else None
+        except BaseException as error:
+            for _, future in batch:
+                future.set_exception(error)
+            raise
+        for (_, future), error in zip(batch, errors):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        self.schedule_compaction()
+
+    def _append(self, snapshot: DatabaseSnapshot, changes: list[dict]) -> None:
+        _, _, records = self.read()
+        # Registres escrits sobre una altra versió del JSON: ja no s'apliquen
+        mode = 'ab' if all(record.get('base') == snapshot.base_version for record in records) else 'wb'
+        line = json.dumps({'base': snapshot.base_version, 'changes': changes}, ensure_ascii=False)
+        path = self.path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, mode) as f:
+            f.write(line.encode('utf-8') + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        if len(records) + 1 >= DATABASE_WAL_MAX_RECORDS:
+            self._compact_locked()
+        else:
+            self.schedule_compaction()
+
+    def schedule_compaction(self) -> None:
+        with self._pending_lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(DATABASE_WAL_COMPACT_INTERVAL, self._compact_later)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _compact_later(self) -> None:
+        with self._pending_lock:
+            self._timer = None
+        try:
+            self.compact()
+        except Exception as e:  # noqa: BLE001 - es reintentarà amb la propera escriptura
+            print(f"⚠️  No s'ha pogut compactar el registre de la base de dades: {e}")
+
+    def compact(self) -> bool:
+        """Escriu al JSON els canvis pendents del registre i el buida"""
+        with _DATABASE_WRITE_LOCK:
+            return self._compact_locked()
+
+    def _compact_locked(self) -> bool:
+        if not DATABASE_STORAGE.uses_write_log:
+            return DATABASE_STORAGE.write_back()
+        if self.stat_key() is None:
+            return False
+        snapshot = DATABASE_CACHE.get()
+        if snapshot.version != snapshot.base_version:
+            _write_bytes_atomic(snapshot.path, snapshot.content)
+        self.clear()
+        return True
+
+    def clear(self) -> None:
+        """Buida el registre (cal tenir _DATABASE_WRITE_LOCK i haver desat el JSON amb els canvis)"""
+        try:
+            self.path().unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        with self._pending_lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        try:
+            self.compact()
+        except Exception as e:  # noqa: BLE001 - el WAL es conserva i s'aplicarà en arrencar
+            print(f"⚠️  No s'ha pogut compactar el registre de la base de dades: {e}")
+
+DATABASE_WRITE_LOG = DatabaseWriteLog()
+
+class JsonDatabaseStorage:
+    """processes-database.json com a font de veritat, amb el registre de tags aplicat a sobre"""
+
+    name = 'json'
+    uses_write_log = True
+    # /api/processes, /api/facets i /api/search es resolen amb els índexs en memòria
+    sql_queries = False
+
+    def path(self) -> Path:
+        return database_path()
+
+    def exists(self) -> bool:
+        return self.path().exists()
+
+    @staticmethod
+    def _stat_key(stat_result) -> tuple:
+        return (stat_result.st_mtime_ns, stat_result.st_size)
+
+    def stat_key(self) -> tuple:
+        """Clau de versió; llança FileNotFoundError si el fitxer no existeix"""
+        return (self._stat_key(self.path().stat()), DATABASE_WRITE_LOG.stat_key())
+
+    def read(self) -> DatabaseSnapshot:
+        path = self.path()
+        with open(path, 'rb') as f:
+            # Llegir i fer stat del mateix descriptor perquè clau i bytes coincideixin
+            stat_result = os.fstat(f.fileno())
+            content = f.read()
+        log_key, log_mtime, records = DATABASE_WRITE_LOG.read()
+
+        key = (self._stat_key(stat_result), log_key)
+        base_version = hashlib.sha256(content).hexdigest()[:20]
+        changes = [
+            change
+            for record in records if record.get('base') == base_version
+            for change in record.get('changes', [])
+        ]
+        if not changes:
+            return DatabaseSnapshot(path, key, content, stat_result.st_mtime)
+
+        data = json.loads(content.decode('utf-8'))
+        processes = _processes_by_id(data)
+        for change in changes:
+            try:
+                _apply_tag_change(data, change, processes)
+            except KeyError:
+                continue
+        return DatabaseSnapshot(
+            path, key, _encode_database(data), max(stat_result.st_mtime, log_mtime), base_version,
+        )
+
+    def write(self, data: dict, keys=None) -> None:
+        _write_bytes_atomic(self.path(), _encode_database(data))
+
+_PROCESSES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS processes (
+    pk INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    process_id TEXT,
+    position INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    mechanism TEXT NOT NULL,
+    name_order TEXT NOT NULL,
+    priority_rank INTEGER NOT NULL,
+    complexity_rank INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS processes_position ON processes (position, key);
+CREATE INDEX IF NOT EXISTS processes_name ON processes (name_order, key);
+CREATE INDEX IF NOT EXISTS processes_priority ON processes (priority_rank, name_order, key);
+CREATE INDEX IF NOT EXISTS processes_complexity ON processes (complexity_rank, name_order, key);
+CREATE INDEX IF NOT EXISTS processes_category ON processes (category);
+CREATE INDEX IF NOT EXISTS processes_mechanism ON processes (mechanism);
+CREATE TABLE IF NOT EXISTS process_values (
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    process INTEGER NOT NULL,
+    PRIMARY KEY (kind, value, process)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS process_values_process ON process_values (process);
+CREATE TABLE IF NOT EXISTS lists (name TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tag_colors (tag TEXT PRIMARY KEY, position INTEGER NOT NULL, color TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pending_changes (seq INTEGER PRIMARY KEY, change TEXT NOT NULL)
+"""
+
+class SqliteDatabaseStorage:
+    """Base de dades de processos en un fitxer SQLite (DOC_FINDER_STORAGE=sqlite).
+
+    Cada procés és una fila amb les columnes de filtre i ordenació indexades i
+    el JSON original (que conserva els camps addicionals); tags, objectes i
+    integracions van a ``process_values`` i el text a una taula FTS5.
+    /api/processes, /api/facets i /api/search es resolen amb consultes SQL
+    sobre aquestes taules, i les escriptures de tags només toquen els
+    processos afectats. El JSON sencer (``/processes-database.json``) només es
+    materialitza quan algú el demana (``SqliteDatabaseSnapshot``).
+
+    processes-database.json continua sent l'origen: si canvia al disc (p. ex.
+    el regenera l'script generador) s'hi torna a importar, reaplicant-hi els
+    canvis de tags que encara no s'hi han escrit (``pending_changes``). La
+    compactació de DATABASE_WRITE_LOG hi escriu els canvis (``write_back``).
+    """
+
+    name = 'sqlite'
+    uses_write_log = False
+    sql_queries = True
+    SCHEMA_VERSION = '2'
+    # Camps de llista que es desen com a relacions (tipus a process_values)
+    RELATIONS = (('tags', 'tag'), ('objects', 'object'), ('integrations', 'integration'))
+    # Columnes de la taula FTS5, amb els pesos de SearchIndex per a bm25()
+    FTS_COLUMNS = ('name', 'description', 'tags', 'objects', 'integrations', 'mechanism', 'category')
+    # Clau d'ordenació de /api/processes (la mateixa que ProcessCatalog.sort_key)
+    SORT_COLUMNS = {
+        'position': ('position', 'key'),
+        'name': ('name_order', 'key'),
+        'priority': ('priority_rank', 'name_order', 'key'),
+        'complexity': ('complexity_rank', 'name_order', 'key'),
+    }
+
+    def __init__(self, path: Path | None = None):
+        self._path = Path(path) if path else None
+        self._local = threading.local()
+        self.fts = True
+
+    def path(self) -> Path:
+        return self._path or state_directory() / 'processes.sqlite3'
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connexió del fil actual (les connexions no es comparteixen entre fils ni processos)"""
+        path = self.path()
+        owner = (os.getpid(), path)
+        cached = getattr(self._local, 'connection', None)
+        if cached is not None and cached[0] == owner:
+            return cached[1]
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with _DATABASE_WRITE_LOCK:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+                schema = self._meta(connection, 'schema')
+                previous = self._export(connection) if schema not in (None, self.SCHEMA_VERSION) else None
+                if previous is not None:
+                    for table in ('processes', 'process_values', 'lists', 'tag_colors', 'processes_fts'):
+                        connection.execute(f'DROP TABLE IF EXISTS {table}')
+                self._create_tables(connection)
+                if schema is None:
+                    connection.executemany(
+                        'INSERT INTO meta (key, value) VALUES (?, ?)',
+                        [('generation', '0'), ('updated_at', '0')],
+                    )
+                if self._meta(connection, 'instance') is None:
+                    # Forma part de la versió: dues bases de dades diferents mai comparteixen versions
+                    self._set_meta(connection, 'instance', uuid.uuid4().hex)
+                self._set_meta(connection, 'schema', self.SCHEMA_VERSION)
+                if previous is not None:
+                    self._write(connection, previous)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        self._local.connection = (owner, connection)
+        if previous is not None:
+            print(f"🔁 Base de dades SQLite migrada a l'esquema {self.SCHEMA_VERSION} ({len(previous.get('processes', []))} processos)")
+            # Els canvis desats amb l'esquema anterior encara no són al JSON
+            DATABASE_WRITE_LOG.schedule_compaction()
+        return connection
+
+    def _create_tables(self, connection: sqlite3.Connection) -> None:
+        for statement in _PROCESSES_SCHEMA.split(';'):
+            connection.execute(statement)
+        try:
+            connection.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS processes_fts USING fts5("
+                f"{', '.join(self.FTS_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError:
+            self.fts = False  # SQLite compilat sense FTS5
+
+    @staticmethod
+    def _meta(connection: sqlite3.Connection, key: str) -> str | None:
+        row = connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    @staticmethod
+    def _set_meta(connection: sqlite3.Connection, key: str, value) -> None:
+        connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    @staticmethod
+    def _json_key() -> str | None:
+        """mtime i mida de processes-database.json (None si no existeix)"""
+        try:
+            stat = database_path().stat()
+        except FileNotFoundError:
+            return None
+        return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+    def exists(self) -> bool:
+        return self._meta(self._connection(), 'generation') != '0' or self._json_key() is not None
+
+    def stat_key(self) -> tuple:
+        """Clau de versió; llança FileNotFoundError si no hi ha dades ni JSON per importar"""
+        json_key = self._json_key()
+        generation = self._meta(self._connection(), 'generation')
+        if generation == '0' and json_key is None:
+            raise FileNotFoundError(self.path())
+        return (generation, json_key)
+
+    def _sync_json(self, connection: sqlite3.Connection) -> str | None:
+        """Importa processes-database.json si ha canviat des de la darrera importació; en retorna la clau"""
+        json_key = self._json_key()
+        if json_key is not None and json_key != self._meta(connection, 'json_source'):
+            self._import_json(json_key)
+        return json_key
+
+    def _state(self, connection: sqlite3.Connection) -> tuple[str, str, float]:
+        """Generació, versió i data de modificació actuals; FileNotFoundError si la base de dades és buida"""
+        meta = dict(connection.execute(
+            "SELECT key, value FROM meta WHERE key IN ('generation', 'instance', 'updated_at')"
+        ))
+        generation = meta.get('generation', '0')
+        if generation == '0':
+            raise FileNotFoundError(self.path())
+        version = hashlib.sha256(f"{meta.get('instance')}:{generation}".encode('utf-8')).hexdigest()[:20]
+        return generation, version, float(meta.get('updated_at') or 0)
+
+    @contextmanager
+    def _reading(self, generation: str | None = None):
+        """Transacció de lectura: totes les consultes veuen la mateixa generació.
+
+        Amb ``generation``, llança StaleIndexError si la base de dades ja n'és una altra.
+        """
+        connection = self._connection()
+        self._sync_json(connection)
+        connection.execute('BEGIN')
+        try:
+            current, version, updated_at = self._state(connection)
+            if generation is not None and current != generation:
+                raise StaleIndexError(generation)
+            yield connection, version, updated_at
+        finally:
+            connection.execute('COMMIT')
+
+    def read(self) -> DatabaseSnapshot:
+        connection = self._connection()
+        json_key = self._sync_json(connection)
+        generation, version, updated_at = self._state(connection)
+        return SqliteDatabaseSnapshot(self, (generation, json_key), generation, version, updated_at)
+
+    def export(self, generation: str) -> dict:
+        """JSON sencer (forma ProcessesDatabase) de la generació indicada"""
+        with self._reading(generation) as (connection, _, _):
+            return self._export(connection)
+
+    def fingerprints(self, generation: str) -> tuple[list[tuple[str, object, str]], dict]:
+        """Clau, id i empremta de cada procés i llistes de nivell superior, sense exportar el JSON"""
+        with self._reading(generation) as (connection, _, _):
+            rows = connection.execute('SELECT key, process_id, fingerprint FROM processes ORDER BY position').fetchall()
+            ids = _decode_process_ids([row[1] for row in rows])
+            entries = [(key, process_id, fingerprint) for (key, _, fingerprint), process_id in zip(rows, ids)]
+            return entries, self._lists(connection)
+
+    def tag_state(self, generation: str, ids) -> tuple[list[dict], list, dict]:
+        """Processos ``ids``, llista global de tags i colors de la generació indicada"""
+        with self._reading(generation) as (connection, _, _):
+            rows = {}
+            self._load_rows(connection, rows, list(ids))
+            lists = self._lists(connection)
+        return (
+            [rows[process_id][2] for process_id in ids if process_id in rows],
+            lists.get('tags', []),
+            lists.get('tagColors', {}),
+        )
+
+    def _import_json(self, json_key: str) -> None:
+        """Importa processes-database.json (s'ha modificat des de la darrera importació)"""
+        connection = self._connection()
+        with _DATABASE_WRITE_LOCK:
+            if json_key == self._meta(connection, 'json_source'):
+                return
+            try:
+                data = json.loads(database_path().read_bytes().decode('utf-8'))
+                if not isinstance(data, dict):
+                    raise ValueError("l'arrel ha de ser un objecte")
+            except (OSError, ValueError) as e:
+                print(f"⚠️  No s'ha pogut importar {database_path().name} a SQLite: {e}")
+                data = None
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                replayed = 0
+                if data is not None:
+                    # Els canvis de tags que encara no són al JSON no es perden amb la importació
+                    processes = _processes_by_id(data)
+                    for (change,) in connection.execute('SELECT change FROM pending_changes ORDER BY seq').fetchall():
+                        try:
+                            _apply_tag_change(data, json.loads(change), processes)
+                            replayed += 1
+                        except KeyError:
+                            continue
+                    self._write(connection, data)
+                self._set_meta(connection, 'json_source', json_key)
+                if not replayed:
+                    self._set_meta(connection, 'json_generation', self._meta(connection, 'generation'))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        if data is not None:
+            suffix = f", {replayed} canvis de tags reaplicats" if replayed else ''
+            print(f"📥 {database_path().name} importat a SQLite ({len(data.get('processes', []))} processos{suffix})")
+
+    def write(self, data: dict, keys=None) -> None:
+        """Desa ``data`` (forma ProcessesDatabase); amb ``keys`` només es revisen aquests processos"""
+        connection = self._connection()
+        with _DATABASE_WRITE_LOCK:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._write(connection, data, keys)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        DATABASE_WRITE_LOG.schedule_compaction()
+
+    def apply_tag_changes(self, groups: list[list[dict]]) -> list[KeyError | None]:
+        """Aplica grups de canvis de tags (cadascun tot o res) llegint i desant només els processos afectats.
+
+        Retorna, per cada grup, None o el KeyError del primer procés que no
+        existeix. Els canvis aplicats es guarden a ``pending_changes`` fins que
+        ``write_back`` els escriu a processes-database.json.
+        """
+        connection = self._connection()
+        errors: list[KeyError | None] = []
+        with _DATABASE_WRITE_LOCK:
+            self._sync_json(connection)
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                lists = self._lists(connection)
+                data = {'tags': lists.get('tags', []), 'tagColors': lists.get('tagColors', {})}
+                rows: dict[str, tuple[int, int, dict]] = {}
+
+                def collect_tags(key: str) -> list[str]:
+                    pk, position, process = rows[key]
+                    self._store_process(connection, pk, key, position, process)
+                    return [value for (value,) in connection.execute(
+                        "SELECT DISTINCT value FROM process_values WHERE kind = 'tag' ORDER BY value"
+                    )]
+
+                for changes in groups:
+                    keys = [str(change['id']) for change in changes if 'id' in change]
+                    self._load_rows(connection, rows, keys)
+                    missing = next((key for key in keys if key not in rows), None)
+                    if missing is not None:
+                        errors.append(KeyError(missing))
+                        continue
+                    processes = {key: rows[key][2] for key in keys}
+                    for change in changes:
+                        _apply_tag_change(data, change, processes, collect_tags)
+                    connection.executemany(
+                        'INSERT INTO pending_changes (change) VALUES (?)',
+                        [(json.dumps(change, ensure_ascii=False),) for change in changes],
+                    )
+                    errors.append(None)
+
+                if any(error is None for error in errors):
+                    self._store_lists(connection, data)
+                    self._bump_generation(connection)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return errors
+
+    def write_back(self) -> bool:
+        """Escriu a processes-database.json la generació actual si el JSON no la reflecteix"""
+        connection = self._connection()
+        with _DATABASE_WRITE_LOCK:
+            # Si el JSON ha canviat per fora, primer s'importa (amb els canvis pendents reaplicats)
+            self._sync_json(connection)
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                generation = self._meta(connection, 'generation')
+                if generation == '0' or generation == self._meta(connection, 'json_generation'):
+                    connection.execute('COMMIT')
+                    return False
+                _write_bytes_atomic(database_path(), _encode_database(self._export(connection)))
+                self._set_meta(connection, 'json_source', self._json_key())
+                self._set_meta(connection, 'json_generation', generation)
+                connection.execute('DELETE FROM pending_changes')
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return True
+
+    def _load_rows(self, connection: sqlite3.Connection, rows: dict, keys: list[str]) -> None:
+        """Afegeix a ``rows`` (clau -> (pk, posició, procés)) els processos amb id de ``keys`` que falten"""
+        missing = [key for key in dict.fromkeys(keys) if key not in rows]
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            for pk, key, position, data in connection.execute(
+                f"SELECT pk, key, position, data FROM processes WHERE key IN ({', '.join('?' * len(chunk))}) "
+                'AND process_id IS NOT NULL',
+                chunk,
+            ):
+                rows[key] = (pk, position, json.loads(data))
+
+    def _write(self, connection: sqlite3.Connection, data: dict, keys=None) -> None:
+        stored = {
+            key: (pk, position, fingerprint)
+            for key, pk, position, fingerprint in connection.execute(
+                'SELECT key, pk, position, fingerprint FROM processes'
+                if keys is None else
+                f"SELECT key, pk, position, fingerprint FROM processes WHERE key IN ({', '.join('?' * len(keys))})",
+                [] if keys is None else list(keys),
+            )
+        }
+        seen = set()
+        for position, process in enumerate(data.get('processes', [])):
+            if not isinstance(process, dict):
+                continue
+            key = SearchIndex.process_key(process, position)
+            if keys is not None and key not in keys:
+                continue
+            seen.add(key)
+            encoded, fingerprint = self._encode_process(process)
+            current = stored.get(key)
+            if current is not None and current[2] == fingerprint:
+                if current[1] != position:
+                    connection.execute('UPDATE processes SET position = ? WHERE pk = ?', (position, current[0]))
+                continue
+            self._store_process(connection, current[0] if current else None, key, position, process, encoded, fingerprint)
+
+        if keys is None:
+            for key, (pk, _, _) in stored.items():
+                if key not in seen:
+                    self._delete_process(connection, pk)
+
+        self._store_lists(connection, data)
+        # Ordre de les claus de nivell superior, per exportar el mateix JSON
+        self._set_meta(connection, 'layout', json.dumps(list(data), ensure_ascii=False))
+        self._bump_generation(connection)
+
+    def _store_lists(self, connection: sqlite3.Connection, data: dict) -> None:
+        """Desa les llistes de nivell superior de ``data`` (les que no hi són es conserven)"""
+        connection.executemany(
+            'INSERT OR REPLACE INTO lists (name, data) VALUES (?, ?)',
+            [
+                (name, json.dumps(value, ensure_ascii=False))
+                for name, value in data.items() if name not in ('processes', 'tagColors')
+            ],
+        )
+        if 'tagColors' in data:
+            connection.execute('DELETE FROM tag_colors')
+            connection.executemany(
+                'INSERT INTO tag_colors (tag, position, color) VALUES (?, ?, ?)',
+                [(tag, position, str(color)) for position, (tag, color) in enumerate((data['tagColors'] or {}).items())],
+            )
+        layout = json.loads(self._meta(connection, 'layout') or '[]')
+        added = [name for name in data if name not in layout]
+        if layout and added:
+            self._set_meta(connection, 'layout', json.dumps(layout + added, ensure_ascii=False))
+
+    def _bump_generation(self, connection: sqlite3.Connection) -> None:
+        self._set_meta(connection, 'generation', int(self._meta(connection, 'generation')) + 1)
+        self._set_meta(connection, 'updated_at', time.time())
+
+    @staticmethod
+    def _encode_process(process: dict) -> tuple[str, str]:
+        encoded = json.dumps(process, ensure_ascii=False)
+        return encoded, hashlib.blake2b(encoded.encode('utf-8'), digest_size=12).hexdigest()
+
+    def _store_process(
+        self, connection: sqlite3.Connection, pk: int | None, key: str, position: int,
+        process: dict, encoded: str | None = None, fingerprint: str | None = None,
+    ) -> None:
+        if encoded is None or fingerprint is None:
+            encoded, fingerprint = self._encode_process(process)
+        sort_keys = [ProcessCatalog.sort_key(sort, position, process) for sort in ('name', 'priority', 'complexity')]
+        process_id = process.get('id')
+        columns = (
+            None if process_id is None else json.dumps(process_id, ensure_ascii=False),
+            # Com FacetIndex, els valors que no són text no compten com a filtre
+            *(value if isinstance(value, str) else '' for value in (process.get('category'), process.get('mechanism'))),
+            sort_keys[0][0], sort_keys[1][0], sort_keys[2][0],
+        )
+        if pk is None:
+            pk = connection.execute(
+                'INSERT INTO processes (key, position, process_id, category, mechanism, name_order, priority_rank, '
+                'complexity_rank, fingerprint, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, position, *columns, fingerprint, encoded),
+            ).lastrowid
+        else:
+            connection.execute(
+                'UPDATE processes SET position = ?, process_id = ?, category = ?, mechanism = ?, name_order = ?, '
+                'priority_rank = ?, complexity_rank = ?, fingerprint = ?, data = ? WHERE pk = ?',
+                (position, *columns, fingerprint, encoded, pk),
+            )
+            connection.execute('DELETE FROM process_values WHERE process = ?', (pk,))
+            if self.fts:
+                connection.execute('DELETE FROM processes_fts WHERE rowid = ?', (pk,))
+
+        relations = {field: _field_values(process.get(field)) for field, _ in self.RELATIONS}
+        connection.executemany(
+            'INSERT OR IGNORE INTO process_values (kind, value, process) VALUES (?, ?, ?)',
+            [(kind, value, pk) for field, kind in self.RELATIONS for value in relations[field]],
+        )
+        if self.fts:
+            connection.execute(
+                f"INSERT INTO processes_fts (rowid, {', '.join(self.FTS_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' * len(self.FTS_COLUMNS))})",
+                (
+                    pk,
+                    *(
+                        ' '.join(relations[field]) if field in relations else _field_text(process.get(field))
+                        for field in self.FTS_COLUMNS
+                    ),
+                ),
+            )
+
+    def _delete_process(self, connection: sqlite3.Connection, pk: int) -> None:
+        connection.execute('DELETE FROM processes WHERE pk = ?', (pk,))
+        connection.execute('DELETE FROM process_values WHERE process = ?', (pk,))
+        if self.fts:
+            connection.execute('DELETE FROM processes_fts WHERE rowid = ?', (pk,))
+
+    def _lists(self, connection: sqlite3.Connection) -> dict:
+        """Llistes de nivell superior (tot menys ``processes``) amb l'ordre de claus original"""
+        layout = json.loads(self._meta(connection, 'layout') or '[]') or list(_empty_database())
+        lists = {name: json.loads(value) for name, value in connection.execute('SELECT name, data FROM lists')}
+        result = {}
+        for name in layout:
+            if name == 'tagColors':
+                result[name] = dict(connection.execute('SELECT tag, color FROM tag_colors ORDER BY position'))
+            elif name in lists:
+                result[name] = lists[name]
+        return result
+
+    def _export(self, connection: sqlite3.Connection) -> dict:
+        """Reconstrueix el JSON (forma ProcessesDatabase) amb l'ordre de claus original"""
+        layout = json.loads(self._meta(connection, 'layout') or '[]') or list(_empty_database())
+        lists = self._lists(connection)
+        data = {}
+        for name in layout:
+            if name == 'processes':
+                data[name] = [
+                    json.loads(value)
+                    for (value,) in connection.execute('SELECT data FROM processes ORDER BY position')
+                ]
+            elif name in lists:
+                data[name] = lists[name]
+        return data
+
+    # Consultes de l'API (sense materialitzar el JSON)
+
+    def _search_clause(self, query: str) -> tuple[str, list]:
+        """Condició sobre ``p`` dels processos que contenen tots els termes (per prefix), com SearchIndex"""
+        terms = list(dict.fromkeys(_tokenize(query)))
+        if not terms:
+            return '0', []
+        if self.fts:
+            expression = ' '.join(f'"{term}"*' for term in terms)
+            return 'p.pk IN (SELECT rowid FROM processes_fts WHERE processes_fts MATCH ?)', [expression]
+        # Sense FTS5: coincidència aproximada de cada terme dins del JSON del procés
+        return ' AND '.join('p.data LIKE ?' for _ in terms), [f'%{term}%' for term in terms]
+
+    def _conditions(self, filters: dict[str, str], search: str, skip: str | None = None) -> tuple[list[str], list]:
+        """Condicions SQL (sobre ``p``) dels filtres de FacetIndex.DIMENSIONS i de la cerca"""
+        clauses: list[str] = []
+        params: list = []
+        for name, field, _ in FacetIndex.DIMENSIONS:
+            value = filters.get(name)
+            if not value or name == skip:
+                continue
+            if any(field == relation for relation, _ in self.RELATIONS):
+                clauses.append('p.pk IN (SELECT process FROM process_values WHERE kind = ? AND value = ?)')
+                params += [name, value]
+            else:
+                clauses.append(f'p.{field} = ?')
+                params.append(value)
+        if search:
+            clause, search_params = self._search_clause(search)
+            clauses.append(clause)
+            params += search_params
+        return clauses, params
+
+    @staticmethod
+    def _where(clauses: list[str]) -> str:
+        return f" WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    def process_page(
+        self, filters: dict[str, str], search: str, sort: str, descending: bool,
+        offset: int, limit: int, after: tuple | None = None,
+    ) -> tuple[str, float, tuple[list[dict], list[bytes], int, tuple | None]]:
+        """Pàgina de /api/processes amb ORDER BY/LIMIT sobre les columnes d'ordenació indexades.
+
+        Retorna la versió, la data de modificació i el mateix que ProcessCatalog.page.
+        """
+        columns = ', '.join(f'p.{column}' for column in self.SORT_COLUMNS[sort])
+        direction = ' DESC' if descending else ''
+        order = ', '.join(f'p.{column}{direction}' for column in self.SORT_COLUMNS[sort])
+        with self._reading() as (connection, version, updated_at):
+            clauses, params = self._conditions(filters, search)
+            total = connection.execute(f'SELECT COUNT(*) FROM processes p{self._where(clauses)}', params).fetchone()[0]
+            if after is not None:
+                placeholders = ', '.join('?' * len(after))
+                clauses.append(f"({columns}) {'<' if descending else '>'} ({placeholders})")
+                params = [*params, *after]
+            rows = connection.execute(
+                f'SELECT p.data, {columns} FROM processes p{self._where(clauses)} ORDER BY {order} LIMIT ? OFFSET ?',
+                [*params, limit + 1, offset],
+            ).fetchall()
+        # La fila de més indica que hi ha pàgina següent: el cursor continua després de l'última de la pàgina
+        next_key = tuple(rows[limit - 1][1:]) if len(rows) > limit else None
+        rows = rows[:limit]
+        page = ([json.loads(row[0]) for row in rows], [row[0].encode('utf-8') for row in rows], total, next_key)
+        return version, updated_at, page
+
+    def facets(self, filters: dict[str, str], search: str) -> tuple[str, list, dict[str, dict[str, int]]]:
+        """Versió, ids filtrats i recomptes per faceta de /api/facets (cada faceta sense el seu propi filtre)"""
+        with self._reading() as (connection, version, _):
+            lists = self._lists(connection)
+            clauses, params = self._conditions(filters, search)
+            ids = _decode_process_ids([
+                process_id for (process_id,) in connection.execute(
+                    f'SELECT p.process_id FROM processes p{self._where(clauses)} ORDER BY p.position', params,
+                )
+            ])
+            counts: dict[str, dict[str, int]] = {}
+            for name, field, list_key in FacetIndex.DIMENSIONS:
+                clauses, params = self._conditions(filters, search, skip=name)
+                if any(field == relation for relation, _ in self.RELATIONS):
+                    found = dict(connection.execute(
+                        'SELECT v.value, COUNT(*) FROM process_values v JOIN processes p ON p.pk = v.process '
+                        f"WHERE v.kind = ?{''.join(f' AND {clause}' for clause in clauses)} GROUP BY v.value",
+                        [name, *params],
+                    ))
+                    present = connection.execute('SELECT DISTINCT value FROM process_values WHERE kind = ?', (name,))
+                else:
+                    found = dict(connection.execute(
+                        f"SELECT p.{field}, COUNT(*) FROM processes p{self._where([*clauses, f'p.{field} != ?'])} "
+                        f'GROUP BY p.{field}',
+                        [*params, ''],
+                    ))
+                    present = connection.execute(f"SELECT DISTINCT {field} FROM processes WHERE {field} != ''")
+                # Mateix ordre que FacetIndex: la llista de nivell superior i després els valors no declarats
+                # de tota la base de dades (amb recompte 0 si el filtre actual no en deixa cap)
+                declared = [value for value in lists.get(list_key, []) if isinstance(value, str)]
+                extra = sorted(value for (value,) in present if value not in set(declared))
+                counts[name] = {value: found.get(value, 0) for value in dict.fromkeys(declared + extra)}
+        return version, ids, counts
+
+    def search(self, query: str, limit: int) -> tuple[str, int, list[tuple[dict, float]]]:
+        """Versió, total i ``limit`` processos més rellevants per a /api/search (bm25 amb els pesos de SearchIndex)"""
+        with self._reading() as (connection, version, _):
+            clause, params = self._search_clause(query)
+            total = connection.execute(f'SELECT COUNT(*) FROM processes p WHERE {clause}', params).fetchone()[0]
+            if not total:
+                return version, 0, []
+            if self.fts:
+                weights = dict(SearchIndex.FIELDS)
+                rank = f"bm25(processes_fts, {', '.join(str(weights[column]) for column in self.FTS_COLUMNS)})"
+                rows = connection.execute(
+                    f'SELECT p.data, -{rank} FROM processes_fts JOIN processes p ON p.pk = processes_fts.rowid '
+                    f'WHERE processes_fts MATCH ? ORDER BY {rank} LIMIT ?',
+                    [*params, limit],
+                ).fetchall()
+            else:
+                rows = connection.execute(
+                    f'SELECT p.data, 0.0 FROM processes p WHERE {clause} ORDER BY p.position LIMIT ?', [*params, limit],
+                ).fetchall()
+        return version, total, [(json.loads(data), score) for data, score in rows]
+
+def _decode_process_ids(values: list[str | None]) -> list:
+    """Ids originals dels processos (columna ``process_id``: JSON, o NULL si no en tenen), amb un sol parseig"""
+    return json.loads(f"[{','.join('null' if value is None else value for value in values)}]")
+
+def _field_text(value) -> str:
+    return value if isinstance(value, str) else '' if value is None else str(value)
+
+def _field_values(value) -> list[str]:
+    values = value if isinstance(value, list) else [value]
+    return list(dict.fromkeys(item for item in values if isinstance(item, str) and item))
+
+def _create_database_storage(name: str = STORAGE_BACKEND):
+    if name == 'sqlite':
+        return SqliteDatabaseStorage(SQLITE_DATABASE_PATH or None)
+    if name != 'json':
+        print(f"⚠️  DOC_FINDER_STORAGE='{name}' no és vàlid; s'usarà 'json'")
+    return JsonDatabaseStorage()
+
+DATABASE_STORAGE = _create_database_storage()
+
+def export_database(target: str) -> int:
+    """Escriu la base de dades actual (forma ProcessesDatabase) a ``target`` ('-' per stdout)"""
+    snapshot = DATABASE_CACHE.get()
+    if target == '-':
+        sys.stdout.buffer.write(snapshot.content + b'\n')
+    else:
+        _write_bytes_atomic(Path(target), snapshot.content)
+    return len(snapshot.data.get('processes', []))
+
+def import_database(source: str) -> int:
+    """Substitueix la base de dades pel contingut d'un fitxer JSON amb la forma ProcessesDatabase"""
+    data = json.loads(Path(source).read_text(encoding='utf-8'))
+    if not isinstance(data, dict) or not isinstance(data.get('processes', []), list):
+        raise ValueError('El fitxer no té la forma de processes-database.json')
+    with _DATABASE_WRITE_LOCK:
+        DATABASE_STORAGE.write(data)
+        DATABASE_WRITE_LOG.clear()
+        # Amb SQLite, processes-database.json també passa a tenir el contingut importat
+        DATABASE_WRITE_LOG.compact()
+    return len(data.get('processes', []))
+
+class Job:
+    """Treball en segon pla amb estat queued -> running -> done/failed"""
+
+    def __init__(self, kind: str, items: list):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.items = list(items)
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.result = None
+        self.error: str | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'items': len(self.items),
+            'createdAt': self.created_at,
+            'updatedAt': self.updated_at,
+            'result': self.result,
+            'error': self.error,
+        }
+
+class JobQueue:
+    """Cua de treballs en segon pla amb un nombre limitat de fils.
+
+    Els treballs del mateix tipus que encara esperen a la cua es fusionen: una
+    ràfega de pujades acaba en una sola regeneració de la base de dades.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_kept: int = 500):
+        self.workers = max(1, workers)
+        self.max_kept = max_kept
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=JOB_QUEUE_SIZE)
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._pending: dict[str, Job] = {}
+        self._handlers: dict[str, object] = {}
+        self._threads: list[threading.Thread] = []
+        self._persist_directory: Path | None = None
+
+    JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def persist_to(self, directory: Path) -> None:
+        """Desa l'estat dels treballs a disc perquè qualsevol procés el pugui consultar (mode prefork)"""
+        directory.mkdir(parents=True, exist_ok=True)
+        self._persist_directory = directory
+
+    def _persist(self, state: dict) -> None:
+        if self._persist_directory is None:
+            return
+        try:
+            path = self._persist_directory / f"{state['id']}.json"
+            _write_bytes_atomic(path, json.dumps(state, ensure_ascii=False).encode('utf-8'))
+        except OSError as error:
+            print(f"⚠️  No s'ha pogut desar l'estat del treball {state['id']}: {error}")
+
+    def register(self, kind: str, handler) -> None:
+        """Registra la funció que processa els treballs ``kind`` (rep la llista d'elements)"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, items: list) -> Job:
+        # Buscar el treball pendent, ampliar-lo o crear-ne un i encuar-lo és una
+        # sola secció crítica: dues peticions simultànies no poden crear-ne dos
+        expired: list[str] = []
+        with self._lock:
+            job = self._pending.get(kind)
+            if job is not None and job.status == 'queued':
+                job.items.extend(items)
+                job.updated_at = time.time()
+                queued = True
+            else:
+                job = Job(kind, items)
+                self._jobs[job.id] = job
+                while len(self._jobs) > self.max_kept:
+                    expired.append(self._jobs.popitem(last=False)[0])
+                self._ensure_workers()
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    queued = False
+                else:
+                    self._pending[kind] = job
+                    queued = True
+            state = job.to_dict()
+
+        if self._persist_directory is not None:
+            for job_id in expired:
+                try:
+                    (self._persist_directory / f'{job_id}.json').unlink()
+                except FileNotFoundError:
+                    pass
+        if not queued:
+            self._finish(job, 'failed', error='La cua de treballs està plena')
+            return job
+        self._persist(state)
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+        # En mode prefork el treball pot pertànyer a un altre procés
+        if self._persist_directory is None or not self.JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._persist_directory / f'{job_id}.json', 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _ensure_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f'doc-finder-job-{len(self._threads)}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _finish(self, job: Job, status: str, result=None, error: str | None = None) -> None:
+        with self._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.updated_at = time.time()
+            state = job.to_dict()
+        self._persist(state)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                # A partir d'ara les noves peticions creen un treball nou
+                if self._pending.get(job.kind) is job:
+                    del self._pending[job.kind]
+                job.status = 'running'
+                job.updated_at = time.time()
+                items = list(job.items)
+                state = job.to_dict()
+            self._persist(state)
+
+            try:
+                handler = self._handlers[job.kind]
+                result = handler(items)
+            except Exception as error:  # noqa: BLE001 - l'error es reporta via /api/jobs
+                print(f"⚠️  Error al treball {job.kind} {job.id}: {error}")
+                self._finish(job, 'failed', error=str(error))
+            else:
+                self._finish(job, 'done', result=result)
+            finally:
+                self._queue.task_done()
+
+JOB_QUEUE = JobQueue()
+
+def _regenerate_database_job(items: list) -> dict:
+    paths = [Path(item) for item in dict.fromkeys(items)]
+    started = time.perf_counter()
+    summary = update_database_entries(paths)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(
+        f"✅ Base de dades actualitzada en {elapsed_ms:.1f} ms "
+        f"({summary['added']} noves, {summary['updated']} actualitzades, {summary['removed']} eliminades)"
+    )
+    return summary
+
+JOB_QUEUE.register('database', _regenerate_database_job)
+
+class EventBroker:
+    """Difon esdeveniments a les connexions Server-Sent Events obertes"""
+
+    def __init__(self, max_subscribers: int):
+        self.max_subscribers = max(1, max_subscribers)
+        self._lock = threading.Lock()
+        self._subscribers: list[queue.Queue] = []
+        self._closed = False
+
+    def subscribe(self) -> queue.Queue | None:
+        """Retorna la cua del subscriptor o None si s'ha arribat al màxim"""
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber: queue.Queue = queue.Queue(maxsize=100)
+            self._subscribers.append(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def publish(self, event: dict | None) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Un client lent perd l'esdeveniment més antic, no bloqueja els altres
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def close(self) -> None:
+        """Tanca totes les connexions (None indica als subscriptors que acabin)"""
+        with self._lock:
+            self._closed = True
+        self.publish(None)
+
+EVENT_BROKER = EventBroker(MAX_EVENT_STREAMS)
+
+def _format_event(event: dict) -> bytes:
+    lines = [f"event: {event.get('type', 'message')}"]
+    if event.get('version'):
+        lines.append(f"id: {event['version']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False)}")
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+def _stream_events(server, connection, subscriber: queue.Queue) -> None:
+    """Envia els esdeveniments de ``subscriber`` per ``connection`` fins que el client o el servidor tanquen"""
+    try:
+        while True:
+            try:
+                event = subscriber.get(timeout=SSE_HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                connection.sendall(b': ping\n\n')
+                continue
+            if event is None:
+                break
+            connection.sendall(_format_event(event))
+    except OSError:
+        pass
+    finally:
+        EVENT_BROKER.unsubscribe(subscriber)
+        server.release_request(connection)
+
+def _is_ignored_path(path: Path, root: Path) -> bool:
+    """Fitxers ocults i temporals (estat intern, pujades en curs, escriptures atòmiques)"""
+    try:
+        parts = path.relative_to(root).parts
+    except ValueError:
+        return True
+    return any(part.startswith('.') for part in parts)
+
+class _PollingWatchBackend:
+    """Detecta canvis comparant mtime i mida de tots els fitxers cada ``interval`` segons"""
+
+    name = 'polling'
+
+    def __init__(self, root: Path, interval: float):
+        self.root = root
+        self.interval = interval
+        self._state = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        state: dict[str, tuple[int, int]] = {}
+        pending = [str(self.root)]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                            else:
+                                stat_result = entry.stat()
+                                state[entry.path] = (stat_result.st_mtime_ns, stat_result.st_size)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return state
+
+    def wait(self, timeout: float) -> set[Path]:
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(max(timeout, 0))
+            return set()
+        if delay > 0:
+            time.sleep(delay)
+
+        current = self._scan()
+        self._next_scan = time.monotonic() + self.interval
+        changed = {path for path, key in current.items() if self._state.get(path) != key}
+        changed.update(path for path in self._state if path not in current)
+        self._state = current
+        return {Path(path) for path in changed}
+
+    def close(self) -> None:
+        pass
+
+class _InotifyWatchBackend:
+    """Backend basat en inotify (Linux) amb una vigilància per subdirectori"""
+
+    name = 'inotify'
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, root: Path):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify només està disponible a Linux')
+        self.root = root
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 ha fallat')
+        self._watches: dict[int, Path] = {}
+        self._add_tree(root)
+
+    def _add_watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch ha fallat per {directory}')
+        self._watches[wd] = directory
+
+    def _add_tree(self, directory: Path) -> None:
+        self._add_watch(directory)
+        for current, subdirectories, _ in os.walk(directory):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+            for name in subdirectories:
+                self._add_watch(Path(current) / name)
+
+    def wait(self, timeout: float) -> set[Path]:
+        readable, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed: set[Path] = set()
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', errors='surrogateescape')
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                # S'han perdut esdeveniments: tractar-ho com un canvi de tot el directori
+                changed.add(self.root)
+                continue
+            if mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            path = directory / name if name else directory
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO) and not name.startswith('.'):
+                try:
+                    self._add_tree(path)
+                except OSError:
+                    pass
+            changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+class DocumentsWatcher:
+    """Vigila DOCUMENTS_DIRECTORY i notifica els canvis agrupats (debounce)"""
+
+    def __init__(self, root: Path, mode: str = WATCH_MODE, debounce: float = WATCH_DEBOUNCE,
+                 poll_interval: float = WATCH_POLL_INTERVAL):
+        self.root = root
+        self.mode = mode
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend = None
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add_listener(self, callback) -> None:
+        """``callback(paths)`` rep el conjunt de rutes canviades de cada ràfega"""
+        self._listeners.append(callback)
+
+    def start(self) -> bool:
+        if self.mode == 'off' or self._thread is not None:
+            return False
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.mode in ('auto', 'inotify'):
+            try:
+                self.backend = _InotifyWatchBackend(self.root)
+            except (OSError, AttributeError) as e:
+                print(f"ℹ️  inotify no disponible ({e}), s'usarà polling")
+        if self.backend is None:
+            self.backend = _PollingWatchBackend(self.root, self.poll_interval)
+        self._thread = threading.Thread(target=self._run, name='doc-finder-watcher', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        pending: set[Path] = set()
+        deadline = 0.0
+        while not self._stop.is_set():
+            timeout = max(deadline - time.monotonic(), 0.0) if pending else 1.0
+            try:
+                changed = self.backend.wait(timeout)
+            except Exception as e:  # noqa: BLE001 - el vigilant no ha d'aturar el servidor
+                print(f"⚠️  Error vigilant documents: {e}")
+                time.sleep(self.poll_interval)
+                continue
+
+            changed = {path for path in changed if path == self.root or not _is_ignored_path(path, self.root)}
+            if changed:
+                pending |= changed
+                deadline = time.monotonic() + self.debounce
+            elif pending and time.monotonic() >= deadline:
+                batch, pending = pending, set()
+                for listener in self._listeners:
+                    try:
+                        listener(batch)
+                    except Exception as e:  # noqa: BLE001
+                        print(f"⚠️  Error processant canvis de documents: {e}")
+        self.backend.close()
+
+def _on_documents_changed(paths: set[Path]) -> None:
+    """Invalida caches afectades i avisa els clients SSE del canvi"""
+    DOCUMENT_STORE.invalidate()
+    FULLTEXT_INDEX.mark_dirty()
+    # Si no es pot llegir la versió, l'avís surt igualment amb version None
+    # (el client torna a demanar la base de dades)
+    version = None
+    try:
+        snapshot = DATABASE_CACHE.get()
+        DATABASE_CHANGE_LOG.record(snapshot)
+        version = snapshot.version
+    except (FileNotFoundError, ValueError):
+        pass
+    except Exception as e:  # noqa: BLE001 - p. ex. StaleIndexError o "database is locked" amb SQLite
+        print(f"⚠️  No s'ha pogut llegir la versió de la base de dades per a l'avís de canvis: {e}")
+    relative = sorted(
+        path.relative_to(DOCUMENTS_DIRECTORY).as_posix() if path != DOCUMENTS_DIRECTORY else '.'
+        for path in paths
+    )
+    EVENT_BROKER.publish({'type': 'change', 'version': version, 'paths': relative[:100]})
+
+_TOKEN_PATTERN = re.compile(r'[0-9a-z]+')
+
+def _tokenize(text) -> list[str]:
+    """Normalitza (minúscules, sense accents) i separa un text en tokens"""
+    text = str(text).casefold()
+    if not text.isascii():
+        normalized = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in normalized if not unicodedata.combining(ch))
+    return _TOKEN_PATTERN.findall(text)
+
+class SearchIndex:
+    """Índex invertit sobre els processos de la base de dades.
+
+    Cada token apunta als processos que el contenen amb un pes segons el camp
+    (el nom pesa més que la descripció). Quan canvia la base de dades només es
+    reindexen els processos que han canviat.
+    """
+
+    FIELDS = (
+        ('name', 5.0),
+        ('tags', 4.0),
+        ('objects', 3.0),
+        ('integrations', 3.0),
+        ('mechanism', 2.0),
+        ('category', 2.0),
+        ('description', 1.0),
+    )
+    PREFIX_PENALTY = 0.5
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version: str | None = None
+        self._processes: dict[str, dict] = {}
+        self._fingerprints: dict[str, tuple] = {}
+        self._terms: dict[str, dict[str, float]] = {}
+        self._postings: dict[str, dict[str, float]] = {}
+        self._vocabulary: list[str] = []
+        self._vocabulary_dirty = False
+
+    @staticmethod
+    def process_key(process: dict, position: int) -> str:
+        process_id = process.get('id')
+        return str(process_id) if process_id is not None else f'#{position}'
+
+    def _fingerprint(self, process: dict) -> tuple:
+        values = []
+        for field, _ in self.FIELDS:
+            value = process.get(field)
+            values.append(tuple(value) if isinstance(value, list) else value)
+        return tuple(values)
+
+    def _extract_terms(self, process: dict) -> dict[str, float]:
+        terms: dict[str, float] = {}
+        for field, weight in self.FIELDS:
+            value = process.get(field)
+            if not value:
+                continue
+            texts = value if isinstance(value, list) else [value]
+            for text in texts:
+                for token in _tokenize(text):
+                    terms[token] = terms.get(token, 0.0) + weight
+        return terms
+
+    def _add(self, key: str, terms: dict[str, float]) -> None:
+        self._terms[key] = terms
+        for token, weight in terms.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                self._vocabulary_dirty = True
+            postings[key] = weight
+
+    def _remove(self, key: str) -> None:
+        for token in self._terms.pop(key, {}):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+
+    def sync(self, snapshot: DatabaseSnapshot) -> None:
+        """Actualitza l'índex a la versió indicada reindexant només els canvis"""
+        if snapshot.version == self.version:
+            return
+
+        with self._lock:
+            if snapshot.version == self.version:
+                return
+
+            processes = snapshot.data.get('processes', [])
+            seen = set()
+            for position, process in enumerate(processes):
+                if not isinstance(process, dict):
+                    continue
+                key = self.process_key(process, position)
+                seen.add(key)
+                self._processes[key] = process
+                fingerprint = self._fingerprint(process)
+                if self._fingerprints.get(key) == fingerprint:
+                    continue
+                self._remove(key)
+                self._add(key, self._extract_terms(process))
+                self._fingerprints[key] = fingerprint
+
+            for key in [key for key in self._processes if key not in seen]:
+                self._remove(key)
+                del self._processes[key]
+                self._fingerprints.pop(key, None)
+
+            # El vocabulari ordenat (per a la cerca per prefix) es refà un cop per versió
+            if self._vocabulary_dirty:
+                self._vocabulary = sorted(self._postings)
+                self._vocabulary_dirty = False
+            self.version = snapshot.version
+
+    def score(self, query: str) -> dict[str, float]:
+        """Puntua tots els processos que contenen tots els termes (per prefix)"""
+        terms = list(dict.fromkeys(_tokenize(query)))
+        if not terms:
+            return {}
+
+        with self._lock:
+            total_documents = max(len(self._processes), 1)
+            combined: dict[str, float] | None = None
+            for term in terms:
+                matches: dict[str, float] = {}
+                index = bisect.bisect_left(self._vocabulary, term)
+                while index < len(self._vocabulary) and self._vocabulary[index].startswith(term):
+                    token = self._vocabulary[index]
+                    postings = self._postings[token]
+                    boost = 1.0 if token == term else self.PREFIX_PENALTY
+                    factor = math.log(1.0 + total_documents / len(postings)) * boost
+                    for key, weight in postings.items():
+                        score = weight * factor
+                        if score > matches.get(key, 0.0):
+                            matches[key] = score
+                    index += 1
+
+                if not matches:
+                    return {}
+                if combined is None:
+                    combined = matches
+                else:
+                    combined = {key: value + matches[key] for key, value in combined.items() if key in matches}
+                    if not combined:
+                        return {}
+
+            return combined or {}
+
+    def versioned_score(self, query: str) -> tuple[str | None, dict[str, float]]:
+        """Com ``score``, amb la versió de la base de dades indexada quan s'ha calculat"""
+        with self._lock:
+            return self.version, self.score(query)
+
+    def search(self, query: str, limit: int = 20) -> tuple[int, list[tuple[dict, float]]]:
+        """Retorna el total de coincidències i els ``limit`` processos més rellevants"""
+        scores = self.score(query)
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        with self._lock:
+            return len(scores), [(self._processes[key], score) for key, score in ranked if key in self._processes]
+
+SEARCH_INDEX = SearchIndex()
+
+def _bitset_from_positions(positions, size: int) -> int:
+    """Construeix un bitset (enter de Python) amb els bits de ``positions`` activats"""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+def _iter_bits(mask: int):
+    """Itera les posicions dels bits activats d'un bitset en ordre creixent"""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield (byte_index << 3) + low.bit_length() - 1
+            byte ^= low
+
+class FacetIndex:
+    """Índex de facetes amb un bitset per cada valor de filtre.
+
+    El bit ``i`` de cada bitset correspon al procés ``i`` de la llista de
+    processos, de manera que combinar filtres i comptar resultats són
+    interseccions i ``bit_count()`` en lloc de recórrer tots els processos.
+    """
+
+    # (nom del filtre a FiltersState, camp del procés, llista de nivell superior)
+    DIMENSIONS = (
+        ('category', 'category', 'categories'),
+        ('mechanism', 'mechanism', 'mechanisms'),
+        ('object', 'objects', 'objects'),
+        ('integration', 'integrations', 'integrations'),
+        ('tag', 'tags', 'tags'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version: str | None = None
+        self.size = 0
+        self.all = 0
+        self._processes: list[dict] = []
+        self._positions: dict[str, int] = {}
+        self._bits: dict[str, dict[str, int]] = {}
+        self._values: dict[str, list[str]] = {}
+
+    def sync(self, snapshot: DatabaseSnapshot) -> None:
+        """Reconstrueix els bitsets si la versió de la base de dades ha canviat"""
+        if snapshot.version == self.version:
+            return
+
+        with self._lock:
+            if snapshot.version == self.version:
+                return
+
+            data = snapshot.data
+            processes = [process for process in data.get('processes', []) if isinstance(process, dict)]
+            size = len(processes)
+            positions_by_value: dict[str, dict[str, list[int]]] = {name: {} for name, _, _ in self.DIMENSIONS}
+
+            for position, process in enumerate(processes):
+                for name, field, _ in self.DIMENSIONS:
+                    value = process.get(field)
+                    values = value if isinstance(value, list) else [value]
+                    for item in values:
+                        if isinstance(item, str) and item:
+                            positions_by_value[name].setdefault(item, []).append(position)
+
+            bits: dict[str, dict[str, int]] = {}
+            ordered_values: dict[str, list[str]] = {}
+            for name, _, list_key in self.DIMENSIONS:
+                bits[name] = {
+                    value: _bitset_from_positions(positions, size)
+                    for value, positions in positions_by_value[name].items()
+                }
+                # Mantenir l'ordre de la llista de nivell superior i afegir valors no declarats
+                declared = [value for value in data.get(list_key, []) if isinstance(value, str)]
+                extra = sorted(value for value in bits[name] if value not in set(declared))
+                ordered_values[name] = list(dict.fromkeys(declared + extra))
+
+            self._processes = processes
+            self._positions = {
+                SearchIndex.process_key(process, position): position
+                for position, process in enumerate(processes)
+            }
+            self._bits = bits
+            self._values = ordered_values
+            self.size = size
+            self.all = (1 << size) - 1
+            self.version = snapshot.version
+
+    def _keys_mask(self, keys) -> int:
+        """Bitset dels processos identificats per claus de SearchIndex (amb el lock pres)"""
+        positions = [self._positions[key] for key in keys if key in self._positions]
+        return _bitset_from_positions(positions, self.size)
+
+    def query(self, filters: dict[str, str], keys=None) -> tuple[str | None, int, dict[str, dict[str, int]], list]:
+        """Aplica els filtres i retorna la versió, el bitset, els recomptes per faceta i els ids.
+
+        ``keys`` (claus de SearchIndex) limita els processos de partida. Tot es
+        calcula amb el lock pres, de manera que el resultat és d'una sola versió.
+        El recompte de cada faceta es calcula amb la resta de filtres aplicats
+        (no el propi), perquè el client pugui mostrar quants resultats donaria
+        canviar aquell filtre.
+        """
+        with self._lock:
+            base = self.all if keys is None else self._keys_mask(keys)
+            active = self._active_bits(filters)
+            mask = base
+            for value_mask in active.values():
+                mask &= value_mask
+
+            counts: dict[str, dict[str, int]] = {}
+            for name, _, _ in self.DIMENSIONS:
+                others = base
+                for other_name, value_mask in active.items():
+                    if other_name != name:
+                        others &= value_mask
+                dimension_bits = self._bits[name]
+                counts[name] = {
+                    value: (dimension_bits.get(value, 0) & others).bit_count()
+                    for value in self._values[name]
+                }
+
+            ids = [self._processes[position].get('id') for position in _iter_bits(mask)]
+            return self.version, mask, counts, ids
+
+    def _active_bits(self, filters: dict[str, str]) -> dict[str, int]:
+        return {
+            name: self._bits[name].get(filters[name], 0)
+            for name, _, _ in self.DIMENSIONS if filters.get(name)
+        }
+
+    def mask(self, filters: dict[str, str], keys=None) -> tuple[str | None, int | None]:
+        """Versió indexada i bitset dels processos filtrats (None si no hi ha cap filtre)"""
+        with self._lock:
+            active = self._active_bits(filters)
+            if keys is None and not active:
+                return self.version, None
+            mask = self.all if keys is None else self._keys_mask(keys)
+            for value_mask in active.values():
+                mask &= value_mask
+            return self.version, mask
+
+FACET_INDEX = FacetIndex()
+
+# Ordre de /api/processes?sort=priority|complexity (els valors desconeguts van al final)
+PRIORITY_ORDER = ('critical', 'high', 'medium', 'low')
+COMPLEXITY_ORDER = ('low', 'medium', 'high')
+
+class ProcessCatalog:
+    """Processos preordenats i serialitzats per servir /api/processes per pàgines.
+
+    Per cada versió de la base de dades cada procés es codifica a JSON un sol
+    cop i cada criteri d'ordenació es calcula la primera vegada que es demana
+    (amb la clau de cada element, per paginar amb cursor). Una pàgina només
+    recorre l'ordre fins a omplir-se i concatena els fragments ja codificats.
+    Les posicions coincideixen amb les de FacetIndex, així que els seus
+    bitsets serveixen de filtre.
+    """
+
+    SORTS = ('position', 'name', 'priority', 'complexity')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version: str | None = None
+        self._processes: list[dict] = []
+        self._encoded: list[bytes] = []
+        self._orders: dict[str, tuple[list[int], list[tuple]]] = {}
+
+    def sync(self, snapshot: DatabaseSnapshot) -> None:
+        if snapshot.version == self.version:
+            return
+
+        with self._lock:
+            if snapshot.version == self.version:
+                return
+            processes = [process for process in snapshot.data.get('processes', []) if isinstance(process, dict)]
+            self._processes = processes
+            self._encoded = [json.dumps(process, ensure_ascii=False).encode('utf-8') for process in processes]
+            self._orders = {}
+            self.version = snapshot.version
+
+    @staticmethod
+    def sort_key(sort: str, position: int, process: dict) -> tuple:
+        """Clau d'ordenació; acaba amb la clau del procés perquè sigui única i estable"""
+        key = SearchIndex.process_key(process, position)
+        if sort == 'position':
+            return (position, key)
+        name = _field_text(process.get('name')).casefold()
+        if sort == 'name':
+            return (name, key)
+        ranks = PRIORITY_ORDER if sort == 'priority' else COMPLEXITY_ORDER
+        value = _field_text(process.get(sort)).strip().lower()
+        return (ranks.index(value) if value in ranks else len(ranks), name, key)
+
+    def _order(self, sort: str) -> tuple[list[int], list[tuple]]:
+        order = self._orders.get(sort)
+        if order is None:
+            keys = [self.sort_key(sort, position, process) for position, process in enumerate(self._processes)]
+            positions = sorted(range(len(keys)), key=keys.__getitem__)
+            order = self._orders[sort] = (positions, [keys[position] for position in positions])
+        return order
+
+    def page(
+        self, version: str | None, mask: int | None, sort: str, descending: bool,
+        offset: int, limit: int, after: tuple | None = None,
+    ) -> tuple[list[dict], list[bytes], int, tuple | None] | None:
+        """Retorna els processos de la pàgina, el seu JSON, el total filtrat i la clau del cursor següent.
+
+        ``mask`` és un bitset de FacetIndex de la mateixa ``version`` (None per
+        a tots). Retorna None si el catàleg ja és d'una altra versió.
+        """
+        with self._lock:
+            if version != self.version:
+                return None
+            positions, keys = self._order(sort)
+            processes, encoded = self._processes, self._encoded
+
+        size = len(positions)
+        if after is None:
+            start = size - 1 if descending else 0
+        elif descending:
+            start = bisect.bisect_left(keys, after) - 1
+        else:
+            start = bisect.bisect_right(keys, after)
+        indices = range(start, -1, -1) if descending else range(start, size)
+
+        bits = None
+        total = size if mask is None else mask.bit_count()
+        if mask is None:
+            indices = indices[offset:]
+            offset = 0
+        else:
+            bits = mask.to_bytes((size + 7) // 8, 'little')
+
+        selected: list[int] = []
+        for index in indices:
+            position = positions[index]
+            if bits is not None and not (bits[position >> 3] >> (position & 7)) & 1:
+                continue
+            if offset:
+                offset -= 1
+                continue
+            if len(selected) == limit:
+                # Hi ha més resultats: el cursor continua després de l'últim de la pàgina
+                return self._selection(selected, positions, processes, encoded) + (total, keys[selected[-1]])
+            selected.append(index)
+        return self._selection(selected, positions, processes, encoded) + (total, None)
+
+    @staticmethod
+    def _selection(selected, positions, processes, encoded) -> tuple[list[dict], list[bytes]]:
+        chosen = [positions[index] for index in selected]
+        return [processes[position] for position in chosen], [encoded[position] for position in chosen]
+
+PROCESS_CATALOG = ProcessCatalog()
+
+def _encode_cursor(sort: str, order: str, key: tuple) -> str:
+    raw = json.dumps([sort, order, list(key)], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    """Clau d'ordenació d'un cursor; ValueError si no és vàlid per a aquesta ordenació"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_order, key = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Cursor no vàlid') from e
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(key, list):
+        raise ValueError("El cursor correspon a una altra ordenació")
+    # Mateixos tipus que ProcessCatalog.sort_key, perquè la comparació no falli
+    expected = (int, str) if sort == 'position' else (str, str) if sort == 'name' else (int, str, str)
+    if len(key) != len(expected) or not all(type(value) is kind for value, kind in zip(key, expected)):
+        raise ValueError('Cursor no vàlid')
+    return tuple(key)
+
+# Conjunts de dades que /api/related creua amb els processos (relatius a DOCUMENTS_DIRECTORY)
+INTEGRATIONS_CATALOG_PATH = Path('integrations') / 'integrations-database.json'
+OMNISCRIPT_ANALYSIS_PATH = Path('omniscript_business_analysis_data.json')
+
+def _mentions(text: str, keyword: str) -> bool:
+    """Coincidència a inici de paraula, com a _classify_document ('csp_os_Quote' troba 'quote')"""
+    haystack = text.replace('_', ' ').replace('-', ' ').casefold()
+    return re.search(rf'\b{re.escape(keyword.casefold())}', haystack) is not None
+
+class RelatedIndex:
+    """Índex creuat entre processos, catàleg d'integracions i anàlisi d'OmniScripts.
+
+    Cada registre dels tres conjunts s'associa a noms d'integració i d'objecte
+    normalitzats: els valors dels seus camps (sistemes d'origen i destinació,
+    punts d'integració...) i les regles de classificació de documents
+    (_INTEGRATION_RULES, KNOWN_OBJECTS) aplicades al seu text. Els fitxers es
+    parsegen un sol cop i l'índex es reconstrueix quan canvia la versió de la
+    base de dades o l'mtime d'algun fitxer, de manera que una consulta només
+    recorre els registres del resultat.
+    """
+
+    DATASETS = ('processes', 'integrations', 'omniscripts')
+    KINDS = ('integration', 'object')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.key: tuple | None = None
+        self._records: dict[str, list[dict]] = {name: [] for name in self.DATASETS}
+        # (tipus, nom normalitzat) -> conjunt -> posicions dels registres
+        self._index: dict[tuple[str, str], dict[str, dict[int, None]]] = {}
+        self._labels: dict[tuple[str, str], str] = {}
+        self._process_positions: dict[str, int] = {}
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return ' '.join(name.split()).casefold()
+
+    @staticmethod
+    def _file_key(path: Path):
+        try:
+            stat_result = path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat_result.st_mtime_ns, stat_result.st_size)
+
+    @staticmethod
+    def _load_list(path: Path, field: str) -> list[dict]:
+        try:
+            data = json.loads(path.read_bytes().decode('utf-8'))
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            print(f"⚠️  No s'ha pogut llegir {path.name} per a /api/related: {e}")
+            return []
+        items = data.get(field) if isinstance(data, dict) else None
+        return [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+
+    def sync(self, snapshot: DatabaseSnapshot) -> None:
+        """Reconstrueix l'índex si la base de dades o algun dels fitxers ha canviat"""
+        paths = (DOCUMENTS_DIRECTORY / INTEGRATIONS_CATALOG_PATH, DOCUMENTS_DIRECTORY / OMNISCRIPT_ANALYSIS_PATH)
+        key = (snapshot.version, *(self._file_key(path) for path in paths))
+        if key == self.key:
+            return
+
+        with self._lock:
+            if key == self.key:
+                return
+            records = {
+                'processes': [process for process in snapshot.data.get('processes', []) if isinstance(process, dict)],
+                'integrations': self._load_list(paths[0], 'integrations'),
+                'omniscripts': self._load_list(paths[1], 'components'),
+            }
+            index: dict[tuple[str, str], dict[str, list[int]]] = {}
+            labels: dict[tuple[str, str], str] = {}
+            extractors = {
+                'processes': self._process_names,
+                'integrations': self._integration_names,
+                'omniscripts': self._omniscript_names,
+            }
+            for dataset, items in records.items():
+                for position, item in enumerate(items):
+                    for kind, names in extractors[dataset](item).items():
+                        for name in names:
+                            normalized = (kind, self.normalize(name))
+                            if not normalized[1]:
+                                continue
+                            labels.setdefault(normalized, name.strip())
+                            positions = index.setdefault(normalized, {}).setdefault(dataset, [])
+                            if not positions or positions[-1] != position:
+                                positions.append(position)
+
+            self._records = records
+            # Diccionaris ordenats: iteració en ordre i pertinença en O(1) per a les interseccions
+            self._index = {
+                normalized: {dataset: dict.fromkeys(positions) for dataset, positions in datasets.items()}
+                for normalized, datasets in index.items()
+            }
+            self._labels = labels
+            self._process_positions = {
+                SearchIndex.process_key(process, position): position
+                for position, process in enumerate(records['processes'])
+            }
+            self.key = key
+
+    @staticmethod
+    def _classified(text: str) -> dict[str, list[str]]:
+        """Integracions i objectes que les regles de classificació troben a ``text``"""
+        return {
+            'integration': [value for keyword, value in _INTEGRATION_RULES if _mentions(text, keyword)],
+            'object': [name for name in KNOWN_OBJECTS if _mentions(text, name)],
+        }
+
+    @staticmethod
+    def _process_names(process: dict) -> dict[str, list[str]]:
+        return {'integration': _field_values(process.get('integrations')), 'object': _field_values(process.get('objects'))}
+
+    def _integration_names(self, entry: dict) -> dict[str, list[str]]:
+        systems = [_field_text(entry.get(field)) for field in ('sourceSystem', 'targetSystem')]
+        names = self._classified(' '.join(
+            systems + [_field_text(entry.get(field)) for field in ('type', 'name', 'category')]
+        ))
+        names['integration'] += [
+            _field_text(entry.get('id')), _field_text(entry.get('name')), *systems, *_field_values(entry.get('tags')),
+        ]
+        return names
+
+    def _omniscript_names(self, component: dict) -> dict[str, list[str]]:
+        points = _field_values(component.get('integrationPoints'))
+        process = _field_text(component.get('businessProcess'))
+        names = self._classified(' '.join(points + [process, _field_text(component.get('category'))]))
+        # 'XOM - AltaVPN' -> 'XOM': l'àrea del procés de negoci enllaça amb els sistemes del catàleg
+        area = process.split(' - ', 1)[0] if ' - ' in process else ''
+        names['integration'] += points + ([area] if area else [])
+        return names
+
+    def keys(self) -> dict[str, dict[str, dict[str, int]]]:
+        """Noms indexats de cada tipus amb el nombre de registres de cada conjunt"""
+        with self._lock:
+            index, labels = self._index, self._labels
+        result: dict[str, dict[str, dict[str, int]]] = {kind: {} for kind in self.KINDS}
+        for normalized, datasets in index.items():
+            result[normalized[0]][labels[normalized]] = {name: len(datasets.get(name, ())) for name in self.DATASETS}
+        return {kind: dict(sorted(names.items(), key=lambda item: item[0].casefold())) for kind, names in result.items()}
+
+    def related(self, filters: dict[str, str], process_id: str | None = None, limit: int | None = None):
+        """Registres de cada conjunt que comparteixen tots els noms indicats.
+
+        ``filters`` té els tipus ('integration', 'object') com a claus. Amb
+        ``process_id`` es busquen els registres que comparteixen algun nom amb
+        aquell procés. Retorna None si el procés no existeix.
+        """
+        with self._lock:
+            index, records, process_positions = self._index, self._records, self._process_positions
+
+        if process_id is not None:
+            position = process_positions.get(process_id)
+            if position is None:
+                return None
+            process = records['processes'][position]
+            groups = [
+                index.get((kind, self.normalize(name)), {})
+                for kind, names in self._process_names(process).items() for name in names
+            ]
+            matches = {}
+            for dataset in self.DATASETS:
+                merged = sorted({item for group in groups for item in group.get(dataset, ())})
+                matches[dataset] = [item for item in merged if dataset != 'processes' or item != position]
+        else:
+            groups = [index.get((kind, self.normalize(name)), {}) for kind, name in filters.items() if name]
+            matches = {}
+            for dataset in self.DATASETS:
+                candidates = sorted((group.get(dataset, {}) for group in groups), key=len)
+                if not candidates:
+                    matches[dataset] = []
+                    continue
+                # Es recorre la llista més curta i es comprova la pertinença a la resta
+                shortest, others = candidates[0], candidates[1:]
+                matches[dataset] = [item for item in shortest if all(item in other for other in others)]
+
+        return {
+            dataset: {
+                'total': len(positions),
+                'items': [records[dataset][position] for position in positions[:limit]],
+            }
+            for dataset, positions in matches.items()
+        }
+
+RELATED_INDEX = RelatedIndex()
+
+_FULLTEXT_WORD = re.compile(r'[^\W_]+')
+_FULLTEXT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (term, segment)
+) WITHOUT ROWID;
+"""
+
+def _tokenize_with_offsets(text: str):
+    """Com ``_tokenize``, però amb l'inici i el final de la paraula original de cada token"""
+    for match in _FULLTEXT_WORD.finditer(text):
+        word = match.group()
+        if word.isascii():
+            yield word.lower(), match.start(), match.end()
+        else:
+            for token in _tokenize(word):
+                yield token, match.start(), match.end()
+
+def _fulltext_tokens(text: str) -> list[str]:
+    """Els mateixos tokens que ``_tokenize_with_offsets``, sense calcular posicions (indexació)"""
+    if text.isascii():
+        return _TOKEN_PATTERN.findall(text.lower())
+    tokens = []
+    for word in _FULLTEXT_WORD.findall(text):
+        if word.isascii():
+            tokens.append(word.lower())
+        else:
+            tokens.extend(_tokenize(word))
+    return tokens
+
+def _parse_fulltext_query(query: str) -> list[list[str]]:
+    """Grups de tokens de la consulta: cada paraula o "frase entre cometes" n'és un.
+
+    Els grups de més d'un token (frases, o paraules com ``Account-Contact``)
+    han d'aparèixer consecutius al document.
+    """
+    groups = []
+    for phrase, word in re.findall(r'"([^"]*)"|([^\s"]+)', query):
+        tokens = _tokenize(phrase or word)
+        if tokens:
+            groups.append(tokens)
+    return groups
+
+def _phrase_starts(positions: list[array]) -> list[int]:
+    """Posicions on comença la seqüència de termes (una llista de posicions per terme)"""
+    following = [set(entry) for entry in positions[1:]]
+    return [
+        start for start in positions[0]
+        if all(start + offset in entry for offset, entry in enumerate(following, 1))
+    ]
+
+class _HTMLTextExtractor(HTMLParser):
+    """Text visible i títol d'un document HTML"""
+
+    SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg'}
+    BLOCK_TAGS = {
+        'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption',
+        'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol',
+        'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul',
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ''
+        self._parts: list[str] = []
+        self._skipping = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag == 'title':
+            self._in_title = True
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag == 'title':
+            self._in_title = False
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append('\n')
+
+    def handle_data(self, data):
+        if self._skipping:
+            return
+        if self._in_title:
+            self.title += data
+        else:
+            self._parts.append(data)
+
+    def text(self) -> str:
+        text = re.sub(r'[^\S\n]+', ' ', ''.join(self._parts))
+        return re.sub(r'\s*\n\s*', '\n', text).strip()
+
+def _json_strings(data) -> list[str]:
+    """Valors de text d'un document JSON (sense claus ni puntuació)"""
+    strings = []
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            strings.append(value)
+        elif isinstance(value, dict):
+            stack.extend(reversed(list(value.values())))
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+    return strings
+
+def _extract_document_text(path: Path) -> tuple[str, str]:
+    """Títol i text indexable d'un document (md i txt tal qual, html sense etiquetes, json només valors)"""
+    raw = path.read_text(encoding='utf-8', errors='replace')
+    suffix = path.suffix.lower()
+    title = ''
+    if suffix in ('.html', '.htm'):
+        parser = _HTMLTextExtractor()
+        parser.feed(raw)
+        parser.close()
+        title = ' '.join(parser.title.split())
+        text = parser.text()
+    elif suffix == '.json':
+        try:
+            text = '\n'.join(_json_strings(json.loads(raw)))
+        except ValueError:
+            text = raw
+    else:
+        text = raw
+        heading = re.search(r'^#\s+(.+?)\s*#*\s*$', raw, re.MULTILINE)
+        if heading:
+            title = heading.group(1)
+    return title or path.stem, text
+
+class FullTextIndex:
+    """Índex invertit persistent sobre el contingut de DOCUMENTS_DIRECTORY.
+
+    Viu a ``.doc-finder/fulltext.sqlite3``. Cada actualització escriu un segment:
+    una fila per terme amb els documents on apareix i les posicions (cerca de
+    frases exactes). Els documents modificats o esborrats deixen d'existir a la
+    taula ``documents`` i les seves entrades antigues s'ignoren fins que els
+    segments es fusionen. La rellevància es calcula amb BM25 i només es tornen
+    a llegir els fitxers amb mtime o mida diferents dels indexats.
+    """
+
+    SCHEMA_VERSION = '2'
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._local = threading.local()
+        self._write_lock = InterProcessLock('fulltext.lock')
+        self._state_lock = threading.Lock()
+        self._refreshed_at: float | None = None
+        self._dirty = True
+        self._lengths: tuple[str, dict[int, int], float] | None = None
+
+    def path(self) -> Path:
+        return state_directory() / 'fulltext.sqlite3'
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connexió del fil actual (les connexions no es comparteixen entre fils ni processos)"""
+        path = self.path()
+        owner = (os.getpid(), path)
+        cached = getattr(self._local, 'connection', None)
+        if cached is not None and cached[0] == owner:
+            return cached[1]
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with self._write_lock:
+            connection.executescript(_FULLTEXT_SCHEMA)
+            if self._meta(connection, 'schema') not in (None, self.SCHEMA_VERSION):
+                connection.executescript(
+                    'DROP TABLE postings; DROP TABLE documents; DROP TABLE meta;' + _FULLTEXT_SCHEMA
+                )
+            if self._meta(connection, 'schema') is None:
+                connection.executemany(
+                    'INSERT INTO meta (key, value) VALUES (?, ?)',
+                    [('schema', self.SCHEMA_VERSION), ('generation', '0'), ('segments', '0'), ('stale', '0')],
+                )
+        self._local.connection = (owner, connection)
+        return connection
+
+    @staticmethod
+    def _meta(connection: sqlite3.Connection, key: str) -> str | None:
+        row = connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    @staticmethod
+    def _set_meta(connection: sqlite3.Connection, key: str, value) -> None:
+        connection.execute('UPDATE meta SET value = ? WHERE key = ?', (str(value), key))
+
+    @staticmethod
+    def _scan() -> dict[str, tuple[Path, int, int]]:
+        """Fitxers indexables de DOCUMENTS_DIRECTORY amb el seu mtime i mida"""
+        root = DOCUMENTS_DIRECTORY
+        database = database_path()
+        files = {}
+        for current, subdirectories, names in os.walk(root):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+            for name in names:
+                path = Path(current) / name
+                if name.startswith('.') or path.suffix.lower() not in FULLTEXT_EXTENSIONS or path == database:
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if stat.st_size <= FULLTEXT_MAX_FILE_SIZE:
+                    files[path.relative_to(root).as_posix()] = (path, stat.st_mtime_ns, stat.st_size)
+        return files
+
+    @staticmethod
+    def _decode(data: bytes, live: dict[int, int], into: dict[int, array]) -> None:
+        """Afegeix a ``into`` les entrades vigents d'un segment ([document, n, posicions...]*)"""
+        values = array('I', data)
+        index = 0
+        while index < len(values):
+            document_id, count = values[index], values[index + 1]
+            if document_id in live:
+                into[document_id] = values[index + 2:index + 2 + count]
+            index += 2 + count
+
+    def refresh(self) -> dict:
+        """Sincronitza l'índex amb el disc; retorna quants documents s'han indexat i eliminat"""
+        with self._state_lock:
+            self._dirty = False
+        with self._write_lock:
+            connection = self._connection()
+            files = self._scan()
+            stored = {
+                path: (document_id, (mtime_ns, size))
+                for path, document_id, mtime_ns, size in connection.execute(
+                    'SELECT path, id, mtime_ns, size FROM documents'
+                )
+            }
+            changed = [
+                relative for relative, (_, mtime_ns, size) in files.items()
+                if relative not in stored or stored[relative][1] != (mtime_ns, size)
+            ]
+            removed = [relative for relative in stored if relative not in files]
+
+            indexed = 0
+            if changed or removed:
+                segment: dict[str, array] = {}
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    stale = 0
+                    for relative in removed + [relative for relative in changed if relative in stored]:
+                        connection.execute('DELETE FROM documents WHERE id = ?', (stored[relative][0],))
+                        stale += 1
+                    for relative in changed:
+                        path, mtime_ns, size = files[relative]
+                        try:
+                            title, text = _extract_document_text(path)
+                        except OSError:
+                            continue
+                        tokens = _fulltext_tokens(text)
+                        document_id = connection.execute(
+                            'INSERT INTO documents (path, mtime_ns, size, length, title, content) '
+                            'VALUES (?, ?, ?, ?, ?, ?)',
+                            (relative, mtime_ns, size, len(tokens), title, text),
+                        ).lastrowid
+                        self._add_postings(segment, document_id, tokens)
+                        indexed += 1
+
+                    segments = int(self._meta(connection, 'segments')) + (1 if segment else 0)
+                    stale += int(self._meta(connection, 'stale'))
+                    if segment:
+                        connection.executemany(
+                            'INSERT INTO postings (term, segment, data) VALUES (?, ?, ?)',
+                            ((term, segments, segment[term].tobytes()) for term in sorted(segment)),
+                        )
+                    live = connection.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+                    if segments > FULLTEXT_MAX_SEGMENTS or stale > max(live, 1) // 4:
+                        self._merge_segments(connection)
+                        segments, stale = 1, 0
+                    self._set_meta(connection, 'segments', segments)
+                    self._set_meta(connection, 'stale', stale)
+                    self._set_meta(connection, 'generation', int(self._meta(connection, 'generation')) + 1)
+                    connection.execute('COMMIT')
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+
+        with self._state_lock:
+            self._refreshed_at = time.monotonic()
+        return {'documents': len(files), 'indexed': indexed, 'removed': len(removed)}
+
+    @staticmethod
+    def _add_postings(segment: dict[str, array], document_id: int, tokens: list[str]) -> None:
+        positions: dict[str, list[int]] = {}
+        for position, token in enumerate(tokens):
+            entry = positions.get(token)
+            if entry is None:
+                positions[token] = [position]
+            else:
+                entry.append(position)
+        for token, entry in positions.items():
+            data = segment.get(token)
+            if data is None:
+                data = segment[token] = array('I')
+            data.append(document_id)
+            data.append(len(entry))
+            data.extend(entry)
+
+    def _merge_segments(self, connection: sqlite3.Connection) -> None:
+        """Fusiona tots els segments en un de sol descartant els documents que ja no hi són"""
+        live = dict(connection.execute('SELECT id, length FROM documents'))
+        connection.execute('DROP TABLE IF EXISTS postings_merged')
+        connection.execute(
+            'CREATE TABLE postings_merged (term TEXT NOT NULL, segment INTEGER NOT NULL, data BLOB NOT NULL, '
+            'PRIMARY KEY (term, segment)) WITHOUT ROWID'
+        )
+
+        def merged_rows():
+            current, entries = None, {}
+            for term, data in connection.execute('SELECT term, data FROM postings ORDER BY term, segment'):
+                if term != current:
+                    if entries:
+                        yield current, self._encode(entries)
+                    current, entries = term, {}
+                self._decode(data, live, entries)
+            if entries:
+                yield current, self._encode(entries)
+
+        connection.executemany('INSERT INTO postings_merged (term, segment, data) VALUES (?, 1, ?)', merged_rows())
+        connection.execute('DROP TABLE postings')
+        connection.execute('ALTER TABLE postings_merged RENAME TO postings')
+
+    @staticmethod
+    def _encode(entries: dict[int, array]) -> bytes:
+        data = array('I')
+        for document_id in sorted(entries):
+            positions = entries[document_id]
+            data.append(document_id)
+            data.append(len(positions))
+            data.extend(positions)
+        return data.tobytes()
+
+    def mark_dirty(self) -> None:
+        """El contingut de documents ha canviat: la propera cerca reindexarà"""
+        with self._state_lock:
+            self._dirty = True
+
+    def ensure_fresh(self) -> None:
+        """Reindexa si hi ha canvis pendents o fa massa que no es comprova el disc"""
+        with self._state_lock:
+            stale = (
+                self._dirty or self._refreshed_at is None
+                or time.monotonic() - self._refreshed_at > FULLTEXT_REFRESH_INTERVAL
+            )
+        if stale:
+            self.refresh()
+
+    def _document_lengths(self, connection: sqlite3.Connection) -> tuple[dict[int, int], float]:
+        """Longitud (en tokens) dels documents vigents i la mitjana, en cache per generació"""
+        generation = self._meta(connection, 'generation')
+        cached = self._lengths
+        if cached is not None and cached[0] == generation:
+            return cached[1], cached[2]
+        lengths = dict(connection.execute('SELECT id, length FROM documents'))
+        average = sum(lengths.values()) / len(lengths) if lengths else 1.0
+        self._lengths = (generation, lengths, average or 1.0)
+        return lengths, average or 1.0
+
+    def _postings(self, connection: sqlite3.Connection, term: str, live: dict[int, int]) -> dict[int, array]:
+        entries: dict[int, array] = {}
+        for (data,) in connection.execute('SELECT data FROM postings WHERE term = ?', (term,)):
+            self._decode(data, live, entries)
+        return entries
+
+    def search(self, query: str, limit: int = 10) -> tuple[int, list[dict]]:
+        """Total de documents que contenen tots els grups de la consulta i els ``limit`` millors"""
+        groups = _parse_fulltext_query(query)
+        if not groups:
+            return 0, []
+
+        connection = self._connection()
+        connection.execute('BEGIN')  # lectura coherent encara que un altre procés reindexi
+        try:
+            lengths, average_length = self._document_lengths(connection)
+            terms = list(dict.fromkeys(token for group in groups for token in group))
+            postings = {}
+            for term in terms:
+                postings[term] = self._postings(connection, term, lengths)
+                if not postings[term]:
+                    return 0, []
+
+            # Per document: posició de cada token coincident -> grup de la consulta
+            matches: dict[int, dict[int, int]] = {}
+            candidates = set.intersection(*(set(entries) for entries in sorted(postings.values(), key=len)))
+            for document_id in candidates:
+                matched: dict[int, int] = {}
+                for index, group in enumerate(groups):
+                    group_starts = _phrase_starts([postings[term][document_id] for term in group])
+                    if not group_starts:
+                        break
+                    matched.update((start + offset, index) for start in group_starts for offset in range(len(group)))
+                else:
+                    matches[document_id] = matched
+            if not matches:
+                return 0, []
+
+            total_documents = len(lengths)
+            idf = {
+                term: math.log(1.0 + (total_documents - len(entries) + 0.5) / (len(entries) + 0.5))
+                for term, entries in postings.items()
+            }
+            scores = {}
+            for document_id in matches:
+                norm = self.K1 * (1 - self.B + self.B * lengths[document_id] / average_length)
+                score = 0.0
+                for term in terms:
+                    frequency = len(postings[term][document_id])
+                    score += idf[term] * frequency * (self.K1 + 1) / (frequency + norm)
+                scores[document_id] = score
+
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            documents = {
+                row[0]: row for row in connection.execute(
+                    f"SELECT id, path, title, content FROM documents WHERE id IN ({', '.join('?' * len(ranked))})",
+                    [document_id for document_id, _ in ranked],
+                )
+            }
+        finally:
+            connection.execute('COMMIT')
+
+        results = []
+        for document_id, score in ranked:
+            _, path, title, content = documents[document_id]
+            snippet, highlights = self._snippet(content, matches[document_id])
+            results.append({
+                'path': path,
+                'title': title,
+                'score': round(score, 4),
+                'snippet': snippet,
+                'highlights': highlights,
+            })
+        return len(matches), results
+
+    @staticmethod
+    def _snippet(content: str, matched: dict[int, int]) -> tuple[str, list[list[int]]]:
+        """Fragment de FULLTEXT_SNIPPET_TOKENS tokens que cobreix més grups de la consulta.
+
+        ``matched`` relaciona cada posició coincident amb el seu grup; ``highlights``
+        són parells [inici, final) (en caràcters) dins del fragment.
+        """
+        window = FULLTEXT_SNIPPET_TOKENS
+        positions = sorted(matched)
+        best_start, best_score = positions[0], (0, 0)
+        inside: dict[int, int] = {}
+        right = 0
+        for left, position in enumerate(positions):
+            while right < len(positions) and positions[right] < position + window:
+                group = matched[positions[right]]
+                inside[group] = inside.get(group, 0) + 1
+                right += 1
+            score = (len(inside), right - left)
+            if score > best_score:
+                best_start, best_score = position, score
+            group = matched[position]
+            inside[group] -= 1
+            if not inside[group]:
+                del inside[group]
+        first = max(0, best_start - window // 4)
+        last = first + window
+
+        snippet = ''
+        highlights = []
+        cursor = None
+        truncated = False
+        for position, (_, start, end) in enumerate(_tokenize_with_offsets(content)):
+            if position < first:
+                continue
+            if position >= last:
+                truncated = True
+                break
+            if cursor is not None and start < cursor:
+                continue  # paraula ja afegida (un mot pot generar diversos tokens)
+            if cursor is not None:
+                snippet += re.sub(r'\s+', ' ', content[cursor:start])
+            elif first > 0:
+                snippet = '…'
+            if position in matched:
+                highlights.append([len(snippet), len(snippet) + end - start])
+            snippet += content[start:end]
+            cursor = end
+        if truncated:
+            snippet += ' …'
+        return snippet, highlights
+
+FULLTEXT_INDEX = FullTextIndex()
+
+def _refresh_fulltext_index() -> None:
+    started = time.perf_counter()
+    try:
+        stats = FULLTEXT_INDEX.refresh()
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️  No s'ha pogut actualitzar l'índex de text complet: {e}")
+        return
+    print(
+        f"🔎 Índex de text complet: {stats['documents']} documents "
+        f"({stats['indexed']} indexats, {stats['removed']} eliminats) en {time.perf_counter() - started:.2f}s"
+    )
+
+def _require_version(version: str | None, snapshot: DatabaseSnapshot) -> None:
+    if version != snapshot.version:
+        raise StaleIndexError(version)
+
+def _search_keys(snapshot: DatabaseSnapshot, search: str):
+    """Claus de SearchIndex que coincideixen amb ``search`` a la versió ``snapshot`` (None sense cerca)"""
+    if not search:
+        return None
+    SEARCH_INDEX.sync(snapshot)
+    version, scores = SEARCH_INDEX.versioned_score(search)
+    _require_version(version, snapshot)
+    return scores
+
+class UploadTooLargeError(ValueError):
+    """El cos de la pujada supera MAX_UPLOAD_SIZE"""
+
+@dataclass
+class UploadedFile:
+    """Fitxer rebut en una pujada, escrit en un fitxer temporal fins que es desa"""
+    filename: str
+    temp_path: Path
+    size: int = 0
+    sha256: str | None = None
+
+    def discard(self) -> None:
+        try:
+            self.temp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+class MultipartStreamParser:
+    """Parser incremental de multipart/form-data amb memòria acotada.
+
+    Rep el cos a blocs amb ``feed()`` i escriu el contingut de cada part de
+    fitxer directament a un fitxer temporal de ``target_dir``; en memòria només
+    hi ha el bloc actual més la longitud del delimitador.
+    """
+
+    MAX_HEADER_SIZE = 16 * 1024
+
+    def __init__(self, boundary: str, target_dir: Path):
+        self.target_dir = target_dir
+        self._delimiter = b'--' + boundary.encode('latin-1')
+        self._body_delimiter = b'\r\n' + self._delimiter
+        self._buffer = bytearray()
+        self._state = 'preamble'
+        self._current: UploadedFile | None = None
+        self._sink = None
+        self._hasher = None
+        self.files: list[UploadedFile] = []
+
+    def feed(self, data: bytes) -> None:
+        self._buffer += data
+        while self._step():
+            pass
+
+    def _step(self) -> bool:
+        """Processa el buffer tant com pugui; retorna True si cal tornar-hi"""
+        buffer = self._buffer
+        if self._state == 'preamble':
+            index = buffer.find(self._delimiter)
+            if index < 0:
+                del buffer[:max(0, len(buffer) - len(self._delimiter) + 1)]
+                return False
+            del buffer[:index + len(self._delimiter)]
+            self._state = 'boundary'
+            return True
+
+        if self._state == 'boundary':
+            if len(buffer) < 2:
+                return False
+            if buffer[:2] == b'--':
+                self._state = 'epilogue'
+                buffer.clear()
+                return False
+            if buffer[:2] != b'\r\n':
+                raise ValueError('Delimitador multipart mal format')
+            del buffer[:2]
+            self._state = 'headers'
+            return True
+
+        if self._state == 'headers':
+            index = buffer.find(b'\r\n\r\n')
+            if index < 0:
+                if len(buffer) > self.MAX_HEADER_SIZE:
+                    raise ValueError('Capçaleres de la part massa grans')
+                return False
+            headers_raw = bytes(buffer[:index])
+            del buffer[:index + 4]
+            self._start_part(headers_raw)
+            self._state = 'body'
+            return True
+
+        if self._state == 'body':
+            index = buffer.find(self._body_delimiter)
+            if index < 0:
+                safe = len(buffer) - len(self._body_delimiter) + 1
+                if safe > 0:
+                    self._write(buffer[:safe])
+                    del buffer[:safe]
+                return False
+            self._write(buffer[:index])
+            del buffer[:index + len(self._body_delimiter)]
+            self._finish_part()
+            self._state = 'boundary'
+            return True
+
+        # epilogue: s'ignora qualsevol dada posterior al delimitador final
+        buffer.clear()
+        return False
+
+    def _start_part(self, headers_raw: bytes) -> None:
+        headers = {}
+        for line in headers_raw.decode('utf-8', errors='ignore').split('\n'):
+            line = line.strip()
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+
+        # Només es desen els camps de fitxer; la resta es descarten
+        content_disposition = headers.get('content-disposition', '')
+        filename_start = content_disposition.find('filename="') + 10
+        filename_end = content_disposition.find('"', filename_start)
+        if filename_start > 9 and filename_end > filename_start:
+            filename = content_disposition[filename_start:filename_end]
+            self.target_dir.mkdir(parents=True, exist_ok=True)
+            fd, temp_name = tempfile.mkstemp(prefix='.upload-', suffix='.part', dir=self.target_dir)
+            self._sink = os.fdopen(fd, 'wb')
+            self._hasher = hashlib.sha256()
+            self._current = UploadedFile(filename=filename, temp_path=Path(temp_name))
+
+    def _write(self, data) -> None:
+        if self._current is not None and data:
+            self._sink.write(data)
+            self._hasher.update(data)
+            self._current.size += len(data)
+
+    def _finish_part(self) -> None:
+        if self._current is None:
+            return
+        self._sink.close()
+        self._current.sha256 = self._hasher.hexdigest()
+        self.files.append(self._current)
+        self._current = None
+        self._sink = None
+        self._hasher = None
+
+    def close(self) -> list[UploadedFile]:
+        """Valida que el cos s'ha rebut sencer i retorna els fitxers temporals"""
+        if self._state != 'epilogue':
+            raise ValueError('El cos multipart està incomplet')
+        return self.files
+
+    def abort(self) -> None:
+        """Elimina tots els fitxers temporals creats fins ara"""
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        if self._current is not None:
+            self._current.discard()
+            self._current = None
+        for uploaded in self.files:
+            uploaded.discard()
+        self.files = []
+
+def _hash_file(path: Path) -> str:
+    """SHA-256 d'un fitxer llegit per blocs"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+class DocumentStore:
+    """Emmagatzematge dels documents pujats, adreçable per contingut.
+
+    Manté en memòria els noms ja ocupats del directori de documents (llegits un
+    sol cop) i un manifest ``sha256 -> {nom, mtime_ns, mida}`` persistit a l'estat del servidor.
+    Així els conflictes de nom es resolen sense sondejar el disc amb ``exists()``
+    i una pujada amb contingut idèntic a un document existent reutilitza aquest
+    document en lloc de crear-ne una còpia ``-1``, ``-2``...
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._directory: Path | None = None
+        self._names: set[str] = set()
+        self._counters: dict[tuple[str, str], int] = {}
+        self._manifest: dict[str, dict] = {}
+        self._manifest_key: tuple | None = None
+        self._manifest_lock = InterProcessLock('manifest.lock')
+
+    def manifest_path(self) -> Path:
+        return state_directory() / 'manifest.json'
+
+    def _load_manifest(self) -> None:
+        """Rellegeix el manifest si un altre procés l'ha canviat"""
+        try:
+            stat = self.manifest_path().stat()
+        except FileNotFoundError:
+            self._manifest, self._manifest_key = {}, None
+            return
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._manifest_key:
+            return
+        try:
+            with open(self.manifest_path(), 'rb') as f:
+                self._manifest = json.loads(f.read().decode('utf-8')).get('blobs', {})
+        except (FileNotFoundError, ValueError):
+            self._manifest = {}
+        self._manifest_key = key
+
+    def _ensure_loaded(self) -> Path:
+        directory = DOCUMENTS_DIRECTORY
+        if self._directory == directory:
+            return directory
+
+        directory.mkdir(parents=True, exist_ok=True)
+        with os.scandir(directory) as entries:
+            # Claus en casefold: en sistemes de fitxers insensibles a majúscules 'A.png' i 'a.png' xoquen
+            self._names = {entry.name.casefold() for entry in entries}
+        self._counters = {}
+        self._manifest_key = None
+        self._directory = directory
+        return directory
+
+    def _save_manifest(self) -> None:
+        payload = {'version': 2, 'blobs': self._manifest}
+        _write_bytes_atomic(self.manifest_path(), json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        try:
+            stat = self.manifest_path().stat()
+            self._manifest_key = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            self._manifest_key = None
+
+    def _candidates(self, filename: str):
+        path = Path(filename)
+        stem, suffix = path.stem, path.suffix
+        if filename.casefold() not in self._names:
+            yield filename
+        counter = self._counters.get((stem, suffix), 1)
+        while True:
+            candidate = f"{stem}-{counter}{suffix}"
+            counter += 1
+            if candidate.casefold() not in self._names:
+                self._counters[(stem, suffix)] = counter
+                yield candidate
+
+    def _place(self, directory: Path, temp_path: Path, filename: str) -> Path:
+        """Mou el temporal al primer nom lliure sense sobreescriure mai un fitxer existent"""
+        for candidate in self._candidates(filename):
+            target = directory / candidate
+            try:
+                # link() falla si el destí existeix: protegeix de fitxers creats fora del servidor
+                os.link(temp_path, target)
+            except FileExistsError:
+                self._names.add(candidate.casefold())
+                continue
+            except OSError:
+                if target.exists():
+                    self._names.add(candidate.casefold())
+                    continue
+                os.replace(temp_path, target)
+            else:
+                temp_path.unlink()
+            self._names.add(candidate.casefold())
+            return target
+
+    def store(self, uploaded: UploadedFile, filename: str) -> tuple[Path, bool]:
+        """Desa un fitxer rebut; retorna la ruta final i si era un duplicat"""
+        with self._lock, self._manifest_lock:
+            directory = self._ensure_loaded()
+            self._load_manifest()
+
+            if CONTENT_DEDUP and uploaded.sha256 and uploaded.sha256 in self._manifest:
+                existing = self._verified_duplicate(directory, uploaded)
+                if existing is not None:
+                    uploaded.discard()
+                    return existing, True
+
+            target = self._place(directory, uploaded.temp_path, filename)
+            if uploaded.sha256:
+                self._manifest[uploaded.sha256] = self._manifest_entry(target)
+                self._save_manifest()
+            return target, False
+
+    @staticmethod
+    def _manifest_entry(path: Path) -> dict:
+        stat = path.stat()
+        return {'name': path.name, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    def _verified_duplicate(self, directory: Path, uploaded: UploadedFile) -> Path | None:
+        """Document del manifest amb el mateix contingut que ``uploaded``, si encara el té.
+
+        Si l'mtime o la mida ja no són els desats (s'ha editat fora del
+        servidor, o és una entrada de la versió 1 del manifest, que només
+        guardava el nom) es torna a calcular el hash del fitxer. Les entrades
+        que ja no corresponen s'eliminen i es desa el manifest.
+        """
+        entry = self._manifest[uploaded.sha256]
+        if isinstance(entry, str):
+            entry = {'name': entry}
+        existing = directory / str(entry.get('name') or '')
+        try:
+            stat = existing.stat()
+            if (stat.st_mtime_ns, stat.st_size) == (entry.get('mtime_ns'), entry.get('size')):
+                return existing
+            if stat.st_size == uploaded.size and _hash_file(existing) == uploaded.sha256:
+                self._manifest[uploaded.sha256] = self._manifest_entry(existing)
+                self._save_manifest()
+                return existing
+        except (FileNotFoundError, IsADirectoryError):
+            pass
+        # El document s'ha esborrat o modificat fora del servidor
+        del self._manifest[uploaded.sha256]
+        self._save_manifest()
+        return None
+
+    def invalidate(self) -> None:
+        """Força tornar a llegir el directori i el manifest a la propera operació"""
+        with self._lock:
+            self._directory = None
+
+DOCUMENT_STORE = DocumentStore()
+
+class UploadOffsetMismatchError(ValueError):
+    """L'offset d'un bloc no coincideix amb els bytes ja rebuts per la sessió"""
+
+    def __init__(self, received: int):
+        super().__init__(f"Offset incorrecte: el servidor té {received} bytes")
+        self.received = received
+
+class UploadSessionStore:
+    """Sessions de pujada per blocs, persistides a disc perquè es puguin reprendre.
+
+    Cada sessió té un fitxer ``<id>.json`` amb les metadades i un ``<id>.part``
+    amb les dades rebudes; la mida del ``.part`` és la font de veritat dels bytes
+    rebuts, de manera que una sessió sobreviu a talls de xarxa i reinicis.
+    """
+
+    SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: dict[str, InterProcessLock] = {}
+
+    def directory(self) -> Path:
+        return state_directory() / 'uploads'
+
+    def _meta_path(self, session_id: str) -> Path:
+        return self.directory() / f'{session_id}.json'
+
+    def part_path(self, session_id: str) -> Path:
+        return self.directory() / f'{session_id}.part'
+
+    def lock(self, session_id: str) -> InterProcessLock:
+        if not self.SESSION_ID_PATTERN.match(session_id):
+            # Un id arbitrari no pot crear fitxers de bloqueig ni entrades a _locks
+            raise FileNotFoundError(session_id)
+        with self._guard:
+            return self._locks.setdefault(session_id, InterProcessLock(f'uploads/{session_id}.lock'))
+
+    @contextmanager
+    def _locked(self, session_id: str):
+        """Pren el bloqueig d'una sessió existent i en dona l'estat; FileNotFoundError si no existeix"""
+        if self.load(session_id) is None:
+            raise FileNotFoundError(session_id)
+        with self.lock(session_id):
+            status = self.status(session_id)
+            if status is None:
+                # Descartada mentre s'esperava el bloqueig: no deixar-ne rastre
+                self.discard(session_id)
+                raise FileNotFoundError(session_id)
+            yield status
+
+    def create(self, filename: str, size: int | None) -> dict:
+        self.purge_expired()
+        session_id = uuid.uuid4().hex
+        meta = {
+            'id': session_id,
+            'filename': filename,
+            'size': size,
+            'createdAt': time.time(),
+        }
+        self.directory().mkdir(parents=True, exist_ok=True)
+        self.part_path(session_id).touch()
+        _write_bytes_atomic(self._meta_path(session_id), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        return self.status(session_id)
+
+    def load(self, session_id: str) -> dict | None:
+        if not self.SESSION_ID_PATTERN.match(session_id):
+            return None
+        try:
+            with open(self._meta_path(session_id), 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def status(self, session_id: str) -> dict | None:
+        meta = self.load(session_id)
+        if meta is None:
+            return None
+        try:
+            received = self.part_path(session_id).stat().st_size
+        except FileNotFoundError:
+            received = 0
+        return {
+            'id': session_id,
+            'filename': meta.get('filename'),
+            'size': meta.get('size'),
+            'received': received,
+        }
+
+    def append(self, session_id: str, offset: int, rfile, length: int) -> dict:
+        """Afegeix ``length`` bytes llegits de ``rfile`` a partir de ``offset``"""
+        with self._locked(session_id) as status:
+            if offset != status['received']:
+                raise UploadOffsetMismatchError(status['received'])
+
+            limit = status['size'] if status['size'] is not None else MAX_UPLOAD_SIZE
+            if offset + length > min(limit, MAX_UPLOAD_SIZE):
+                raise UploadTooLargeError(offset + length)
+
+            remaining = length
+            with open(self.part_path(session_id), 'ab') as part:
+                while remaining > 0:
+                    chunk = rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        # El que s'ha escrit queda desat: el client pot reprendre des d'aquí
+                        raise ConnectionError('La connexió s\'ha tancat abans de rebre tot el bloc')
+                    part.write(chunk)
+                    remaining -= len(chunk)
+
+            return self.status(session_id)
+
+    def complete(self, session_id: str, store):
+        """Valida que la sessió és completa, passa el fitxer rebut a ``store`` i descarta la sessió.
+
+        Tot es fa amb el bloqueig de la sessió pres, de manera que cap bloc nou
+        pot modificar el ``.part`` entre el càlcul del hash i el desament.
+        Retorna el que retorni ``store(uploaded)``.
+        """
+        with self._locked(session_id) as status:
+            if status['size'] is not None and status['received'] != status['size']:
+                raise UploadOffsetMismatchError(status['received'])
+            part_path = self.part_path(session_id)
+            uploaded = UploadedFile(
+                filename=str(status['filename'] or ''),
+                temp_path=part_path,
+                size=status['received'],
+                sha256=_hash_file(part_path),
+            )
+            result = store(uploaded)
+            self.discard(session_id)
+            return result
+
+    def cancel(self, session_id: str) -> None:
+        """Descarta una sessió (DELETE); espera que acabi el bloc o el desament en curs"""
+        with self._locked(session_id):
+            self.discard(session_id)
+
+    def discard(self, session_id: str) -> None:
+        """Elimina les metadades i el ``.part`` d'una sessió (cal tenir-ne el bloqueig).
+
+        El ``<id>.lock`` es conserva: qui espera el bloqueig encara el té obert i,
+        si s'esborrés, el següent InterProcessLock en crearia un de nou i dos
+        processos podrien tenir el bloqueig alhora. L'elimina ``purge_expired``.
+        """
+        for path in (self._meta_path(session_id), self.part_path(session_id)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        with self._guard:
+            self._locks.pop(session_id, None)
+
+    def _expired(self, session_id: str, limit: float) -> bool:
+        mtimes = []
+        for path in (self._meta_path(session_id), self.part_path(session_id)):
+            try:
+                mtimes.append(path.stat().st_mtime)
+            except FileNotFoundError:
+                pass
+        return bool(mtimes) and max(mtimes) < limit
+
+    def purge_expired(self) -> None:
+        """Elimina sessions sense activitat des de fa més de UPLOAD_SESSION_TTL segons"""
+        directory = self.directory()
+        if not directory.exists():
+            return
+        limit = time.time() - UPLOAD_SESSION_TTL
+        for meta_path in directory.glob('*.json'):
+            session_id = meta_path.stem
+            if not self.SESSION_ID_PATTERN.match(session_id) or not self._expired(session_id, limit):
+                continue
+            with self.lock(session_id):
+                # Un bloc pot haver arribat mentre s'esperava el bloqueig
+                if self._expired(session_id, limit):
+                    self.discard(session_id)
+
+        # Sessions acabades o caducades en altres processos
+        with self._guard:
+            stale = [session_id for session_id in self._locks if not self._meta_path(session_id).exists()]
+            for session_id in stale:
+                del self._locks[session_id]
+
+        # Fitxers de bloqueig de sessions que ja no existeixen. S'esborren amb el
+        # bloqueig pres: qui l'estigui esperant el rebrà, veurà que la sessió ja
+        # no hi és i no tocarà res, i cap sessió nova pot reutilitzar l'id.
+        for lock_path in directory.glob('*.lock'):
+            session_id = lock_path.stem
+            if not self.SESSION_ID_PATTERN.match(session_id) or self._meta_path(session_id).exists():
+                continue
+            with InterProcessLock(f'uploads/{lock_path.name}'):
+                if not self._meta_path(session_id).exists():
+                    try:
+                        lock_path.unlink()
+                    except FileNotFoundError:
+                        pass
+
+UPLOAD_SESSIONS = UploadSessionStore()
+
+THUMB_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+def _render_thumbnail(source: str, target: str, width: int, fmt: str) -> None:
+    """Genera una miniatura de ``width`` píxels d'amplada (s'executa al pool de processos)"""
+    pil_format, _, options = THUMB_FORMATS[fmt]
+    with Image.open(source) as image:
+        image.seek(0)  # GIF animats: només el primer fotograma
+        if image.mode == 'P':
+            image = image.convert('RGBA')
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.thumb-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, format=pil_format, **options)
+            os.replace(temp_path, target)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+class ThumbnailService:
+    """Miniatures de les imatges de documents, renderitzades en un pool de processos.
+
+    Les miniatures es desen a ``.doc-finder/thumbs`` amb el hash del contingut
+    de l'original i l'amplada al nom, de manera que un original modificat en
+    genera de noves i mai se serveix una miniatura obsoleta. Les peticions
+    simultànies d'una mateixa miniatura comparteixen un sol renderitzat.
+    """
+
+    def __init__(self, workers: int = THUMB_WORKERS):
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._inflight: dict[str, Future] = {}
+        self._hashes: dict[str, tuple[tuple, str]] = {}
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def directory(self) -> Path:
+        return state_directory() / 'thumbs'
+
+    @staticmethod
+    def snap_width(requested: int) -> int:
+        """Amplada permesa més petita que cobreix la demanada (limita les variants en disc)"""
+        for width in THUMB_WIDTHS:
+            if width >= requested:
+                return width
+        return THUMB_WIDTHS[-1]
+
+    def formats(self) -> tuple[str, ...]:
+        if not self.available:
+            return ()
+        return tuple(fmt for fmt in THUMB_FORMATS if fmt != 'webp' or pil_features.check('webp'))
+
+    @staticmethod
+    def default_format(source: Path) -> str:
+        return 'jpeg' if source.suffix.lower() in ('.jpg', '.jpeg') else 'png'
+
+    def source_hash(self, source: Path) -> str:
+        stat = source.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(str(source))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        digest = _hash_file(source)
+        with self._lock:
+            self._hashes[str(source)] = (key, digest)
+        return digest
+
+    def target_path(self, digest: str, width: int, fmt: str) -> Path:
+        return self.directory() / digest[:2] / f'{digest}-{width}.{fmt}'
+
+    def _executor_for_submit(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 'spawn': el servidor té fils actius i fork() no hi és segur
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    def _schedule(self, source: Path, target: Path, width: int, fmt: str) -> Future | None:
+        key = str(target)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            if target.exists():
+                return None
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                future = self._executor_for_submit().submit(_render_thumbnail, str(source), key, width, fmt)
+            except BrokenProcessPool:
+                self._executor = None
+                future = self._executor_for_submit().submit(_render_thumbnail, str(source), key, width, fmt)
+            self._inflight[key] = future
+
+        def forget(_future, key=key):
+            with self._lock:
+                if self._inflight.get(key) is _future:
+                    del self._inflight[key]
+        future.add_done_callback(forget)
+        return future
+
+    def get(self, source: Path, width: int, fmt: str) -> Path:
+        """Ruta de la miniatura, renderitzant-la si encara no existeix"""
+        target = self.target_path(self.source_hash(source), width, fmt)
+        future = self._schedule(source, target, width, fmt)
+        if future is not None:
+            future.result(timeout=THUMB_RENDER_TIMEOUT)
+        return target
+
+    def prefetch(self, sources) -> int:
+        """Encua (sense esperar) les miniatures habituals de les imatges indicades"""
+        if not self.available:
+            return 0
+        formats = self.formats()
+        scheduled = 0
+        for source in sources:
+            source = Path(source)
+            if source.suffix.lower() not in IMAGE_EXTENSIONS or not source.is_file():
+                continue
+            fmt = 'webp' if 'webp' in formats else self.default_format(source)
+            digest = self.source_hash(source)
+            for width in THUMB_PREFETCH_WIDTHS:
+                if self._schedule(source, self.target_path(digest, width, fmt), width, fmt) is not None:
+                    scheduled += 1
+        return scheduled
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+THUMBNAILS = ThumbnailService()
+
+def _prefetch_thumbnails_job(items: list) -> dict:
+    return {'scheduled': THUMBNAILS.prefetch(dict.fromkeys(items))}
+
+JOB_QUEUE.register('thumbnails', _prefetch_thumbnails_job)
+
+_MD_FENCE = re.compile(r'^\s*(`{3,}|~{3,})\s*([\w+#.-]*)')
+_MD_HEADING = re.compile(r'^(#{1,6})\s+(.*?)(?:\s+#+)?\s*$')
+_MD_RULE = re.compile(r'^([-*_])(?:\s*\1){2,}\s*$')
+_MD_LIST_ITEM = re.compile(r'^(\s*)([-*+]|\d{1,9}[.)])\s+(.*)$')
+_MD_TABLE_SEPARATOR = re.compile(r'^\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?$')
+_MD_CODE_SPAN = re.compile(r'(`+)(.+?)\1')
+_MD_IMAGE = re.compile(r'!\[([^\]]*)\]\(\s*([^)\s]+)(?:\s+&quot;([^)]*)&quot;)?\s*\)')
+_MD_LINK = re.compile(r'\[([^\]]+)\]\(\s*([^)\s]+)(?:\s+&quot;([^)]*)&quot;)?\s*\)')
+_MD_AUTOLINK = re.compile(r'&lt;((?:https?|mailto):[^\s&]+)&gt;')
+_MD_STRONG = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1')
+_MD_EMPHASIS = re.compile(r'(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?!\*)|(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?![\w_])')
+_MD_STRIKE = re.compile(r'~~(?=\S)(.+?)(?<=\S)~~')
+_MD_PLACEHOLDER = re.compile('\x00(\\d+)\x00')
+
+# Esquemes executables que es descarten als enllaços i imatges dels documents
+_UNSAFE_URL_PATTERN = re.compile(r'\s*(?:javascript|vbscript|data):', re.IGNORECASE)
+
+def _markdown_url(url: str) -> str:
+    """URL d'un enllaç o imatge (ja escapada); es descarten els esquemes executables"""
+    if _UNSAFE_URL_PATTERN.match(url):
+        return '#'
+    return url.replace('"', '&quot;')
+
+def _markdown_slug(text: str) -> str:
+    return '-'.join(_tokenize(re.sub(r'<[^>]+>', '', text))) or 'seccio'
+
+def _render_markdown_inline(text: str) -> str:
+    """Elements en línia: codi, imatges, enllaços, èmfasi i text ratllat"""
+    stash: list[str] = []
+
+    def keep(fragment: str) -> str:
+        stash.append(fragment)
+        return f'\x00{len(stash) - 1}\x00'
+
+    text = _MD_CODE_SPAN.sub(lambda m: keep(f'<code>{html.escape(m.group(2).strip(), quote=False)}</code>'), text)
+    text = html.escape(text)
+    text = _MD_IMAGE.sub(lambda m: keep(
+        f'<img src="{_markdown_url(m.group(2))}" alt="{m.group(1)}"'
+        + (f' title="{m.group(3)}"' if m.group(3) else '') + ' loading="lazy">'
+    ), text)
+    text = _MD_LINK.sub(lambda m: keep(
+        f'<a href="{_markdown_url(m.group(2))}"' + (f' title="{m.group(3)}"' if m.group(3) else '') + '>'
+    ) + m.group(1) + keep('</a>'), text)
+    text = _MD_AUTOLINK.sub(lambda m: keep(f'<a href="{_markdown_url(m.group(1))}">{m.group(1)}</a>'), text)
+    text = _MD_STRONG.sub(r'<strong>\2</strong>', text)
+    text = _MD_EMPHASIS.sub(lambda m: f'<em>{m.group(1) or m.group(2)}</em>', text)
+    text = _MD_STRIKE.sub(r'<del>\1</del>', text)
+    # Dos espais (o una barra invertida) a final de línia: salt de línia forçat
+    text = re.sub(r'(?: {2,}|\\)\n', '<br>\n', text)
+    while _MD_PLACEHOLDER.search(text):
+        text = _MD_PLACEHOLDER.sub(lambda m: stash[int(m.group(1))], text)
+    return text
+
+def _split_table_row(line: str) -> list[str]:
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [cell.strip().replace('\\|', '|') for cell in re.split(r'(?<!\\)\|', line)]
+
+def _render_markdown_table(header: list[str], separator: str, rows: list[list[str]]) -> str:
+    aligns = []
+    for cell in _split_table_row(separator):
+        if cell.startswith(':') and cell.endswith(':'):
+            aligns.append(' style="text-align:center"')
+        elif cell.endswith(':'):
+            aligns.append(' style="text-align:right"')
+        elif cell.startswith(':'):
+            aligns.append(' style="text-align:left"')
+        else:
+            aligns.append('')
+
+    def row_html(cells: list[str], tag: str) -> str:
+        cells = (cells + [''] * len(aligns))[:len(aligns)]
+        return '<tr>' + ''.join(
+            f'<{tag}{align}>{_render_markdown_inline(cell)}</{tag}>' for cell, align in zip(cells, aligns)
+        ) + '</tr>'
+
+    body = ''.join(row_html(row, 'td') for row in rows)
+    return (
+        f'<table>\n<thead>{row_html(header, "th")}</thead>\n'
+        + (f'<tbody>{body}</tbody>\n' if body else '') + '</table>'
+    )
+
+def _render_markdown_list(lines: list[str], start: int, out: list[str]) -> int:
+    """Renderitza la llista que comença a ``start`` (i les niades); retorna la línia següent"""
+    first = _MD_LIST_ITEM.match(lines[start])
+    indent = len(first.group(1))
+    ordered = first.group(2)[0].isdigit()
+    items: list[tuple[list[str], list[str]]] = []
+    i = start
+    while i < len(lines):
+        line = lines[i]
+        match = _MD_LIST_ITEM.match(line)
+        if match and len(match.group(1)) == indent and match.group(2)[0].isdigit() == ordered:
+            items.append(([match.group(3)], []))
+            i += 1
+        elif match and len(match.group(1)) > indent and items:
+            i = _render_markdown_list(lines, i, items[-1][1])
+        elif not line.strip():
+            # Una línia en blanc no talla la llista si continua amb un altre element
+            following = next((candidate for candidate in lines[i + 1:] if candidate.strip()), '')
+            following_match = _MD_LIST_ITEM.match(following)
+            if not following_match or len(following_match.group(1)) < indent:
+                break
+            i += 1
+        elif items and not match and len(line) - len(line.lstrip()) > indent:
+            items[-1][0].append(line.strip())
+            i += 1
+        else:
+            break
+
+    tag = 'ol' if ordered else 'ul'
+    attributes = ''
+    if ordered and not first.group(2).startswith('1'):
+        attributes = f' start="{int(first.group(2)[:-1])}"'
+    rendered = ''.join(
+        f'<li>{_render_markdown_inline(chr(10).join(text))}{"".join(children)}</li>' for text, children in items
+    )
+    out.append(f'<{tag}{attributes}>{rendered}</{tag}>')
+    return i
+
+def _render_markdown_fallback(text: str) -> str:
+    """Renderitzador bàsic (sense dependències) per quan no hi ha el paquet ``markdown``.
+
+    Cobreix el que fan servir els documents: encapçalaments, paràgrafs, llistes
+    (niades), blocs de codi, cites, taules, separadors, enllaços i imatges.
+    L'HTML en brut s'escapa.
+    """
+    lines = text.replace('\r\n', '\n').replace('\t', '    ').split('\n')
+    out: list[str] = []
+    paragraph: list[str] = []
+
+    def flush_paragraph() -> None:
+        if paragraph:
+            out.append(f'<p>{_render_markdown_inline(chr(10).join(paragraph))}</p>')
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+
+        fence = _MD_FENCE.match(line)
+        if fence:
+            flush_paragraph()
+            marker = fence.group(1)
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith(marker):
+                code.append(lines[i])
+                i += 1
+            i += 1
+            language = f' class="language-{html.escape(fence.group(2))}"' if fence.group(2) else ''
+            out.append(f'<pre><code{language}>{html.escape(chr(10).join(code), quote=False)}</code></pre>')
+            continue
+
+        if not stripped:
+            flush_paragraph()
+            i += 1
+            continue
+
+        heading = _MD_HEADING.match(stripped)
+        if heading:
+            flush_paragraph()
+            level = len(heading.group(1))
+            content = _render_markdown_inline(heading.group(2))
+            out.append(f'<h{level} id="{_markdown_slug(content)}">{content}</h{level}>')
+            i += 1
+            continue
+
+        if _MD_RULE.match(stripped) and not (paragraph and stripped.startswith('-')):
+            flush_paragraph()
+            out.append('<hr>')
+            i += 1
+            continue
+
+        if stripped.startswith('>'):
+            flush_paragraph()
+            quoted = []
+            while i < len(lines) and lines[i].strip().startswith('>'):
+                quoted.append(re.sub(r'^\s*>\s?', '', lines[i]))
+                i += 1
+            out.append(f'<blockquote>\n{_render_markdown_fallback(chr(10).join(quoted))}\n</blockquote>')
+            continue
+
+        if ('|' in stripped and i + 1 < len(lines) and '-' in lines[i + 1]
+                and _MD_TABLE_SEPARATOR.match(lines[i + 1].strip())):
+            flush_paragraph()
+            header, separator = _split_table_row(stripped), lines[i + 1]
+            i += 2
+            rows = []
+            while i < len(lines) and lines[i].strip() and '|' in lines[i]:
+                rows.append(_split_table_row(lines[i]))
+                i += 1
+            out.append(_render_markdown_table(header, separator, rows))
+            continue
+
+        if _MD_LIST_ITEM.match(line) and not paragraph:
+            i = _render_markdown_list(lines, i, out)
+            continue
+
+        paragraph.append(stripped if not line.endswith('  ') else stripped + '  ')
+        i += 1
+
+    flush_paragraph()
+    return '\n'.join(out)
+
+# Capçalera de /api/render: sense scripts i en un origen opac (sandbox), per si algun
+# document pujat (HTML, SVG...) n'intenta executar
+RENDER_CONTENT_SECURITY_POLICY = (
+    "default-src 'none'; img-src 'self' data:; style-src 'self' 'unsafe-inline'; "
+    "media-src 'self'; sandbox allow-popups allow-popups-to-escape-sandbox"
+)
+
+MARKDOWN_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ca">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{ margin: 0; background: #0f172a; color: #e2e8f0; font: 16px/1.6 system-ui, sans-serif; }}
+main {{ max-width: 56rem; margin: 0 auto; padding: 2rem 1.5rem 4rem; }}
+a {{ color: #93c5fd; }}
+h1, h2, h3 {{ line-height: 1.25; }}
+h1, h2 {{ border-bottom: 1px solid #334155; padding-bottom: .3em; }}
+code {{ background: #1e293b; border-radius: 4px; padding: .1em .35em; font-size: .9em; }}
+pre {{ background: #1e293b; border-radius: 8px; padding: 1rem; overflow-x: auto; }}
+pre code {{ background: none; padding: 0; }}
+blockquote {{ margin: 0; padding: 0 1rem; border-left: 4px solid #475569; color: #94a3b8; }}
+table {{ border-collapse: collapse; display: block; overflow-x: auto; }}
+th, td {{ border: 1px solid #334155; padding: .4rem .75rem; }}
+th {{ background: #1e293b; }}
+img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+<main>
+{body}
+</main>
+</body>
+</html>
+"""
+
+if markdown is not None:
+    class _SafeUrlTreeprocessor(markdown.treeprocessors.Treeprocessor):
+        """Neutralitza els enllaços i imatges amb esquemes executables (com _markdown_url)"""
+
+        def run(self, root):
+            for element in root.iter():
+                for attribute in ('href', 'src'):
+                    value = element.get(attribute)
+                    if value is not None and _UNSAFE_URL_PATTERN.match(value):
+                        element.set(attribute, '#')
+
+def render_markdown(text: str) -> str:
+    """Converteix Markdown a HTML (paquet ``markdown`` si hi és, si no el renderitzador bàsic).
+
+    En tots dos casos l'HTML escrit dins del document s'escapa: els documents
+    pujats es serveixen al mateix origen que l'API.
+    """
+    if markdown is None:
+        return _render_markdown_fallback(text)
+    converter = markdown.Markdown(extensions=['extra', 'sane_lists', 'toc'], output_format='html')
+    # Sense aquests processadors l'HTML en brut queda com a text i el serialitzador l'escapa
+    converter.preprocessors.deregister('html_block', strict=False)
+    converter.inlinePatterns.deregister('html', strict=False)
+    converter.parser.blockprocessors.deregister('markdown_block', strict=False)
+    converter.treeprocessors.register(_SafeUrlTreeprocessor(converter), 'safe_urls', 0)
+    return converter.convert(text)
+
+def render_markdown_page(text: str, fallback_title: str) -> str:
+    body = render_markdown(text)
+    heading = re.search(r'<h1[^>]*>(.*?)</h1>', body, re.DOTALL)
+    title = re.sub(r'<[^>]+>', '', heading.group(1)).strip() if heading else ''
+    return MARKDOWN_PAGE_TEMPLATE.format(title=title or html.escape(fallback_title), body=body)
+
+class MarkdownCache:
+    """LRU dels documents Markdown renderitzats, limitada per bytes.
+
+    Cada ruta guarda una sola versió, identificada per l'mtime i la mida del
+    fitxer: si el document canvia es torna a renderitzar i la versió antiga
+    es descarta. Les entrades menys usades surten quan se supera ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int = MARKDOWN_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[tuple[int, int], bytes]] = OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def is_markdown(path: Path) -> bool:
+        return path.suffix.lower() in MARKDOWN_EXTENSIONS
+
+    def get(self, path: Path) -> tuple[bytes, tuple[int, int]]:
+        """HTML de ``path`` i la versió (mtime_ns, mida) a partir de la qual s'ha generat"""
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1], version
+
+        text = path.read_text(encoding='utf-8', errors='replace')
+        body = render_markdown_page(text, path.stem).encode('utf-8')
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            if len(body) <= self.max_bytes:
+                self._entries[key] = (version, body)
+                self._size += len(body)
+                while self._size > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return body, version
+
+    def prewarm(self, root: Path) -> int:
+        """Renderitza els documents Markdown de ``root`` fins a omplir la cache"""
+        rendered = 0
+        for current, subdirectories, files in os.walk(root):
+            subdirectories[:] = sorted(name for name in subdirectories if not name.startswith('.'))
+            for name in sorted(files):
+                path = Path(current) / name
+                if name.startswith('.') or not self.is_markdown(path):
+                    continue
+                try:
+                    self.get(path)
+                except OSError:
+                    continue
+                rendered += 1
+                with self._lock:
+                    if self._size >= self.max_bytes:
+                        return rendered
+        return rendered
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+MARKDOWN_CACHE = MarkdownCache()
+
+def _prewarm_markdown_cache() -> None:
+    started = time.perf_counter()
+    rendered = MARKDOWN_CACHE.prewarm(DOCUMENTS_DIRECTORY)
+    print(f"📝 {rendered} documents Markdown renderitzats en {time.perf_counter() - started:.2f}s")
+
+def _available_encodings() -> tuple[str, ...]:
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def _choose_encoding(header_value: str | None, available) -> str | None:
+    """Tria la codificació preferida pel client segons Accept-Encoding (amb valors q)"""
+    if not header_value or not available:
+        return None
+    qualities: dict[str, float] = {}
+    for part in header_value.split(','):
+        token, _, params = part.partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[token] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def _is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return media_type.startswith('text/') or media_type in COMPRESSIBLE_TYPES
+
+def _compress(data: bytes, encoding: str, cached: bool = False) -> bytes:
+    """Comprimeix amb més nivell quan el resultat es guarda a la memòria cau"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=9 if cached else 5)
+    return gzip.compress(data, compresslevel=9 if cached else 6, mtime=0)
+
+class CompressionCache:
+    """LRU de cossos comprimits limitada per bytes.
+
+    Les claus inclouen la versió del contingut (mtime i mida, o la versió de la
+    base de dades), de manera que les entrades antigues simplement envelleixen.
+    """
+
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size = 0
+
+    def get(self, key: tuple, encoding: str, load) -> bytes:
+        cache_key = (key, encoding)
+        with self._lock:
+            data = self._entries.get(cache_key)
+            if data is not None:
+                self._entries.move_to_end(cache_key)
+                return data
+
+        data = _compress(load(), encoding, cached=True)
+        if len(data) > self.max_bytes:
+            return data
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[cache_key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return data
+
+COMPRESSION_CACHE = CompressionCache()
+
+def _parse_byte_ranges(header_value: str, size: int) -> list[tuple[int, int]] | None:
+    """Interpreta una capçalera Range ``bytes=...`` sobre un fitxer de ``size`` bytes.
+
+    Retorna els rangs (inclusius, ordenats i fusionats), una llista buida si cap
+    rang és satisfactible (416) o None si la capçalera s'ha d'ignorar.
+    """
+    unit, _, spec = header_value.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start_text, separator, end_text = part.partition('-')
+        start_text, end_text = start_text.strip(), end_text.strip()
+        if not separator:
+            return None
+        if not start_text:
+            # Rang sufix: els últims N bytes
+            if not end_text.isdigit():
+                return None
+            length = int(end_text)
+            if length > 0 and size > 0:
+                ranges.append((max(0, size - length), size - 1))
+            continue
+        if not start_text.isdigit() or (end_text and not end_text.isdigit()):
+            return None
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+        if end_text and end < start:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    ranges.sort()
+    merged: list[tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_BYTE_RANGES:
+        return None
+    return merged
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    """Comprova una capçalera If-None-Match contra un ETag"""
+    if header_value.strip() == '*':
+        return True
+    for candidate in header_value.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def _not_modified_since(header_value: str, mtime: float) -> bool:
+    """Comprova una capçalera If-Modified-Since contra un mtime"""
+    try:
+        since = email.utils.parsedate_to_datetime(header_value)
+    except (TypeError, ValueError, IndexError):
+        return False
+    if since is None:
+        return False
+    return int(mtime) <= since.timestamp()
+
+class _RequestBodyReader:
+    """Limita les lectures de rfile al cos de la petició actual i compta el que en queda"""
+
+    def __init__(self, raw, length: int):
+        self._raw = raw
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._raw.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._raw.readline(size)
+        self.remaining -= len(data)
+        return data
+
+    def drain(self, limit: int) -> bool:
+        """Descarta la resta del cos si no supera ``limit``; retorna si ha quedat buit"""
+        if self.remaining > limit:
+            return False
+        while self.remaining > 0:
+            if not self.read(UPLOAD_CHUNK_SIZE):
+                return False
+        return True
+
+class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Connexions persistents: totes les respostes porten Content-Length (o tanquen la connexió)
+    protocol_version = 'HTTP/1.1'
+    # TCP_NODELAY: capçaleres i cos van en escriptures separades i, en una connexió
+    # persistent, Nagle retindria el cos fins a l'ACK retardat del client (~40 ms)
+    disable_nagle_algorithm = True
+    # Temps d'espera de la línia de petició; durant la petició s'usa REQUEST_TIMEOUT
+    timeout = KEEPALIVE_TIMEOUT
+
+    _body_reader: _RequestBodyReader | None = None
+    _requests_handled = 0
+    _handling_request = False
+    _connection_header_sent = False
+    _error_keep_alive = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=DIRECTORY, **kwargs)
+
+    def handle_one_request(self):
+        self._handling_request = False
+        self._connection_header_sent = False
+        self._body_reader = None
+        raw_rfile = self.rfile
+        try:
+            self.connection.settimeout(KEEPALIVE_TIMEOUT)
+            super().handle_one_request()
+        finally:
+            self.rfile = raw_rfile
+            reader = self._body_reader
+            self._body_reader = None
+            self._requests_handled += 1
+            if reader is not None and reader.remaining and not self.close_connection:
+                # Un cos no llegit del tot faria interpretar-ne la resta com la petició següent
+                try:
+                    drained = reader.drain(KEEPALIVE_DRAIN_LIMIT)
+                except OSError:
+                    drained = False
+                if not drained:
+                    self.close_connection = True
+
+    def log_error(self, format, *args):
+        # Esgotar el temps d'espera entre peticions d'una connexió persistent és normal
+        if not self._handling_request and format.startswith('Request timed out'):
+            return
+        super().log_error(format, *args)
+
+    def parse_request(self) -> bool:
+        if not super().parse_request():
+            return False
+        self._handling_request = True
+        self.connection.settimeout(REQUEST_TIMEOUT)
+
+        length = 0
+        if self.headers.get('Transfer-Encoding'):
+            # Cossos chunked no suportats: no es pot saber on acaba la petició
+            self.close_connection = True
+        else:
+            try:
+                length = max(0, int(self.headers.get('Content-Length') or 0))
+            except ValueError:
+                self.close_connection = True
+        self._body_reader = _RequestBodyReader(self.rfile, length)
+        self.rfile = self._body_reader
+        return True
+
+    def _keep_connection_open(self) -> bool:
+        if self.close_connection or not getattr(self.server, 'keep_alive', False):
+            return False
+        if self._requests_handled + 1 >= KEEPALIVE_MAX_REQUESTS:
+            return False
+        if self._body_reader is not None and self._body_reader.remaining > KEEPALIVE_DRAIN_LIMIT:
+            return False
+        # Amb connexions esperant un fil lliure, no es reté el fil per a la petició següent
+        return not getattr(self.server, 'saturated', False)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            if self._error_keep_alive:
+                return
+            self._connection_header_sent = True
+        super().send_header(keyword, value)
+
+    def send_error(self, code, message=None, explain=None):
+        # BaseHTTPRequestHandler tanca sempre la connexió després d'un error; si la
+        # petició s'ha pogut interpretar, la connexió es pot reutilitzar igualment
+        self._error_keep_alive = self._handling_request and not self.close_connection
+        try:
+            super().send_error(code, message, explain)
+        finally:
+            self._error_keep_alive = False
+
+    def end_headers(self):
+        if not self._connection_header_sent:
+            self._error_keep_alive = False
+            if self._keep_connection_open():
+                remaining = KEEPALIVE_MAX_REQUESTS - self._requests_handled - 1
+                self.send_header('Connection', 'keep-alive')
+                self.send_header('Keep-Alive', f'timeout={int(KEEPALIVE_TIMEOUT)}, max={remaining}')
+            else:
+                self.close_connection = True
+                self.send_header('Connection', 'close')
+
+        # Afegir headers CORS per permetre carregar recursos locals
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match, If-Modified-Since, If-Range, Range, Upload-Offset')
+        self.send_header('Access-Control-Expose-Headers', 'Accept-Ranges, Content-Range, ETag, Last-Modified')
+        super().end_headers()
+
+    def do_OPTIONS(self):
+        self.send_response(HTTPStatus.NO_CONTENT)
+        self.end_headers()
+
+    def _api_route(self) -> str | None:
+        """Retorna la ruta relativa a /api/ (p. ex. 'search') o None si no és una petició d'API"""
+        path = urlsplit(self.path).path
+        if '/api/' not in path:
+            return None
+        return path.split('/api/', 1)[1].strip('/')
+
+    def _query_params(self) -> dict[str, str]:
+        params = parse_qs(urlsplit(self.path).query, keep_blank_values=True)
+        return {key: values[-1] for key, values in params.items()}
+
+    def _int_param(self, params: dict[str, str], name: str, default: int, minimum: int, maximum: int) -> int:
+        raw = params.get(name, '').strip()
+        if not raw:
+            return default
+        value = int(raw)  # ValueError es converteix en 400 a qui crida
+        return max(minimum, min(value, maximum))
+
+    def _ensure_database(self) -> None:
+        # Si no existeix, crear-la amb dades inicials
+        if not DATABASE_STORAGE.exists():
+            print(f"📝 Base de dades no trobada a {DATABASE_STORAGE.path()}, creant-la...")
+            self._create_initial_database()
+
+    def _load_database_snapshot(self) -> DatabaseSnapshot:
+        self._ensure_database()
+        snapshot = DATABASE_CACHE.get()
+        try:
+            DATABASE_CHANGE_LOG.record(snapshot)
+        except StaleIndexError:
+            pass  # Ja hi ha una generació més nova (SQLite): es registrarà aquella
+        return snapshot
+
+    def _is_database_request(self) -> bool:
+        # Qualsevol còpia (dist/, public/...) es serveix directament des de DOCUMENTS_DIRECTORY
+        path = urlsplit(self.path).path
+        return path.endswith('/processes-database.json')
+
+    def do_GET(self):
+        # Gestió especial per processes-database.json
+        if self._is_database_request():
+            self._serve_database_file()
+            return
+
+        route = self._api_route()
+        if route == 'search':
+            self._handle_search()
+            return
+
+        if route == 'facets':
+            self._handle_facets()
+            return
+
+        if route == 'fulltext':
+            self._handle_fulltext()
+            return
+
+        if route == 'processes':
+            self._handle_processes()
+            return
+
+        if route == 'related':
+            self._handle_related()
+            return
+
+        if route is not None and route.startswith('uploads/'):
+            self._handle_upload_session_status(route.split('/', 1)[1])
+            return
+
+        if route == 'events':
+            self._handle_events()
+            return
+
+        if route == 'database':
+            self._handle_database_delta()
+            return
+
+        if route is not None and route.startswith('jobs/'):
+            self._handle_job_status(route.split('/', 1)[1])
+            return
+
+        if route is not None and route.startswith('thumb/'):
+            self._handle_thumbnail(route.split('/', 1)[1])
+            return
+
+        if route is not None and route.startswith('render/'):
+            self._handle_render(route.split('/', 1)[1])
+            return
+
+        # Gestió normal per altres fitxers
+        self._serve_static_file()
+
+    def do_HEAD(self):
+        if self._is_database_request():
+            self._serve_database_file(head_only=True)
+            return
+
+        self._serve_static_file(head_only=True)
+
+    def _serve_database_file(self, head_only: bool = False):
+        """Serveix el fitxer processes-database.json des de la ubicació personalitzada
+
+        Amb SQLite és l'única ruta que materialitza el JSON sencer (``content``).
+        """
+        def attempt(snapshot):
+            if not self._is_not_modified(snapshot.etag, snapshot.mtime):
+                snapshot.content  # noqa: B018 - materialitza ara per tornar-ho a provar si és antic
+            return snapshot
+
+        try:
+            snapshot = self._consistent_query(attempt)
+            if snapshot is None:
+                return
+            headers = {
+                'ETag': snapshot.etag,
+                'Last-Modified': snapshot.last_modified,
+                'Cache-Control': 'no-cache',
+            }
+
+            if self._is_not_modified(snapshot.etag, snapshot.mtime):
+                self._send_not_modified(headers, vary=COMPRESSION_ENABLED)
+                return
+
+            self._send_body(
+                HTTPStatus.OK,
+                snapshot.content,
+                'application/json; charset=utf-8',
+                headers,
+                cache_key=('database', snapshot.version),
+                head_only=head_only,
+            )
+
+        except Exception as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error llegint base de dades: {e}")
+
+    def _is_not_modified(self, etag: str, mtime: float) -> bool:
+        """Valida If-None-Match (preferent) o If-Modified-Since"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, etag)
+        if_modified_since = self.headers.get('If-Modified-Since')
+        return bool(if_modified_since) and _not_modified_since(if_modified_since, mtime)
+
+    def _send_not_modified(self, headers: dict[str, str], vary: bool = False) -> None:
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if vary:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+
+    def _send_body(
+        self,
+        status: HTTPStatus,
+        body: bytes,
+        content_type: str,
+        headers: dict[str, str] | None = None,
+        cache_key: tuple | None = None,
+        head_only: bool = False,
+    ) -> None:
+        """Envia un cos en memòria, comprimit si el client ho accepta.
+
+        Amb ``cache_key`` el resultat comprimit es reutilitza entre peticions;
+        sense, es comprimeix al vol amb un nivell més lleuger.
+        """
+        headers = dict(headers or {})
+        compressible = COMPRESSION_ENABLED and _is_compressible(content_type)
+        encoding = None
+        if compressible and len(body) >= COMPRESSION_MIN_SIZE:
+            encoding = _choose_encoding(self.headers.get('Accept-Encoding'), _available_encodings())
+        if encoding is not None:
+            if cache_key is not None:
+                body = COMPRESSION_CACHE.get(cache_key, encoding, lambda: body)
+            else:
+                body = _compress(body, encoding)
+            # La representació comprimida no és idèntica byte a byte: ETag feble
+            etag = headers.get('ETag')
+            if etag and not etag.startswith('W/'):
+                headers['ETag'] = f'W/{etag}'
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def _serve_static_file(self, head_only: bool = False):
+        """Serveix fitxers estàtics amb compressió negociada i capçaleres de memòria cau.
+
+        Es prefereixen els germans precomprimits (``fitxer.br``/``fitxer.gz``) si
+        són tan recents com l'original; si no, es comprimeix una vegada i es
+        guarda a ``COMPRESSION_CACHE``.
+        """
+        url_path = urlsplit(self.path).path
+        path = Path(self.translate_path(self.path))
+        if url_path.endswith('/') and not path.is_dir():
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        if path.is_dir():
+            index = next((path / name for name in ('index.html', 'index.htm') if (path / name).is_file()), None)
+            if index is None or not url_path.endswith('/'):
+                # Redirecció amb barra final o llistat del directori: comportament estàndard
+                if head_only:
+                    super().do_HEAD()
+                else:
+                    super().do_GET()
+                return
+            path = index
+
+        try:
+            stat = path.stat()
+        except OSError:
+            stat = None
+        if stat is None or not path.is_file():
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+
+        content_type = self.guess_type(str(path))
+        compressible = COMPRESSION_ENABLED and _is_compressible(content_type)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': self.date_time_string(stat.st_mtime),
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if '/dist/assets/' in url_path else 'no-cache',
+        }
+
+        if self._is_not_modified(etag, stat.st_mtime):
+            self._send_not_modified(headers, vary=compressible)
+            return
+
+        # Les peticions Range es serveixen sempre sense codificar (offsets sobre el fitxer original)
+        range_header = self._range_requested(etag, headers['Last-Modified'])
+        if compressible and range_header is None and stat.st_size >= COMPRESSION_MIN_SIZE:
+            precompressed = {}
+            for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+                sibling = path.with_name(path.name + suffix)
+                try:
+                    if sibling.stat().st_mtime_ns >= stat.st_mtime_ns:
+                        precompressed[encoding] = sibling
+                except OSError:
+                    continue
+            available = [
+                encoding for encoding in ('br', 'gzip')
+                if encoding in precompressed
+                or (encoding in _available_encodings() and stat.st_size <= COMPRESSION_MAX_FILE_SIZE)
+            ]
+            encoding = _choose_encoding(self.headers.get('Accept-Encoding'), available)
+
+            if encoding in precompressed:
+                headers['ETag'] = f'W/{etag}'
+                headers['Content-Encoding'] = encoding
+                headers['Vary'] = 'Accept-Encoding'
+                self._send_file(precompressed[encoding], content_type, headers, head_only)
+                return
+            if encoding is not None:
+                try:
+                    self._send_body(
+                        HTTPStatus.OK,
+                        path.read_bytes(),
+                        content_type,
+                        headers,
+                        cache_key=('file', str(path), stat.st_mtime_ns, stat.st_size),
+                        head_only=head_only,
+                    )
+                except OSError:
+                    self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+                return
+
+        if compressible:
+            headers['Vary'] = 'Accept-Encoding'
+        self._send_file(path, content_type, headers, head_only, range_header, byte_ranges=True)
+
+    def _range_requested(self, etag: str, last_modified: str) -> str | None:
+        """Capçalera Range a aplicar, tenint en compte If-Range (ETag fort o data exacta)"""
+        range_header = self.headers.get('Range')
+        if not range_header:
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range is not None:
+            if_range = if_range.strip()
+            if if_range.startswith('"'):
+                return range_header if if_range == etag else None
+            return range_header if if_range == last_modified else None
+        return range_header
+
+    def _send_file(
+        self,
+        path: Path,
+        content_type: str,
+        headers: dict[str, str],
+        head_only: bool = False,
+        range_header: str | None = None,
+        byte_ranges: bool = False,
+    ) -> None:
+        """Envia un fitxer amb sendfile; amb ``byte_ranges`` respon també a peticions Range (206/416)"""
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if byte_ranges:
+                headers = {**headers, 'Accept-Ranges': 'bytes'}
+            ranges = _parse_byte_ranges(range_header, size) if byte_ranges and range_header else None
+
+            if ranges is not None and not ranges:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+
+            if ranges is None:
+                self.send_response(HTTPStatus.OK)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(size))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if not head_only:
+                    self._sendfile(f, 0, size)
+                return
+
+            if len(ranges) == 1:
+                start, end = ranges[0]
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                self.send_header('Content-Length', str(end - start + 1))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if not head_only:
+                    self._sendfile(f, start, end - start + 1)
+                return
+
+            # Diversos rangs: multipart/byteranges amb la mida calculada per endavant
+            boundary = uuid.uuid4().hex
+            part_headers = [
+                (
+                    f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                    f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+                ).encode('latin-1')
+                for start, end in ranges
+            ]
+            closing = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+            length = sum(len(part) for part in part_headers) + len(closing)
+            length += sum(end - start + 1 for start, end in ranges)
+
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-Type', f'multipart/byteranges; boundary={boundary}')
+            self.send_header('Content-Length', str(length))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            if head_only:
+                return
+            for part, (start, end) in zip(part_headers, ranges):
+                self.wfile.write(part)
+                self._sendfile(f, start, end - start + 1)
+            self.wfile.write(closing)
+
+    def _sendfile(self, f, offset: int, count: int) -> None:
+        """Copia del fitxer al socket dins del nucli (socket.sendfile recorre a send() si cal)"""
+        if count <= 0:
+            return
+        self.wfile.flush()
+        self.connection.sendfile(f, offset, count)
+
+    def _handle_search(self):
+        """GET /api/search?q=<text>&limit=<n>: cerca per prefix ordenada per rellevància"""
+        params = self._query_params()
+        try:
+            limit = self._int_param(params, 'limit', 20, 1, 200)
+        except ValueError:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': 'El paràmetre limit ha de ser un enter'})
+            return
+
+        query = params.get('q', '')
+
+        def attempt(snapshot):
+            SEARCH_INDEX.sync(snapshot)
+            return (snapshot.version, *SEARCH_INDEX.search(query, limit))
+
+        started = time.perf_counter()
+        result = self._consistent_query(attempt, lambda: DATABASE_STORAGE.search(query, limit))
+        if result is None:
+            return
+        version, total, ranked = result
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self._write_json(
+            HTTPStatus.OK,
+            {
+                'query': query,
+                'version': version,
+                'total': total,
+                'tookMs': round(elapsed_ms, 3),
+                'results': [
+                    {'id': process.get('id'), 'score': round(score, 4), 'process': process}
+                    for process, score in ranked
+                ],
+            },
+        )
+
+    def _handle_fulltext(self):
+        """GET /api/fulltext?q=<text>&limit=<n>: cerca al contingut dels documents ("frases" entre cometes)"""
+        params = self._query_params()
+        try:
+            limit = self._int_param(params, 'limit', 10, 1, 50)
+        except ValueError:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': 'El paràmetre limit ha de ser un enter'})
+            return
+
+        query = params.get('q', '')
+        started = time.perf_counter()
+        try:
+            FULLTEXT_INDEX.ensure_fresh()
+            total, results = FULLTEXT_INDEX.search(query, limit)
+        except (OSError, sqlite3.Error) as e:
+            self._write_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"Error a l'índex de text complet: {e}"})
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self._write_json(
+            HTTPStatus.OK,
+            {'query': query, 'total': total, 'tookMs': round(elapsed_ms, 3), 'results': results},
+        )
+
+    def _handle_facets(self):
+        """GET /api/facets?category=&mechanism=&object=&integration=&tag=&search=
+
+        Retorna els ids dels processos filtrats i els recomptes de cada valor de faceta.
+        """
+        params = self._query_params()
+        filters = {name: params.get(name, '') for name, _, _ in FacetIndex.DIMENSIONS}
+        search = params.get('search', '').strip()
+
+        def attempt(snapshot):
+            FACET_INDEX.sync(snapshot)
+            keys = _search_keys(snapshot, search)
+            version, _, counts, ids = FACET_INDEX.query(filters, keys)
+            _require_version(version, snapshot)
+            return version, ids, counts
+
+        result = self._consistent_query(attempt, lambda: DATABASE_STORAGE.facets(filters, search))
+        if result is None:
+            return
+        version, ids, counts = result
+        self._write_json(
+            HTTPStatus.OK,
+            {'version': version, 'total': len(ids), 'ids': ids, 'facets': counts},
+        )
+
+    def _consistent_query(self, attempt, storage_query=None):
+        """Executa ``attempt(snapshot)`` amb tots els índexs a la versió del mateix snapshot.
+
+        Si una altra petició sincronitza una versió nova entremig, ``attempt``
+        llança StaleIndexError i es torna a provar. Si el backend resol les
+        consultes en SQL (``sql_queries``), s'executa ``storage_query()`` sense
+        carregar cap snapshot. Retorna el resultat, o None si ja s'ha respost
+        amb un error.
+        """
+        try:
+            if storage_query is not None and DATABASE_STORAGE.sql_queries:
+                self._ensure_database()
+                return storage_query()
+            for _ in range(3):
+                try:
+                    return attempt(self._load_database_snapshot())
+                except StaleIndexError:
+                    continue
+        except Exception as e:  # noqa: BLE001 - retornar l'error al client
+            self._write_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"Error llegint base de dades: {e}"})
+            return None
+        self._write_json(
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            {'error': 'La base de dades ha canviat durant la consulta; torna-ho a provar'},
+        )
+        return None
+
+    def _handle_processes(self):
+        """GET /api/processes: processos per pàgines, filtrats, ordenats i amb projecció de camps.
+
+        Paràmetres: els filtres de FiltersState (search, category, mechanism,
+        object, integration, tag), sort=position|name|priority|complexity,
+        order=asc|desc, limit, offset o cursor (el ``nextCursor`` de la
+        pàgina anterior) i fields=id,name,... per retornar només aquests camps.
+        """
+        params = self._query_params()
+        sort = params.get('sort', '').strip() or 'position'
+        order = params.get('order', '').strip().lower() or 'asc'
+        if sort not in ProcessCatalog.SORTS or order not in ('asc', 'desc'):
+            self._write_json(
+                HTTPStatus.BAD_REQUEST,
+                {'error': f"sort ha de ser {', '.join(ProcessCatalog.SORTS)} i order, asc o desc"},
+            )
+            return
+        try:
+            limit = self._int_param(params, 'limit', 50, 1, 500)
+            offset = self._int_param(params, 'offset', 0, 0, sys.maxsize)
+        except ValueError:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': 'Els paràmetres limit i offset han de ser enters'})
+            return
+        cursor = params.get('cursor', '').strip()
+        try:
+            after = _decode_cursor(cursor, sort, order) if cursor else None
+        except ValueError as e:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+            return
+        fields = [field for field in (item.strip() for item in params.get('fields', '').split(',')) if field]
+        if fields and 'id' not in fields:
+            fields.insert(0, 'id')
+
+        filters = {name: params.get(name, '') for name, _, _ in FacetIndex.DIMENSIONS}
+        search = params.get('search', '').strip()
+
+        def attempt(snapshot):
+            FACET_INDEX.sync(snapshot)
+            PROCESS_CATALOG.sync(snapshot)
+            keys = _search_keys(snapshot, search)
+            version, mask = FACET_INDEX.mask(filters, keys)
+            _require_version(version, snapshot)
+            page = PROCESS_CATALOG.page(version, mask, sort, order == 'desc', offset, limit, after)
+            if page is None:
+                raise StaleIndexError(PROCESS_CATALOG.version)
+            return version, snapshot.mtime, page
+
+        result = self._consistent_query(
+            attempt,
+            lambda: DATABASE_STORAGE.process_page(filters, search, sort, order == 'desc', offset, limit, after),
+        )
+        if result is None:
+            return
+        version, mtime, page = result
+
+        query = urlsplit(self.path).query
+        etag = f'"{version}-{hashlib.sha256(query.encode("utf-8")).hexdigest()[:12]}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if self._is_not_modified(etag, mtime):
+            self._send_not_modified(headers, vary=COMPRESSION_ENABLED)
+            return
+
+        processes, encoded, total, next_key = page
+        if fields:
+            encoded = [
+                json.dumps(
+                    {field: process[field] for field in fields if field in process}, ensure_ascii=False,
+                ).encode('utf-8')
+                for process in processes
+            ]
+        header = {
+            'version': version,
+            'total': total,
+            'sort': sort,
+            'order': order,
+            'limit': limit,
+            'offset': offset,
+            'nextCursor': _encode_cursor(sort, order, next_key) if next_key is not None else None,
+        }
+        # Els processos ja codificats s'enganxen directament al JSON de la resposta
+        body = b''.join((
+            json.dumps(header, ensure_ascii=False)[:-1].encode('utf-8'),
+            b', "processes": [',
+            b', '.join(encoded),
+            b']}',
+        ))
+        self._send_body(
+            HTTPStatus.OK,
+            body,
+            'application/json; charset=utf-8',
+            headers,
+            cache_key=('processes', version, query),
+        )
+
+    def _handle_related(self):
+        """GET /api/related?integration=&object=&process=&limit=
+
+        Processos, integracions del catàleg i OmniScripts que comparteixen els
+        noms indicats (tots alhora), o algun nom amb el procés ``process``.
+        Sense paràmetres retorna els noms indexats amb els recomptes.
+        """
+        params = self._query_params()
+        try:
+            limit = self._int_param(params, 'limit', 100, 1, 1000)
+        except ValueError:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': 'El paràmetre limit ha de ser un enter'})
+            return
+
+        def attempt(snapshot):
+            RELATED_INDEX.sync(snapshot)
+            return snapshot
+
+        snapshot = self._consistent_query(attempt)
+        if snapshot is None:
+            return
+
+        filters = {kind: params.get(kind, '').strip() for kind in RelatedIndex.KINDS}
+        process_id = params.get('process', '').strip() or None
+        if process_id is None and not any(filters.values()):
+            self._write_json(HTTPStatus.OK, {'version': snapshot.version, 'keys': RELATED_INDEX.keys()})
+            return
+
+        started = time.perf_counter()
+        results = RELATED_INDEX.related(filters, process_id, limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if results is None:
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': f"No existeix el procés {process_id}"})
+            return
+
+        self._write_json(
+            HTTPStatus.OK,
+            {
+                'version': snapshot.version,
+                'query': {kind: value for kind, value in {**filters, 'process': process_id}.items() if value},
+                'tookMs': round(elapsed_ms, 3),
+                **results,
+            },
+        )
+
+    def _init_database(self):
+        """Crea o reinicialitza la base de dades buida a la ruta configurada"""
+        try:
+            db_path = DATABASE_STORAGE.path()
+            self._create_initial_database()
+
+            payload = {
+                'status': 'ok',
+                'path': str(db_path),
+            }
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(HTTPStatus.CREATED)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except Exception as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error inicialitzant base de dades: {e}")
+
+    def _update_database_after_upload(self, saved: list[dict[str, object]]) -> Job | None:
+        """Encua l'actualització de la base de dades amb els documents pujats"""
+        paths = [str(entry['directory']) for entry in saved if not entry.get('duplicate')]
+        if not paths:
+            return None
+        job = JOB_QUEUE.submit('database', paths)
+
+        # Les imatges noves tenen les miniatures preparades abans que el client les demani
+        images = [path for path in paths if Path(path).suffix.lower() in IMAGE_EXTENSIONS]
+        if images and THUMBNAILS.available:
+            JOB_QUEUE.submit('thumbnails', images)
+        return job
+
+    def _create_initial_database(self):
+        """Crea una base de dades inicial buida"""
+        try:
+            # Base de dades inicial buida, escrita de forma atòmica
+            with _DATABASE_WRITE_LOCK:
+                DATABASE_STORAGE.write(_empty_database())
+                DATABASE_WRITE_LOG.clear()
+
+            print(f"✅ Base de dades inicial creada a {DATABASE_STORAGE.path()}")
+
+        except Exception as e:
+            print(f"❌ Error creant base de dades inicial: {e}")
+            raise
+
+    def _should_handle_upload(self) -> bool:
+        path = self.path.rstrip('/')
+        return path.endswith('api/upload')
+
+    def _write_json(self, status: HTTPStatus, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self._send_body(status, body, 'application/json; charset=utf-8')
+
+    def _normalise_filename(self, filename: str) -> str:
+        candidate = Path(filename).name.strip()
+        return candidate or 'fitxer-sense-nom'
+
+    def _parse_multipart_form_data(self, content_type: str) -> list[UploadedFile]:
+        """Parse multipart/form-data en streaming, escrivint cada fitxer a un temporal"""
+        # Extract boundary from content-type header
+        boundary = None
+        for part in content_type.split(';'):
+            part = part.strip()
+            if part.startswith('boundary='):
+                boundary = part[9:].strip('"')  # Remove 'boundary='
+                break
+
+        if not boundary:
+            raise ValueError("No boundary found in Content-Type")
+
+        # Read the content length
+        content_length = int(self.headers.get('Content-Length', '0'))
+        if content_length > MAX_UPLOAD_SIZE:
+            raise UploadTooLargeError(content_length)
+        if content_length == 0:
+            return []
+
+        parser = MultipartStreamParser(boundary, DOCUMENTS_DIRECTORY)
+        remaining = content_length
+        try:
+            while remaining > 0:
+                chunk = self.rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError('La connexió s\'ha tancat abans de rebre tot el cos')
+                remaining -= len(chunk)
+                parser.feed(chunk)
+            return parser.close()
+        except BaseException:
+            parser.abort()
+            raise
+
+    def do_POST(self):
+        # Endpoint per inicialitzar la base de dades
+        if self.path.rstrip('/') == '/api/init-database':
+            self._init_database()
+            return
+
+        route = self._api_route()
+        if route == 'uploads':
+            self._create_upload_session()
+            return
+
+        if route == 'processes/batch':
+            self._handle_process_batch()
+            return
+
+        if route is not None and route.startswith('uploads/') and route.endswith('/complete'):
+            self._complete_upload_session(route[len('uploads/'):-len('/complete')])
+            return
+
+        if not self._should_handle_upload():
+            self.send_error(HTTPStatus.NOT_FOUND, "Endpoint no trobat")
+            return
+
+        content_type = self.headers.get('Content-Type', '')
+        if 'multipart/form-data' not in content_type:
+            self._write_json(
+                HTTPStatus.BAD_REQUEST,
+                {
+                    'saved': [],
+                    'errors': [
+                        {
+                            'name': 'request',
+                            'reason': 'Content-Type ha de ser multipart/form-data',
+                        }
+                    ],
+                },
+            )
+            return
+
+        try:
+            files = self._parse_multipart_form_data(content_type)
+        except UploadTooLargeError:
+            self.close_connection = True
+            self._write_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                {
+                    'saved': [],
+                    'errors': [
+                        {
+                            'name': 'request',
+                            'reason': f'La petició supera la mida màxima permesa ({MAX_UPLOAD_SIZE} bytes)',
+                        }
+                    ],
+                },
+            )
+            return
+        except Exception as error:  # noqa: BLE001 - capturem qualsevol error d'anàlisi
+            self.close_connection = True
+            self._write_json(
+                HTTPStatus.BAD_REQUEST,
+                {
+                    'saved': [],
+                    'errors': [
+                        {
+                            'name': 'request',
+                            'reason': f'No s\'ha pogut processar la petició: {error}',
+                        }
+                    ],
+                },
+            )
+            return
+        if not files:
+            self._write_json(
+                HTTPStatus.BAD_REQUEST,
+                {
+                    'saved': [],
+                    'errors': [
+                        {
+                            'name': 'request',
+                            'reason': 'No s\'ha rebut cap fitxer',
+                        }
+                    ],
+                },
+            )
+            return
+
+        saved, errors = self._store_uploads(files)
+        self._respond_upload(saved, errors)
+
+    def _store_uploads(self, files: list[UploadedFile]) -> tuple[list[dict[str, object]], list[dict[str, str]]]:
+        """Desa els fitxers rebuts al directori de documents amb un nom lliure"""
+        saved: list[dict[str, object]] = []
+        errors: list[dict[str, str]] = []
+
+        for uploaded in files:
+            filename = self._normalise_filename(uploaded.filename)
+
+            try:
+                if uploaded.size == 0:
+                    errors.append({'name': filename, 'reason': 'El fitxer és buit'})
+                    continue
+
+                # Rename atòmic: el fitxer final només apareix quan està complet
+                target_path, duplicate = DOCUMENT_STORE.store(uploaded, filename)
+
+                entry: dict[str, object] = {
+                    'originalName': filename,
+                    'storedName': target_path.name,
+                    'size': uploaded.size,
+                    'directory': str(target_path),
+                }
+                if duplicate:
+                    entry['duplicate'] = True
+                saved.append(entry)
+            except Exception as error:  # noqa: BLE001 - evitar perdre informació de l'error
+                errors.append({'name': filename, 'reason': str(error)})
+            finally:
+                uploaded.discard()
+
+        return saved, errors
+
+    def _respond_upload(self, saved: list[dict[str, object]], errors: list[dict[str, str]]) -> None:
+        # Actualitzar la base de dades en segon pla si s'han pujat documents correctament
+        job = self._update_database_after_upload(saved) if saved and not errors else None
+
+        status = HTTPStatus.CREATED if saved and not errors else HTTPStatus.OK
+        payload: dict[str, object] = {
+            'saved': saved,
+            'errors': errors,
+        }
+        if job is not None:
+            payload['job'] = {'id': job.id, 'status': job.status}
+        self._write_json(status, payload)
+
+    def _read_json_body(self) -> dict:
+        """Llegeix i parseja un cos JSON petit (ValueError si no és vàlid)"""
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_JSON_BODY_SIZE:
+            self.close_connection = True
+            raise ValueError('El cos JSON és massa gran')
+        raw = self.rfile.read(length) if length else b''
+        payload = json.loads(raw.decode('utf-8')) if raw.strip() else {}
+        if not isinstance(payload, dict):
+            raise ValueError('El cos JSON ha de ser un objecte')
+        return payload
+
+    def _handle_process_patch(self, process_id: str):
+        """PATCH /api/processes/{id} amb {"tags": [...], "tagColors": {...}}: edita els tags d'un procés"""
+        try:
+            change = parse_tag_change(self._read_json_body(), unquote(process_id))
+        except (TypeError, ValueError) as error:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': f'Petició no vàlida: {error}'})
+            return
+        self._commit_tag_changes([change])
+
+    def _handle_process_batch(self):
+        """POST /api/processes/batch: diversos canvis de tags que s'apliquen tots junts o cap.
+
+        ``updates`` és una llista de {"id", "tags", "tagColors"}; ``tags`` i
+        ``tagColors`` de nivell superior editen la llista global de tags.
+        """
+        try:
+            payload = self._read_json_body()
+            updates = payload.get('updates', [])
+            if not isinstance(updates, list) or not all(
+                isinstance(update, dict) and update.get('id') is not None for update in updates
+            ):
+                raise ValueError('updates ha de ser una llista d\'objectes amb id')
+            changes = [parse_tag_change(update, update['id']) for update in updates]
+            if 'tags' in payload or 'tagColors' in payload:
+                changes.append(parse_tag_change(payload))
+            if not changes:
+                raise ValueError('No hi ha cap canvi')
+        except (TypeError, ValueError) as error:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': f'Petició no vàlida: {error}'})
+            return
+        self._commit_tag_changes(changes)
+
+    def _commit_tag_changes(self, changes: list[dict]):
+        """Desa els canvis al registre de la base de dades i retorna els processos afectats"""
+        try:
+            snapshot = DATABASE_WRITE_LOG.submit(changes)
+        except KeyError as error:
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': f'Procés no trobat: {error.args[0]}'})
+            return
+        except FileNotFoundError:
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': 'Base de dades no trobada'})
+            return
+        except (OSError, ValueError) as e:
+            self._write_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'Error desant els tags: {e}'})
+            return
+
+        EVENT_BROKER.publish({'type': 'change', 'version': snapshot.version, 'paths': [database_path().name]})
+        updated = list(dict.fromkeys(str(change['id']) for change in changes if 'id' in change))
+        for _ in range(3):
+            try:
+                DATABASE_CHANGE_LOG.record(snapshot)
+                processes, tags, tag_colors = snapshot.tag_state(updated)
+                break
+            except StaleIndexError:
+                # Una altra escriptura (SQLite) ja ha creat una generació nova
+                snapshot = DATABASE_CACHE.get()
+        else:
+            self._write_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'La base de dades ha canviat durant la consulta; torna-ho a provar'})
+            return
+        self._write_json(
+            HTTPStatus.OK,
+            {'version': snapshot.version, 'processes': processes, 'tags': tags, 'tagColors': tag_colors},
+        )
+
+    def _create_upload_session(self):
+        """POST /api/uploads amb {"filename": ..., "size": ...}: crea una sessió de pujada"""
+        try:
+            payload = self._read_json_body()
+            filename = self._normalise_filename(str(payload.get('filename') or ''))
+            size = payload.get('size')
+            if size is not None:
+                size = int(size)
+                if size < 0:
+                    raise ValueError('La mida no pot ser negativa')
+        except (TypeError, ValueError) as error:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': f'Petició no vàlida: {error}'})
+            return
+
+        if size is not None and size > MAX_UPLOAD_SIZE:
+            self._write_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                {'error': f'El fitxer supera la mida màxima permesa ({MAX_UPLOAD_SIZE} bytes)'},
+            )
+            return
+
+        self._write_json(HTTPStatus.CREATED, UPLOAD_SESSIONS.create(filename, size))
+
+    def _handle_database_delta(self):
+        """GET /api/database?since=<versió>: només els processos afegits, modificats i eliminats.
+
+        Si la versió no es coneix (massa antiga o absent) es retorna la base de
+        dades sencera amb ``full: true``.
+        """
+        since = self._query_params().get('since', '').strip()
+
+        def attempt(snapshot):
+            delta = DATABASE_CHANGE_LOG.delta(since, snapshot) if since else None
+            if delta is None:
+                snapshot.content  # noqa: B018 - materialitza ara per tornar-ho a provar si és antic
+            return snapshot, delta
+
+        result = self._consistent_query(attempt)
+        if result is None:
+            return
+        snapshot, delta = result
+        if delta is not None:
+            self._write_json(HTTPStatus.OK, delta)
+            return
+
+        # Instantània completa: s'hi incrusten els bytes ja codificats en lloc de tornar a serialitzar
+        prefix = json.dumps({'version': snapshot.version, 'full': True}, ensure_ascii=False)[:-1]
+        body = b''.join((prefix.encode('utf-8'), b', "database": ', snapshot.content, b'}'))
+        self._send_body(
+            HTTPStatus.OK,
+            body,
+            'application/json; charset=utf-8',
+            {'ETag': snapshot.etag, 'Cache-Control': 'no-cache'},
+            cache_key=('database-full', snapshot.version),
+        )
+
+    def _handle_events(self):
+        """GET /api/events: flux Server-Sent Events amb els canvis de documents i base de dades.
+
+        Després de la salutació la connexió passa a un fil propi (``_stream_events``)
+        i el fil del pool queda lliure per a altres peticions.
+        """
+        if not isinstance(self.server, ThreadPoolHTTPServer):
+            # Amb una sola petició alhora, un flux obert bloquejaria tot el servidor
+            self._write_json(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                {'error': "Els esdeveniments no estan disponibles en mode 'single'"},
+            )
+            return
+
+        subscriber = EVENT_BROKER.subscribe()
+        if subscriber is None:
+            self._write_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'Massa connexions d\'esdeveniments obertes'})
+            return
+
+        try:
+            try:
+                version = self._load_database_snapshot().version
+            except Exception:  # noqa: BLE001 - el flux funciona igualment sense versió
+                version = None
+
+            # El flux no té longitud coneguda: la connexió es tanca en acabar
+            self.close_connection = True
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('X-Accel-Buffering', 'no')
+            self.end_headers()
+            self.wfile.write(_format_event({'type': 'hello', 'version': version}))
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            EVENT_BROKER.unsubscribe(subscriber)
+            return
+
+        self.server.detach_request(self.request)
+        threading.Thread(
+            target=_stream_events, args=(self.server, self.request, subscriber), name='sse-stream', daemon=True,
+        ).start()
+        self.wfile.flush()
+
+    def _resolve_document_path(self, relative: str) -> Path | None:
+        """Fitxer de DOCUMENTS_DIRECTORY a partir d'una ruta relativa (o amb el prefix de documentació)"""
+        relative = unquote(relative).lstrip('/')
+        for prefix in (f'{DOCUMENTATION_PREFIX}/', 'documents/'):
+            if relative.startswith(prefix):
+                relative = relative[len(prefix):]
+                break
+        root = DOCUMENTS_DIRECTORY.resolve()
+        candidate = (root / relative).resolve()
+        if root not in candidate.parents or _is_ignored_path(candidate, root):
+            return None
+        return candidate if candidate.is_file() else None
+
+    def _handle_thumbnail(self, relative: str):
+        """GET /api/thumb/<ruta>?w=<amplada>&format=webp|png|jpeg: miniatura d'una imatge de documents"""
+        source = self._resolve_document_path(relative)
+        if source is None or source.suffix.lower() not in IMAGE_EXTENSIONS:
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': 'Imatge no trobada'})
+            return
+
+        params = self._query_params()
+        try:
+            width = THUMBNAILS.snap_width(self._int_param(params, 'w', THUMB_DEFAULT_WIDTH, 1, THUMB_WIDTHS[-1]))
+        except ValueError:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': 'El paràmetre w ha de ser un enter'})
+            return
+
+        formats = THUMBNAILS.formats()
+        requested = params.get('format', '').strip().lower()
+        if requested and requested not in THUMB_FORMATS:
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': f"Format no suportat: {requested}"})
+            return
+        vary_accept = not requested
+        if not requested:
+            accepts_webp = 'image/webp' in (self.headers.get('Accept') or '')
+            requested = 'webp' if accepts_webp and 'webp' in formats else THUMBNAILS.default_format(source)
+
+        thumbnail = None
+        if requested in formats:
+            try:
+                thumbnail = THUMBNAILS.get(source, width, requested)
+            except Exception as e:  # noqa: BLE001 - es serveix l'original
+                print(f"⚠️  No s'ha pogut generar la miniatura de {source.name}: {e}")
+
+        if thumbnail is None:
+            # Sense Pillow (o si falla el renderitzat) el client rep l'original
+            path, content_type = source, self.guess_type(str(source))
+            stat = source.stat()
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        else:
+            path, content_type = thumbnail, THUMB_FORMATS[requested][1]
+            etag = f'"{thumbnail.stem}-{requested}"'
+
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if vary_accept:
+            headers['Vary'] = 'Accept'
+        if self._is_not_modified(etag, path.stat().st_mtime):
+            self._send_not_modified(headers)
+            return
+        self._send_file(path, content_type, headers)
+
+    def _handle_render(self, relative: str):
+        """GET /api/render/<ruta>: document Markdown renderitzat a HTML.
+
+        La resta de fitxers (imatges, altres documents) es retornen tal qual, de
+        manera que els enllaços relatius dins del document continuen funcionant.
+        """
+        path = self._resolve_document_path(relative)
+        if path is None:
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': 'Document no trobat'})
+            return
+
+        stat = path.stat()
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'no-cache',
+            'Content-Security-Policy': RENDER_CONTENT_SECURITY_POLICY,
+        }
+        if self._is_not_modified(etag, stat.st_mtime):
+            self._send_not_modified(headers)
+            return
+
+        if not MARKDOWN_CACHE.is_markdown(path):
+            self._send_file(path, self.guess_type(str(path)), headers)
+            return
+
+        try:
+            body, version = MARKDOWN_CACHE.get(path)
+        except OSError as e:
+            self._write_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'No s\'ha pogut llegir el document: {e}'})
+            return
+        headers['ETag'] = f'"{version[0]:x}-{version[1]:x}"'
+        self._send_body(
+            HTTPStatus.OK, body, 'text/html; charset=utf-8', headers,
+            cache_key=('render', str(path), version),
+        )
+
+    def _handle_job_status(self, job_id: str):
+        """GET /api/jobs/{id}: estat d'un treball en segon pla"""
+        job = JOB_QUEUE.get(job_id)
+        if job is None:
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': 'Treball no trobat'})
+            return
+        self._write_json(HTTPStatus.OK, job)
+
+    def _handle_upload_session_status(self, session_id: str):
+        """GET /api/uploads/{id}: bytes rebuts fins ara, per saber des d'on reprendre"""
+        status = UPLOAD_SESSIONS.status(session_id)
+        if status is None:
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': 'Sessió de pujada no trobada'})
+            return
+        self._write_json(HTTPStatus.OK, status)
+
+    def _append_upload_chunk(self, session_id: str):
+        """PUT /api/uploads/{id}?offset=<n>: afegeix un bloc a partir de l'offset indicat"""
+        params = self._query_params()
+        try:
+            offset = int(params.get('offset') or self.headers.get('Upload-Offset') or '')
+            length = int(self.headers.get('Content-Length') or '')
+        except ValueError:
+            self.close_connection = True
+            self._write_json(HTTPStatus.BAD_REQUEST, {'error': 'Cal indicar offset i Content-Length'})
+            return
+
+        try:
+            status = UPLOAD_SESSIONS.append(session_id, offset, self.rfile, length)
+        except FileNotFoundError:
+            self.close_connection = True
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': 'Sessió de pujada no trobada'})
+            return
+        except UploadOffsetMismatchError as error:
+            self.close_connection = True
+            self._write_json(HTTPStatus.CONFLICT, {'error': str(error), 'received': error.received})
+            return
+        except UploadTooLargeError:
+            self.close_connection = True
+            self._write_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                {'error': 'El bloc supera la mida declarada o la mida màxima permesa'},
+            )
+            return
+        except ConnectionError:
+            self.close_connection = True
+            return
+
+        self._write_json(HTTPStatus.OK, status)
+
+    def _complete_upload_session(self, session_id: str):
+        """POST /api/uploads/{id}/complete: desa el fitxer i respon com /api/upload"""
+        try:
+            saved, errors = UPLOAD_SESSIONS.complete(session_id, lambda uploaded: self._store_uploads([uploaded]))
+        except FileNotFoundError:
+            self._write_json(HTTPStatus.NOT_FOUND, {'error': 'Sessió de pujada no trobada'})
+            return
+        except UploadOffsetMismatchError as error:
+            self._write_json(
+                HTTPStatus.CONFLICT,
+                {'error': 'La pujada encara no és completa', 'received': error.received},
+            )
+            return
+
+        self._respond_upload(saved, errors)
+
+    def do_PUT(self):
+        route = self._api_route()
+        if route is not None and route.startswith('uploads/') and route.count('/') == 1:
+            self._append_upload_chunk(route.split('/', 1)[1])
+            return
+
+        self.close_connection = True
+        self.send_error(HTTPStatus.NOT_FOUND, "Endpoint no trobat")
+
+    def do_PATCH(self):
+        route = self._api_route()
+        if route is not None and route.startswith('processes/') and route.count('/') == 1:
+            self._handle_process_patch(route.split('/', 1)[1])
+            return
+
+        self.close_connection = True
+        self.send_error(HTTPStatus.NOT_FOUND, "Endpoint no trobat")
+
+    def do_DELETE(self):
+        route = self._api_route()
+        if route is not None and route.startswith('uploads/') and route.count('/') == 1:
+            session_id = route.split('/', 1)[1]
+            try:
+                UPLOAD_SESSIONS.cancel(session_id)
+            except FileNotFoundError:
+                self._write_json(HTTPStatus.NOT_FOUND, {'error': 'Sessió de pujada no trobada'})
+                return
+            self.send_response(HTTPStatus.NO_CONTENT)
+            self.end_headers()
+            return
+
+        self.send_error(HTTPStatus.NOT_FOUND, "Endpoint no trobat")
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """Servidor TCP que atén cada connexió en un pool de fils de mida limitada.
+
+    Quan tots els fils estan ocupats el bucle d'acceptació espera que se n'alliberi
+    un, de manera que una pujada lenta no bloqueja la resta de peticions però el
+    nombre de fils actius mai supera ``max_workers``.
+    """
+
+    # Les connexions persistents només tenen sentit si hi ha més d'un fil
+    keep_alive = True
+
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS, bind_and_activate=True):
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='doc-finder')
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._waiting = 0
+        # Connexions obertes (incloses les persistents inactives), per tancar-les en aturar
+        self._connections: set = set()
+        # Connexions que un altre fil continua atenent un cop acabat el handler (fluxos SSE)
+        self._detached: set = set()
+        self._connections_lock = threading.Lock()
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    @property
+    def saturated(self) -> bool:
+        """Hi ha connexions acceptades esperant que s'alliberi un fil"""
+        return self._waiting > 0
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self._waiting += 1
+            try:
+                self._slots.acquire()
+            finally:
+                self._waiting -= 1
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # El pool ja s'ha aturat: tancar la connexió sense atendre-la
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        with self._connections_lock:
+            self._connections.add(request)
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # noqa: BLE001 - mateix comportament que TCPServer
+            self.handle_error(request, client_address)
+        finally:
+            with self._connections_lock:
+                detached = request in self._detached
+                if not detached:
+                    self._connections.discard(request)
+            if not detached:
+                self.shutdown_request(request)
+            self._slots.release()
+
+    def detach_request(self, request) -> None:
+        """El handler ha cedit ``request`` a un altre fil: no es tanca en acabar i allibera el fil del pool"""
+        with self._connections_lock:
+            self._detached.add(request)
+
+    def release_request(self, request) -> None:
+        """Tanca una connexió cedida amb ``detach_request``"""
+        with self._connections_lock:
+            self._detached.discard(request)
+            self._connections.discard(request)
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def _resolve_server_mode(mode=None) -> str:
+    mode = (mode or SERVER_MODE).lower()
+    if mode not in SERVER_MODES:
+        print(f"⚠️  Mode de servidor desconegut '{mode}', s'usarà 'threaded'")
+        return 'threaded'
+    if mode == 'prefork' and not hasattr(os, 'fork'):
+        print("⚠️  El mode 'prefork' necessita os.fork(); s'usarà 'threaded'")
+        return 'threaded'
+    if mode == 'prefork' and threading.current_thread() is not threading.main_thread():
+        # fork() des d'un procés amb altres fils (p. ex. app.py amb pywebview) no és segur
+        print("⚠️  El mode 'prefork' només es pot iniciar des del fil principal; s'usarà 'threaded'")
+        return 'threaded'
+    return mode
+
+def create_server(port, mode=None, max_workers=None):
+    """Crea el servidor HTTP segons el mode de servei configurat"""
+    mode = _resolve_server_mode(mode)
+
+    if mode == 'single':
+        httpd = socketserver.TCPServer(("", port), CustomHTTPRequestHandler, bind_and_activate=False)
+    else:
+        httpd = ThreadPoolHTTPServer(
+            ("", port), CustomHTTPRequestHandler, max_workers=max_workers or MAX_WORKERS, bind_and_activate=False,
+        )
+
+    # Permet reprendre el port just després d'aturar la instància anterior (TIME_WAIT)
+    httpd.allow_reuse_address = True
+    try:
+        httpd.server_bind()
+        httpd.server_activate()
+    except BaseException:
+        httpd.server_close()
+        raise
+    if mode == 'prefork':
+        # Tots els processos esperen al mateix socket: qui no guanya l'accept() rep EAGAIN
+        httpd.socket.setblocking(False)
+    return httpd
+
+def bind_server(start_port, mode=None, max_workers=None, attempts=PORT_ATTEMPTS):
+    """Crea el servidor al primer port lliure a partir de ``start_port``, enllaçant-lo directament"""
+    for port in range(start_port, start_port + attempts):
+        try:
+            return create_server(port, mode, max_workers)
+        except OSError:
+            print(f"⏳ Port {port} ocupat, provant següent...")
+    print(f"❌ No s'ha trobat cap port lliure entre {start_port} i {start_port + attempts - 1}")
+    return None
+
+def _invalidate_caches() -> None:
+    """Descarta les caches de base de dades i documents del procés (SIGHUP)"""
+    DATABASE_CACHE.invalidate()
+    DOCUMENT_STORE.invalidate()
+    MARKDOWN_CACHE.invalidate()
+    FULLTEXT_INDEX.mark_dirty()
+    print(f"🔄 Caches invalidades (procés {os.getpid()})")
+
+def _serve_with_watcher(httpd) -> None:
+    """Atén peticions vigilant DOCUMENTS_DIRECTORY fins que s'atura el servidor"""
+    watcher = DocumentsWatcher(DOCUMENTS_DIRECTORY)
+    watcher.add_listener(_on_documents_changed)
+    if watcher.start():
+        print(f"👀 Vigilant canvis a documents ({watcher.backend.name}, procés {os.getpid()})")
+    threading.Thread(target=_refresh_fulltext_index, name='fulltext-index', daemon=True).start()
+    if MARKDOWN_PREWARM:
+        threading.Thread(target=_prewarm_markdown_cache, name='markdown-prewarm', daemon=True).start()
+    try:
+        httpd.serve_forever()
+    finally:
+        watcher.stop()
+        EVENT_BROKER.close()
+        DATABASE_WRITE_LOG.close()
+
+class PreforkSupervisor:
+    """Manté ``workers`` processos fills atenent el socket compartit de ``httpd``.
+
+    Cada fill té el seu pool de fils, les seves caches i el seu vigilant de
+    documents; les escriptures a disc es coordinen amb ``InterProcessLock``.
+    El supervisor reinicia els fills que moren, reenvia SIGHUP perquè invalidin
+    les caches i, amb SIGTERM o Ctrl+C, els atura tots.
+    """
+
+    def __init__(self, httpd, workers: int = PREFORK_WORKERS):
+        self.httpd = httpd
+        self.workers = max(1, workers)
+        self._children: dict[int, tuple[int, float]] = {}
+        self._failures = 0
+
+    def start(self) -> None:
+        # Els fills consulten l'estat dels treballs de qualsevol procés
+        JOB_QUEUE.persist_to(state_directory() / 'jobs')
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def _spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker(index)
+            except SystemExit as exit_request:
+                code = exit_request.code if isinstance(exit_request.code, int) else 0
+            except BaseException as error:  # noqa: BLE001 - qualsevol error acaba el fill
+                print(f"❌ Error al procés {index} ({os.getpid()}): {error}")
+                code = 1
+            finally:
+                # Sense atexit: el registre d'instància i el socket són del supervisor
+                os._exit(code)
+        self._children[pid] = (index, time.monotonic())
+
+    def _run_worker(self, index: int) -> None:
+        signal.signal(signal.SIGTERM, _handle_sigterm)
+        # Ctrl+C arriba a tot el grup de processos: l'atura el supervisor
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(
+            signal.SIGHUP,
+            lambda signum, frame: threading.Thread(target=_invalidate_caches, daemon=True).start(),
+        )
+        threading.Thread(target=self._exit_with_parent, args=(os.getppid(),), daemon=True).start()
+        print(f"👷 Procés {index} iniciat (pid {os.getpid()})")
+        _serve_with_watcher(self.httpd)
+
+    @staticmethod
+    def _exit_with_parent(parent_pid: int) -> None:
+        # Si el supervisor mor sense aturar els fills, no han de quedar escoltant el port
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def reload(self, signum=None, frame=None) -> None:
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        """Bucle del supervisor: reinicia els fills que acaben fins que s'atura"""
+        signal.signal(signal.SIGHUP, self.reload)
+        try:
+            while self._children:
+                pid, status = os.wait()
+                index, started = self._children.pop(pid, (None, 0.0))
+                if index is None:
+                    continue
+                code = os.waitstatus_to_exitcode(status)
+                print(f"⚠️  El procés {index} (pid {pid}) ha acabat amb codi {code}; reiniciant...")
+                if time.monotonic() - started < PREFORK_MIN_UPTIME:
+                    # Fallades en arrencar: esperar cada vegada més (fins a 5 s)
+                    self._failures += 1
+                    time.sleep(min(5.0, 0.1 * 2 ** self._failures))
+                else:
+                    self._failures = 0
+                self._spawn(index)
+        except (KeyboardInterrupt, SystemExit):
+            print("\n🛑 Aturant els processos...")
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = INSTANCE_STOP_TIMEOUT) -> None:
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        while self._children and time.monotonic() < deadline:
+            for pid in list(self._children):
+                try:
+                    finished, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    finished = pid
+                if finished:
+                    self._children.pop(pid, None)
+            time.sleep(0.01)
+        for pid in list(self._children):
+            try:
+                os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._children.clear()
+
+# S'activa quan el servidor ja escolta (PORT conté el port definitiu)
+SERVER_READY = threading.Event()
+# S'activa també si l'arrencada falla, perquè wait_until_ready no esperi en va
+_SERVER_STARTUP_FINISHED = threading.Event()
+
+def wait_until_ready(timeout=None):
+    """Espera que start_server escolti; retorna el port o None si falla o s'esgota el temps"""
+    _SERVER_STARTUP_FINISHED.wait(timeout)
+    return PORT if SERVER_READY.is_set() else None
+
+def _handle_sigterm(signum, frame):
+    # Aturada ordenada: els blocs finally tanquen el servidor i atexit neteja el registre
+    raise SystemExit(0)
+
+def _open_browser_in_background() -> None:
+    # Opcionalment obrir navegador (es pot suprimir amb SUPPRESS_BROWSER=true)
+    if os.environ.get('SUPPRESS_BROWSER', '').lower() in ('1', 'true', 'yes'):
+        return
+    print("🔍 Gestionant navegador...")
+    def delayed_browser_open():
+        # El socket ja escolta: no cal esperar
+        print("🌐 Intentant obrir navegador...")
+        result = smart_browser_open()
+        if result:
+            print("✅ Navegador obert correctament")
+        else:
+            print("❌ Error obrint navegador")
+    threading.Thread(target=delayed_browser_open, daemon=True).start()
+
+def start_server(mode=None, max_workers=None, on_ready=None, workers=None):
+    """Inicia el servidor web intel·ligent
+
+    ``mode``, ``max_workers`` i ``workers`` sobreescriuen DOC_FINDER_SERVER_MODE,
+    DOC_FINDER_MAX_WORKERS i DOC_FINDER_WORKERS. ``on_ready(port)`` es crida (i
+    s'activa ``SERVER_READY``) tan bon punt el socket escolta.
+    """
+    global PORT
+
+    SERVER_READY.clear()
+    _SERVER_STARTUP_FINISHED.clear()
+    try:
+        mode = _resolve_server_mode(mode)
+        print("🧹 Netejant instàncies prèvies...")
+        kill_existing_servers()
+
+        print("📋 Configurant servidor web...")
+        os.chdir(DIRECTORY)
+
+        print("🌐 Creant servidor HTTP...")
+        httpd = bind_server(PORT, mode, max_workers)
+        if httpd is None:
+            print("❌ No s'ha pogut trobar cap port lliure")
+            return
+
+        PORT = httpd.server_address[1]  # Actualitzar el port global
+        INSTANCE_REGISTRY.register(PORT)
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, _handle_sigterm)
+
+        # El socket ja escolta: les connexions esperen a la cua fins a serve_forever
+        SERVER_READY.set()
+    finally:
+        _SERVER_STARTUP_FINISHED.set()
+
+    if on_ready is not None:
+        try:
+            on_ready(PORT)
+        except Exception as e:  # noqa: BLE001 - un error del callback no atura el servidor
+            print(f"⚠️  Error al callback on_ready: {e}")
+
+    with httpd:
+        print(f"🚀 Servidor web iniciat al port {PORT}!")
+        if mode == 'prefork':
+            supervisor = PreforkSupervisor(httpd, workers or PREFORK_WORKERS)
+            print(f"🧵 Mode prefork: {supervisor.workers} processos amb un pool de {httpd.max_workers} fils cadascun")
+        elif isinstance(httpd, ThreadPoolHTTPServer):
+            print(f"🧵 Mode concurrent: pool de {httpd.max_workers} fils")
+        else:
+            print("🧵 Mode seqüencial: una petició alhora")
+        print(f"📁 Directori: {DIRECTORY}")
+        print(f"📂 Documents Directory: {DOCUMENTS_DIRECTORY}")
+        if DOCUMENTS_DIRECTORY_ENV:
+            print(f"🔧 Utilitzant DOCUMENTS_DIRECTORY de variable d'entorn: {DOCUMENTS_DIRECTORY_ENV}")
+        else:
+            print(f"🔧 Utilitzant DOCUMENTS_DIRECTORY per defecte")
+        print(f"🗄️  Base de dades ({DATABASE_STORAGE.name}): {DATABASE_STORAGE.path()}")
+        print(f"🌐 URL base: http://localhost:{PORT}")
+        print(f"📋 Document Finder: http://localhost:{PORT}{DOC_FINDER_PATH}")
+        print(f"🖼️  Diagrames: http://localhost:{PORT}/diagrams/")
+        print("\n💡 Prem Ctrl+C per aturar el servidor")
+        print("=" * 60)
+
+        if mode == 'prefork':
+            # Els fills es creen abans del fil del navegador: fork() amb un sol fil actiu
+            supervisor.start()
+            _open_browser_in_background()
+            try:
+                supervisor.run()
+            finally:
+                SERVER_READY.clear()
+            return
+
+        _open_browser_in_background()
+        try:
+            _serve_with_watcher(httpd)
+        except KeyboardInterrupt:
+            print("\n🛑 Servidor aturat per l'usuari")
+        finally:
+            SERVER_READY.clear()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Servidor de Doc Finder')
+    parser.add_argument(
+        '--export-database', metavar='FITXER',
+        help="escriu la base de dades (JSON, '-' per stdout) i surt",
+    )
+    parser.add_argument(
+        '--import-database', metavar='FITXER',
+        help='substitueix la base de dades pel contingut del JSON indicat i surt',
+    )
+    args = parser.parse_args(argv)
+
+    if args.import_database:
+        count = import_database(args.import_database)
+        print(f"📥 {count} processos importats a {DATABASE_STORAGE.path()}", file=sys.stderr)
+        return 0
+    if args.export_database:
+        count = export_database(args.export_database)
+        print(f"📤 {count} processos exportats de {DATABASE_STORAGE.path()}", file=sys.stderr)
+        return 0
     start_server()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,13 @@ import { useCallback, useEffect, useMemo, useRef, useState } from 'react'
 import type { PointerEvent as ReactPointerEvent } from 'react'
 import './App.css'
 import type {
+  DatabaseDelta,
+  DatabaseSyncResponse,
   FiltersState,
   Process,
   ProcessesDatabase,
   TagUpdatePayload,
+  UploadJob,
   UploadResponse,
 } from './types'
 import { DEFAULT_TAG_COLOR, ensureTagColors } from './tagColors'
@@ -29,6 +32,8 @@ const envDatabaseUrl = typeof envDatabaseUrlRaw === 'string' ? envDatabaseUrlRaw
 const DATABASE_URL = envDatabaseUrl.length > 0
   ? envDatabaseUrl
   : `${normalizedBaseUrl}${DEFAULT_DATABASE_PATH}`
+const JOB_POLL_INTERVAL_MS = 250
+const JOB_POLL_TIMEOUT_MS = 60000
 const RIGHT_PANEL_MIN_WIDTH = 320
 const RIGHT_PANEL_MAX_WIDTH = 720
 const RIGHT_PANEL_DEFAULT_WIDTH = 400
@@ -130,6 +135,61 @@ const getStoredNumber = (key: string, fallback: number) => {
   }
 }
 
+const withTagColors = (payload: ProcessesDatabase): ProcessesDatabase => ({
+  ...payload,
+  tagColors: ensureTagColors(
+    payload.tags,
+    payload.processes.map((process) => process.tags),
+    payload.tagColors,
+  ),
+})
+
+// Versió (ETag sense cometes) de la base de dades servida pel servidor Python
+const versionFromResponse = (response: Response) => {
+  const etag = response.headers.get('ETag')
+  return etag ? etag.replace(/^W\//, '').replace(/"/g, '') : null
+}
+
+// Aplica els canvis retornats per /api/database?since= sobre la base de dades actual
+const applyDatabaseDelta = (current: ProcessesDatabase, delta: DatabaseDelta): ProcessesDatabase => {
+  const removed = new Set(delta.removed.map(String))
+  const changed = new Map(delta.modified.map((process) => [String(process.id), process]))
+  const processes = current.processes
+    .filter((process) => !removed.has(String(process.id)))
+    .map((process) => changed.get(String(process.id)) ?? process)
+  const existing = new Set(processes.map((process) => String(process.id)))
+  for (const process of delta.added) {
+    if (!existing.has(String(process.id))) {
+      processes.push(process)
+    }
+  }
+  return withTagColors({ ...current, ...delta.lists, processes })
+}
+
+const sleep = (ms: number) => new Promise<void>((resolve) => window.setTimeout(resolve, ms))
+
+// Espera que el servidor acabi el treball encuat per una pujada (actualització de la base de dades)
+const waitForJob = async (jobId: string): Promise<UploadJob | null> => {
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS
+  while (Date.now() < deadline) {
+    try {
+      const response = await fetch(`${normalizedBaseUrl}api/jobs/${jobId}`, { cache: 'no-store' })
+      if (!response.ok) {
+        return null
+      }
+      const job = (await response.json()) as UploadJob
+      if (job.status === 'done' || job.status === 'failed') {
+        return job
+      }
+    } catch (error) {
+      console.warn('No s\'ha pogut consultar l\'estat del treball', error)
+      return null
+    }
+    await sleep(JOB_POLL_INTERVAL_MS)
+  }
+  return null
+}
+
 // type SurfaceAnimationStyle = CSSProperties & {
 //   '--surface-delay'?: string
 // }
@@ -193,28 +253,65 @@ function AppContent() {
   }, [])
   const isMountedRef = useRef(true)
 
+  const databaseVersionRef = useRef<string | null>(null)
+
   const refreshDatabase = useCallback(async () => {
     try {
       console.log('🔄 Refrescant base de dades...')
+      // Amb el servidor Python només es demanen els canvis des de la versió que ja tenim
+      if (envDatabaseUrl.length === 0 && databaseVersionRef.current) {
+        const since = encodeURIComponent(databaseVersionRef.current)
+        const response = await fetch(`${normalizedBaseUrl}api/database?since=${since}`, { cache: 'no-store' })
+        if (response.ok) {
+          const payload = (await response.json()) as DatabaseSyncResponse
+          databaseVersionRef.current = payload.version
+          if (payload.full) {
+            setDatabase(withTagColors(payload.database))
+          } else {
+            setDatabase((previous) => (previous ? applyDatabaseDelta(previous, payload) : previous))
+          }
+          console.log('✅ Base de dades refrescada correctament')
+          return
+        }
+      }
+
       console.log('🔧 URL completa:', new URL(DATABASE_URL, window.location.href).toString())
       const response = await fetch(DATABASE_URL, { cache: 'no-cache' })
       if (!response.ok) {
         throw new Error(`Error ${response.status}: No s'ha pogut refrescar la base de dades`)
       }
       const payload = (await response.json()) as ProcessesDatabase
-      const tagColors = ensureTagColors(
-        payload.tags,
-        payload.processes.map((process) => process.tags),
-        payload.tagColors,
-      )
-
-      setDatabase({ ...payload, tagColors })
+      databaseVersionRef.current = versionFromResponse(response)
+      setDatabase(withTagColors(payload))
       console.log('✅ Base de dades refrescada correctament')
     } catch (error) {
       console.error('❌ Error refrescant base de dades:', error)
     }
   }, [])
 
+  // Desa els canvis de tags al servidor Python i després es resincronitza amb la versió desada
+  const persistTagChanges = useCallback(
+    async (path: string, method: 'PATCH' | 'POST', body: TagUpdatePayload) => {
+      if (envDatabaseUrl.length > 0) {
+        return
+      }
+      try {
+        const response = await fetch(`${normalizedBaseUrl}${path}`, {
+          method,
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify(body),
+        })
+        if (!response.ok) {
+          throw new Error(`Error ${response.status}: No s'han pogut desar els tags`)
+        }
+      } catch (error) {
+        console.error('❌ Error desant els tags:', error)
+      }
+      await refreshDatabase()
+    },
+    [refreshDatabase],
+  )
+
   const uploadDocuments = useCallback(
     async (files: File[]) => {
       if (!files.length) {
@@ -272,11 +369,19 @@ function AppContent() {
           timestamp: Date.now(),
         })
 
-        // Refrescar la base de dades després d'una pujada exitosa
+        // Refrescar la base de dades quan el servidor acabi d'actualitzar-la
         if (hasSaved) {
-          setTimeout(() => {
+          const { job } = payload
+          if (job) {
+            void waitForJob(job.id).then((finishedJob) => {
+              if (finishedJob?.status === 'failed') {
+                console.warn('❌ Error actualitzant la base de dades:', finishedJob.error)
+              }
+              void refreshDatabase()
+            })
+          } else {
             void refreshDatabase()
-          }, 1000) // Esperar 1 segon per donar temps al servidor
+          }
         }
       } catch (uploadError) {
         const reason = uploadError instanceof Error ? uploadError.message : 'Error desconegut'
@@ -300,6 +405,45 @@ function AppContent() {
     setUploadFeedback(null)
   }, [])
 
+  // El servidor Python avisa via Server-Sent Events quan canvien els documents o la base de dades
+  useEffect(() => {
+    if (!isBrowser || typeof window.EventSource === 'undefined') {
+      return undefined
+    }
+
+    let lastVersion: string | null = null
+    const source = new EventSource(`${normalizedBaseUrl}api/events`)
+
+    const handleHello = (event: MessageEvent<string>) => {
+      try {
+        lastVersion = (JSON.parse(event.data) as { version?: string | null }).version ?? null
+      } catch (parseError) {
+        console.warn('Esdeveniment del servidor no vàlid', parseError)
+      }
+    }
+
+    const handleChange = (event: MessageEvent<string>) => {
+      try {
+        const { version } = JSON.parse(event.data) as { version?: string | null }
+        if (version && version === lastVersion) {
+          return
+        }
+        lastVersion = version ?? null
+        void refreshDatabase()
+      } catch (parseError) {
+        console.warn('Esdeveniment del servidor no vàlid', parseError)
+      }
+    }
+
+    source.addEventListener('hello', handleHello)
+    source.addEventListener('change', handleChange)
+    return () => {
+      source.removeEventListener('hello', handleHello)
+      source.removeEventListener('change', handleChange)
+      source.close()
+    }
+  }, [refreshDatabase])
+
   useEffect(() => {
     if (!isBrowser) {
       setAppReady(true)
@@ -324,14 +468,10 @@ function AppContent() {
           throw new Error(`Error ${response.status}: No s'ha pogut carregar la base de dades`)
         }
         const payload = (await response.json()) as ProcessesDatabase
-        const tagColors = ensureTagColors(
-          payload.tags,
-          payload.processes.map((process) => process.tags),
-          payload.tagColors,
-        )
 
         if (isMounted) {
-          setDatabase({ ...payload, tagColors })
+          databaseVersionRef.current = versionFromResponse(response)
+          setDatabase(withTagColors(payload))
           setLoading(false)
           console.log('✅ Base de dades carregada correctament')
         }
@@ -673,6 +813,7 @@ function AppContent() {
         tagColors,
       }
     })
+    void persistTagChanges(`api/processes/${encodeURIComponent(processId)}`, 'PATCH', payload)
   }
 
   const handleUpdateGlobalTags = (payload: TagUpdatePayload) => {
@@ -698,6 +839,7 @@ function AppContent() {
         tagColors: mergedTagColors,
       }
     })
+    void persistTagChanges('api/processes/batch', 'POST', payload)
   }
 
   const handleShowDiagram = (process: Process) => {
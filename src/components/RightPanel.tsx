@@ -1,5 +1,7 @@
 import type { CSSProperties, PointerEvent as ReactPointerEvent } from 'react'
 import type { Process } from '../types'
+import { documentationUrl } from '../documentation'
+import { thumbnailSrcSet, thumbnailUrl } from '../thumbnails'
 
 export interface RightPanelProps {
   process: Process | null
@@ -183,7 +185,18 @@ export function RightPanel({
             <h3 className="text-white font-medium mb-3">Documentation</h3>
             <div className="bg-white/5 rounded-lg p-4">
               <div className="text-white/80 text-sm leading-relaxed">
-                {process.documentation}
+                {documentationUrl(process.documentation) ? (
+                  <a
+                    href={documentationUrl(process.documentation)}
+                    target="_blank"
+                    rel="noopener noreferrer"
+                    className="text-blue-300 hover:text-blue-200 underline break-all"
+                  >
+                    {process.documentation}
+                  </a>
+                ) : (
+                  process.documentation
+                )}
               </div>
             </div>
           </div>
@@ -195,7 +208,18 @@ export function RightPanel({
             <h3 className="text-white font-medium mb-3">Diagram</h3>
             <div className="bg-white/5 rounded-lg p-4">
               <img
-                src={process.diagram}
+                src={thumbnailUrl(process.diagram, 640)}
+                srcSet={thumbnailSrcSet(process.diagram)}
+                sizes={`${Math.round(width)}px`}
+                loading="lazy"
+                onError={(event) => {
+                  // Sense servidor Python (o si la miniatura falla) es mostra l'original
+                  const image = event.currentTarget
+                  if (process.diagram && image.getAttribute('src') !== process.diagram) {
+                    image.removeAttribute('srcset')
+                    image.src = process.diagram
+                  }
+                }}
                 alt={`Diagram for ${process.name}`}
                 className="w-full h-auto rounded-lg"
               />
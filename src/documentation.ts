@@ -0,0 +1,17 @@
+const baseUrl = import.meta.env.BASE_URL ?? '/'
+const normalizedBaseUrl = baseUrl.endsWith('/') ? baseUrl : `${baseUrl}/`
+
+const isExternal = (value: string) => /^https?:\/\//i.test(value)
+
+// Els documents Markdown es serveixen ja renderitzats per /api/render
+export const documentationUrl = (documentation: string): string | undefined => {
+  const value = documentation.trim()
+  if (isExternal(value)) {
+    return value
+  }
+  if (!/\.(?:md|markdown)$/i.test(value)) {
+    return undefined
+  }
+  const relative = value.replace(/^(?:\.\.?\/)+/, '').replace(/^\/+/, '')
+  return `${normalizedBaseUrl}api/render/${encodeURI(relative)}`
+}
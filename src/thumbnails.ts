@@ -0,0 +1,23 @@
+const baseUrl = import.meta.env.BASE_URL ?? '/'
+const normalizedBaseUrl = baseUrl.endsWith('/') ? baseUrl : `${baseUrl}/`
+
+// Ha de coincidir amb THUMB_WIDTHS de server.py perquè el servidor no hagi d'arrodonir
+export const THUMBNAIL_WIDTHS = [320, 640, 960, 1280] as const
+
+const isExternal = (src: string) => /^(?:[a-z]+:|\/\/)/i.test(src)
+
+// URL de la miniatura servida per /api/thumb; els diagrames externs es retornen tal qual
+export const thumbnailUrl = (src: string, width: number): string => {
+  if (isExternal(src)) {
+    return src
+  }
+  const relative = src.replace(/^(?:\.\.?\/)+/, '').replace(/^\/+/, '')
+  return `${normalizedBaseUrl}api/thumb/${encodeURI(relative)}?w=${width}`
+}
+
+export const thumbnailSrcSet = (src: string): string | undefined => {
+  if (isExternal(src)) {
+    return undefined
+  }
+  return THUMBNAIL_WIDTHS.map((width) => `${thumbnailUrl(src, width)} ${width}w`).join(', ')
+}
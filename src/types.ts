@@ -23,6 +23,24 @@ export interface ProcessesDatabase {
   processes: Process[]
 }
 
+export interface DatabaseDelta {
+  version: string
+  since: string
+  full: false
+  added: Process[]
+  modified: Process[]
+  removed: Array<string | number>
+  lists: Partial<Omit<ProcessesDatabase, 'processes'>>
+}
+
+export interface DatabaseFullSnapshot {
+  version: string
+  full: true
+  database: ProcessesDatabase
+}
+
+export type DatabaseSyncResponse = DatabaseDelta | DatabaseFullSnapshot
+
 export type ViewMode = 'grid' | 'list'
 
 export interface FiltersState {
@@ -40,15 +58,25 @@ export interface TagUpdatePayload {
   tagColors: Record<string, string>
 }
 
+export type UploadJobStatus = 'queued' | 'running' | 'done' | 'failed'
+
+export interface UploadJob {
+  id: string
+  status: UploadJobStatus
+  error?: string | null
+}
+
 export interface UploadResponse {
   saved: Array<{
     originalName: string
     storedName: string
     size: number
     directory: string
+    duplicate?: boolean
   }>
   errors: Array<{
     name: string
     reason: string
   }>
+  job?: UploadJob
 }
@@ -0,0 +1,20 @@
+"""Importa server.py amb un DOCUMENTS_DIRECTORY i un directori d'execució temporals.
+
+server.py llegeix la configuració en importar-se: tots els mòduls de prova
+l'han d'importar d'aquí perquè comparteixin el mateix entorn.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_TEMP = tempfile.TemporaryDirectory()
+DOCUMENTS = Path(_TEMP.name) / 'documents'
+DOCUMENTS.mkdir()
+os.environ['DOCUMENTS_DIRECTORY'] = str(DOCUMENTS)
+os.environ['DOC_FINDER_RUNTIME_DIR'] = str(Path(_TEMP.name) / 'runtime')
+os.environ['SUPPRESS_BROWSER'] = '1'
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import server  # noqa: E402,F401
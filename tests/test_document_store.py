@@ -0,0 +1,51 @@
+"""Deduplicació per contingut de DocumentStore"""
+
+import hashlib
+import os
+import unittest
+
+from support import DOCUMENTS, server
+
+STORE = server.DOCUMENT_STORE
+UPLOADS = DOCUMENTS.parent / 'uploads'
+
+
+class DocumentStoreDedupTest(unittest.TestCase):
+    def setUp(self):
+        UPLOADS.mkdir(exist_ok=True)
+        STORE.invalidate()
+
+    def _upload(self, filename: str, content: bytes):
+        temp_path = UPLOADS / f'{hashlib.sha256(filename.encode() + content).hexdigest()}.part'
+        temp_path.write_bytes(content)
+        uploaded = server.UploadedFile(filename, temp_path, len(content), hashlib.sha256(content).hexdigest())
+        return STORE.store(uploaded, filename)
+
+    def test_file_edited_in_place_is_not_a_duplicate(self):
+        stored, duplicate = self._upload('informe.txt', b'contingut original')
+        self.assertFalse(duplicate)
+        self.assertEqual(self._upload('informe.txt', b'contingut original'), (stored, True))
+
+        # Editat fora del servidor amb la mateixa mida; l'mtime es força perquè
+        # sistemes de fitxers amb resolució gruixuda no el deixin igual
+        mtime_ns = stored.stat().st_mtime_ns
+        stored.write_bytes(b'contingut editat!!')
+        os.utime(stored, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+
+        target, duplicate = self._upload('informe.txt', b'contingut original')
+        self.assertFalse(duplicate)
+        self.assertNotEqual(target, stored)
+        self.assertEqual(target.read_bytes(), b'contingut original')
+        self.assertEqual(stored.read_bytes(), b'contingut editat!!')
+
+    def test_unchanged_file_with_new_mtime_is_rehashed(self):
+        stored, _ = self._upload('diagrama.txt', b'mateixos bytes')
+        os.utime(stored, ns=(1, 1))  # p. ex. restaurat d'una còpia de seguretat
+
+        self.assertEqual(self._upload('diagrama.txt', b'mateixos bytes'), (stored, True))
+        entry = STORE._manifest[hashlib.sha256(b'mateixos bytes').hexdigest()]
+        self.assertEqual((entry['name'], entry['mtime_ns']), (stored.name, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
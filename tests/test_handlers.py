@@ -0,0 +1,151 @@
+"""Rutes de lectura de l'API: delta de la base de dades, compressió, Range, miniatures, render i text complet"""
+
+import gzip
+import io
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from support import DOCUMENTS, server
+
+PROCESSES = [
+    {
+        'id': f'proc-{index}',
+        'name': f'Procés {index}',
+        'description': 'Sincronització de comandes amb el sistema extern ' * 4,
+        'tags': ['trigger'],
+        'objects': ['Account'],
+        'integrations': ['EDRAS'],
+        'mechanism': 'Trigger',
+        'category': 'Architectural',
+    }
+    for index in range(20)
+]
+
+
+class HandlerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        database = {
+            'categories': ['Architectural'], 'mechanisms': ['Trigger'], 'objects': ['Account'],
+            'integrations': ['EDRAS'], 'tags': ['trigger'], 'tagColors': {}, 'processes': PROCESSES,
+        }
+        (DOCUMENTS / 'processes-database.json').write_text(json.dumps(database), encoding='utf-8')
+        (DOCUMENTS / 'guia.md').write_text(
+            '# Guia de triggers\n\n'
+            'El procés **zebraquux** evita la recursió infinita.\n\n'
+            '<script>alert(1)</script>\n\n'
+            '[enllaç](javascript:alert(1))\n',
+            encoding='utf-8',
+        )
+        server.DATABASE_CACHE.invalidate()
+        server.FULLTEXT_INDEX.mark_dirty()
+
+        cls.httpd = server.create_server(0, 'threaded', 4)
+        cls.port = cls.httpd.server_address[1]
+        cls.thread = threading.Thread(target=cls.httpd.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+        cls.thread.join(5)
+
+    def request(self, path, method='GET', body=None, headers=None):
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{self.port}{path}', data=body, method=method, headers=headers or {},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read()
+
+    def test_database_delta(self):
+        status, _, body = self.request('/api/database')
+        self.assertEqual(status, 200)
+        full = json.loads(body)
+        self.assertTrue(full['full'])
+        self.assertEqual(len(full['database']['processes']), len(PROCESSES))
+
+        status, _, _ = self.request(
+            '/api/processes/proc-3', 'PATCH', json.dumps({'tags': ['trigger', 'delta']}).encode(),
+            {'Content-Type': 'application/json'},
+        )
+        self.assertEqual(status, 200)
+
+        status, _, body = self.request(f"/api/database?since={full['version']}")
+        delta = json.loads(body)
+        self.assertFalse(delta['full'])
+        self.assertEqual([process['id'] for process in delta['modified']], ['proc-3'])
+        self.assertEqual(delta['added'], [])
+        self.assertEqual(delta['removed'], [])
+        self.assertIn('delta', delta['lists']['tags'])
+
+        status, _, body = self.request('/api/database?since=desconeguda')
+        self.assertTrue(json.loads(body)['full'])
+
+    def test_database_is_gzip_compressed(self):
+        status, headers, body = self.request('/processes-database.json', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(body))['processes']), len(PROCESSES))
+
+    def test_static_range_request(self):
+        expected = (server.DIRECTORY / 'favicon.png').read_bytes()
+        status, headers, body = self.request('/favicon.png', headers={'Range': 'bytes=100-199'})
+        self.assertEqual(status, 206)
+        self.assertEqual(headers['Content-Range'], f'bytes 100-199/{len(expected)}')
+        self.assertEqual(body, expected[100:200])
+
+        status, _, _ = self.request('/favicon.png', headers={'Range': f'bytes={len(expected)}-'})
+        self.assertEqual(status, 416)
+
+    @unittest.skipIf(server.Image is None, 'cal Pillow')
+    def test_thumbnail(self):
+        server.Image.new('RGB', (1000, 500), (200, 30, 30)).save(DOCUMENTS / 'diagrama.png')
+
+        status, headers, body = self.request('/api/thumb/diagrama.png?w=300&format=png')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], 'image/png')
+        with server.Image.open(io.BytesIO(body)) as thumbnail:
+            self.assertEqual(thumbnail.size, (320, 160))
+
+        status, _, _ = self.request('/api/thumb/diagrama.png?w=300&format=png', headers={'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 304)
+        self.assertEqual(self.request('/api/thumb/guia.md')[0], 404)
+
+    def test_render_escapes_raw_html(self):
+        status, headers, body = self.request('/api/render/guia.md')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers['Content-Type'].startswith('text/html'))
+        self.assertIn('sandbox', headers['Content-Security-Policy'])
+        html_body = body.decode('utf-8')
+        self.assertIn('Guia de triggers</h1>', html_body)
+        self.assertNotIn('<script>alert', html_body)
+        self.assertNotIn('javascript:', html_body)
+
+        status, _, _ = self.request('/api/render/guia.md', headers={'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 304)
+        self.assertEqual(self.request('/api/render/../server.py')[0], 404)
+
+    def test_fulltext_search(self):
+        status, _, body = self.request('/api/fulltext?q=zebraquux')
+        self.assertEqual(status, 200)
+        result = json.loads(body)
+        self.assertEqual(result['total'], 1)
+        match = result['results'][0]
+        self.assertTrue(match['path'].endswith('guia.md'))
+        self.assertIn('zebraquux', [match['snippet'][start:end].lower() for start, end in match['highlights']])
+
+        status, _, body = self.request('/api/fulltext?q=%22recursi%C3%B3+infinita%22')
+        self.assertEqual(json.loads(body)['total'], 1)
+        status, _, body = self.request('/api/fulltext?q=%22infinita+recursi%C3%B3%22')
+        self.assertEqual(json.loads(body)['total'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Fusió dels treballs en segon pla del mateix tipus (JobQueue)"""
+
+import threading
+import time
+import unittest
+
+from support import server
+
+
+class YieldingLock:
+    """Lock que cedeix el fil en alliberar-se, perquè els fils s'intercalin entre seccions crítiques"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock.release()
+        time.sleep(0.001)
+
+
+class JobQueueCoalescingTest(unittest.TestCase):
+    def test_concurrent_submits_share_one_queued_job(self):
+        jobs = server.JobQueue(workers=1)
+        jobs._lock = YieldingLock()
+        release = threading.Event()
+        runs = []
+
+        def handler(items):
+            runs.append(list(items))
+            release.wait(10)
+            return len(items)
+
+        jobs.register('prova', handler)
+        self.addCleanup(release.set)
+        first = jobs.submit('prova', ['inicial'])
+        # El primer treball ocupa l'únic fil; els següents esperen a la cua
+        deadline = time.monotonic() + 5
+        while jobs.get(first.id)['status'] != 'running' and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        barrier = threading.Barrier(16)
+        submitted = []
+
+        def submit(index):
+            barrier.wait()
+            submitted.append(jobs.submit('prova', [f'fitxer-{index}']))
+
+        threads = [threading.Thread(target=submit, args=(index,)) for index in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len({job.id for job in submitted}), 1)
+        self.assertEqual(sorted(submitted[0].items), sorted(f'fitxer-{index}' for index in range(16)))
+
+        release.set()
+        jobs._queue.join()
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(jobs.get(submitted[0].id)['status'], 'done')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Les connexions lentes o de llarga durada no han de bloquejar la resta de peticions"""
+
+import socket
+import sqlite3
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+from support import server
+
+STATIC_PATH = '/favicon.png'
+# Marge generós per a màquines de CI lentes; sense pool seria REQUEST_TIMEOUT (60 s)
+STATIC_LATENCY_BOUND = 2.0
+
+
+class StalledUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.httpd = server.create_server(0, 'threaded', 4)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.addCleanup(self._stop)
+
+    def _stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join(5)
+
+    def _open_stalled_upload(self) -> socket.socket:
+        """Envia les capçaleres i part del cos d'una pujada multipart i deixa de transmetre"""
+        boundary = 'doc-finder-test'
+        body = (
+            f'--{boundary}\r\n'
+            'Content-Disposition: form-data; name="files"; filename="lent.txt"\r\n'
+            'Content-Type: text/plain\r\n\r\n'
+        ).encode('utf-8') + b'x' * 1024
+        connection = socket.create_connection(('127.0.0.1', self.port))
+        connection.sendall(
+            (
+                'POST /api/upload HTTP/1.1\r\n'
+                f'Host: 127.0.0.1:{self.port}\r\n'
+                f'Content-Type: multipart/form-data; boundary={boundary}\r\n'
+                f'Content-Length: {len(body) + 1024 * 1024}\r\n\r\n'
+            ).encode('ascii')
+            + body
+        )
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_static_get_is_not_blocked_by_stalled_upload(self):
+        self._open_stalled_upload()
+        time.sleep(0.2)  # Deixa que un worker quedi bloquejat llegint el cos
+
+        started = time.monotonic()
+        with urllib.request.urlopen(f'http://127.0.0.1:{self.port}{STATIC_PATH}', timeout=10) as response:
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.read(), (server.DIRECTORY / STATIC_PATH.lstrip('/')).read_bytes())
+        self.assertLess(time.monotonic() - started, STATIC_LATENCY_BOUND)
+
+
+class EventStreamTest(unittest.TestCase):
+    def _start(self, mode, max_workers=None):
+        httpd = server.create_server(0, mode, max_workers)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join(5)
+
+        self.addCleanup(stop)
+        return httpd.server_address[1]
+
+    def _open_stream(self, port):
+        response = urllib.request.urlopen(f'http://127.0.0.1:{port}/api/events', timeout=10)
+        self.addCleanup(response.close)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.readline(), b'event: hello\n')
+        return response
+
+    def test_streams_do_not_hold_request_workers(self):
+        port = self._start('threaded', 2)
+        streams = [self._open_stream(port) for _ in range(3)]
+
+        started = time.monotonic()
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{STATIC_PATH}', timeout=10) as response:
+            self.assertEqual(response.status, 200)
+        self.assertLess(time.monotonic() - started, STATIC_LATENCY_BOUND)
+
+        server.EVENT_BROKER.publish({'type': 'change', 'version': 'v-test'})
+        for stream in streams:
+            lines = [stream.readline() for _ in range(5)]
+            self.assertIn(b'event: change\n', lines)
+
+    def test_single_mode_rejects_streams(self):
+        port = self._start('single')
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/events', timeout=10)
+        self.assertEqual(raised.exception.code, 503)
+
+    def test_change_is_published_when_the_version_cannot_be_read(self):
+        subscriber = server.EVENT_BROKER.subscribe()
+        self.addCleanup(server.EVENT_BROKER.unsubscribe, subscriber)
+
+        def locked():
+            raise sqlite3.OperationalError('database is locked')
+
+        with mock.patch.object(server.DATABASE_CACHE, 'get', locked):
+            server._on_documents_changed({server.DOCUMENTS_DIRECTORY / 'guia.md'})
+        event = subscriber.get(timeout=5)
+        self.assertEqual((event['type'], event['version'], event['paths']), ('change', None, ['guia.md']))
+
+
+if __name__ == '__main__':
+    unittest.main()
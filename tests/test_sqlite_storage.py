@@ -0,0 +1,95 @@
+"""Backend SQLite: consultes SQL equivalents als índexs en memòria i escriptura dels tags al JSON"""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import DOCUMENTS, server
+
+PROCESSES = [
+    {
+        'id': f'proc-{index}' if index % 7 else index,
+        'name': f"{('Sincronització', 'Facturació', 'Àrea de clients')[index % 3]} {index % 5}",
+        'description': ('comandes pendents', 'quotes', 'recursió infinita')[index % 3],
+        'tags': [['trigger'], ['batch', 'trigger'], []][index % 3],
+        'objects': [['Account'], ['Order'], ['Account', 'Quote']][index % 3],
+        'integrations': [['EDRAS'], [], ['SAP']][index % 3],
+        'mechanism': ('Trigger', 'Flow', '')[index % 3],
+        'category': ('Architectural', 'Business')[index % 2],
+        'priority': ('alta', 'baixa', 'mitjana', '')[index % 4],
+        'complexity': ('baixa', 'alta', None)[index % 3],
+    }
+    for index in range(40)
+]
+DATABASE = {
+    'categories': ['Business', 'Architectural'], 'mechanisms': ['Trigger', 'Flow'], 'objects': ['Account'],
+    'integrations': ['EDRAS'], 'tags': ['batch', 'trigger'], 'tagColors': {}, 'processes': PROCESSES,
+}
+QUERIES = [
+    ({}, ''),
+    ({'category': 'Business'}, ''),
+    ({'tag': 'trigger', 'object': 'Account'}, ''),
+    ({'integration': 'SAP'}, 'area'),
+    ({}, 'sinc comand'),
+    ({'mechanism': 'Flow'}, 'zzz'),
+]
+
+
+class SqliteStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.json_path = DOCUMENTS / 'processes-database.json'
+        self.json_path.write_text(json.dumps(DATABASE, ensure_ascii=False), encoding='utf-8')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = server.SqliteDatabaseStorage(Path(directory.name) / 'processes.sqlite3')
+
+    def test_queries_match_memory_indexes(self):
+        snapshot = server.JsonDatabaseStorage().read()
+        facets = server.FacetIndex()
+        facets.sync(snapshot)
+        catalog = server.ProcessCatalog()
+        catalog.sync(snapshot)
+        for filters, search in QUERIES:
+            with self.subTest(filters=filters, search=search):
+                keys = server._search_keys(snapshot, search)
+                _, mask, counts, ids = facets.query(filters, keys)
+                self.assertEqual(self.storage.facets(filters, search)[1:], (ids, counts))
+
+                for sort in server.SqliteDatabaseStorage.SORT_COLUMNS:
+                    for descending in (False, True):
+                        after = None
+                        while True:
+                            page = catalog.page(catalog.version, mask, sort, descending, 0, 6, after)
+                            _, _, sql_page = self.storage.process_page(filters, search, sort, descending, 0, 6, after)
+                            self.assertEqual((sql_page[0], *sql_page[2:]), (page[0], *page[2:]))
+                            after = page[3]
+                            if after is None:
+                                break
+
+                if search:
+                    _, total, ranked = self.storage.search(search, 100)
+                    self.assertEqual(total, len(keys))
+                    self.assertEqual(
+                        {server.SearchIndex.process_key(process, 0) for process, _ in ranked}, set(keys),
+                    )
+
+    def test_tag_edits_survive_reimport_and_are_written_back(self):
+        self.assertEqual(self.storage.apply_tag_changes([[{'id': 'proc-1', 'tags': ['editat']}]]), [None])
+
+        # El generador torna a escriure el JSON per fora del servidor
+        regenerated = {**DATABASE, 'processes': [{**PROCESSES[1], 'name': 'Renombrat'}, PROCESSES[2]]}
+        self.json_path.write_text(json.dumps(regenerated, ensure_ascii=False), encoding='utf-8')
+        data = self.storage.read().data
+        self.assertEqual([process['name'] for process in data['processes']], ['Renombrat', PROCESSES[2]['name']])
+        self.assertEqual(data['processes'][0]['tags'], ['editat'])
+        self.assertIn('editat', data['tagColors'])
+
+        self.assertTrue(self.storage.write_back())
+        written = json.loads(self.json_path.read_text(encoding='utf-8'))
+        self.assertEqual(written, data)
+        self.assertFalse(self.storage.write_back())
+
+
+if __name__ == '__main__':
+    unittest.main()
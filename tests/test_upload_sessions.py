@@ -0,0 +1,120 @@
+"""Bloquejos de les sessions de pujada per blocs (UploadSessionStore)"""
+
+import io
+import os
+import threading
+import unittest
+import uuid
+
+from support import server
+
+SESSIONS = server.UPLOAD_SESSIONS
+
+
+class UploadSessionLockTest(unittest.TestCase):
+    def _lock_files(self):
+        directory = SESSIONS.directory()
+        return sorted(path.name for path in directory.glob('*.lock')) if directory.exists() else []
+
+    def _create(self, content: bytes) -> str:
+        session_id = SESSIONS.create('prova.txt', len(content))['id']
+        SESSIONS.append(session_id, 0, io.BytesIO(content), len(content))
+        return session_id
+
+    def test_unknown_ids_do_not_leave_locks(self):
+        before = self._lock_files()
+        for session_id in ('../../fora', 'no-hex', uuid.uuid4().hex):
+            with self.assertRaises(FileNotFoundError):
+                SESSIONS.append(session_id, 0, io.BytesIO(b'x'), 1)
+            with self.assertRaises(FileNotFoundError):
+                SESSIONS.complete(session_id, lambda uploaded: None)
+            self.assertNotIn(session_id, SESSIONS._locks)
+        self.assertEqual(self._lock_files(), before)
+
+    def test_complete_holds_the_lock_while_storing(self):
+        session_id = self._create(b'hola')
+        appended = threading.Event()
+
+        def append_late():
+            try:
+                SESSIONS.append(session_id, 4, io.BytesIO(b'!'), 1)
+            except FileNotFoundError:
+                pass
+            appended.set()
+
+        def store(uploaded):
+            thread = threading.Thread(target=append_late)
+            thread.start()
+            # El bloc concurrent no pot tocar el .part mentre es desa
+            self.assertFalse(appended.wait(0.3))
+            self.assertEqual(uploaded.temp_path.read_bytes(), b'hola')
+            return uploaded.sha256, thread
+
+        sha256, thread = SESSIONS.complete(session_id, store)
+        thread.join(5)
+        self.assertTrue(appended.is_set())
+        self.assertEqual(len(sha256), 64)
+        self.assertIsNone(SESSIONS.load(session_id))
+        self.assertNotIn(session_id, SESSIONS._locks)
+        # El fitxer de bloqueig només l'esborra purge_expired, amb el bloqueig pres
+        self.assertIn(f'{session_id}.lock', self._lock_files())
+        SESSIONS.purge_expired()
+        self.assertNotIn(f'{session_id}.lock', self._lock_files())
+
+    def test_cancel_waits_for_complete(self):
+        session_id = self._create(b'hola')
+        cancelled = threading.Event()
+        outcome = []
+
+        def cancel():
+            try:
+                SESSIONS.cancel(session_id)
+                outcome.append('cancel·lada')
+            except FileNotFoundError:
+                outcome.append('no trobada')
+            cancelled.set()
+
+        def store(uploaded):
+            thread = threading.Thread(target=cancel)
+            thread.start()
+            # El DELETE no pot esborrar el .part mentre es desa
+            self.assertFalse(cancelled.wait(0.3))
+            self.assertEqual(uploaded.temp_path.read_bytes(), b'hola')
+            return thread
+
+        SESSIONS.complete(session_id, store).join(5)
+        self.assertEqual(outcome, ['no trobada'])
+        with self.assertRaises(FileNotFoundError):
+            SESSIONS.cancel(session_id)
+
+    def test_purge_evicts_locks_of_sessions_gone_elsewhere(self):
+        session_id = self._create(b'dades')
+        self.assertIn(session_id, SESSIONS._locks)
+        # Una altra instància (prefork) completa la sessió
+        SESSIONS._meta_path(session_id).unlink()
+        SESSIONS.purge_expired()
+        self.assertNotIn(session_id, SESSIONS._locks)
+        self.assertNotIn(f'{session_id}.lock', self._lock_files())
+
+    def test_purge_discards_expired_sessions_under_the_lock(self):
+        session_id = self._create(b'antiga')
+        for path in (SESSIONS._meta_path(session_id), SESSIONS.part_path(session_id)):
+            os.utime(path, (1, 1))
+        purged = threading.Event()
+
+        def purge():
+            SESSIONS.purge_expired()
+            purged.set()
+
+        with SESSIONS.lock(session_id):
+            thread = threading.Thread(target=purge)
+            thread.start()
+            self.assertFalse(purged.wait(0.3))
+            self.assertIsNotNone(SESSIONS.load(session_id))
+        thread.join(5)
+        self.assertIsNone(SESSIONS.load(session_id))
+        self.assertFalse(SESSIONS.part_path(session_id).exists())
+
+
+if __name__ == '__main__':
+    unittest.main()